@@ -0,0 +1,111 @@
+"""Encaixe dos serviços na agenda: duração e expediente de cada profissional.
+
+Cada dia de cada profissional é um bitset de 96 posições de 15 minutos
+(um `int`): bit i ligado = quarto de hora i ocupado. O expediente vira a
+máscara do que está aberto, os agendamentos do dia (`IndiceOcupacao`) a
+do que está tomado, e um serviço que começa em `h` cabe se a sua máscara
+`[h, h + duração)` estiver toda dentro do livre — duas operações em
+inteiros por horário candidato. Os inícios oferecidos continuam sendo os
+modelos de horário do catálogo.
+
+Sem profissionais cadastradas, o estúdio funciona como uma única cadeira
+aberta o dia todo (profissional None) e só a duração entra na conta.
+Agendamentos antigos sem profissional bloqueiam todas elas.
+"""
+from datetime import date, datetime, timedelta
+
+QUARTO   = 15                     # minutos por posição do bitset
+POSICOES = 24 * 60 // QUARTO
+DIA_TODO = (1 << POSICOES) - 1
+
+
+def minutos(hhmm):
+    h, m = str(hhmm)[:5].split(":")
+    return int(h) * 60 + int(m)
+
+
+def mascara(inicio_min, duracao_min):
+    """Bits dos quartos de hora tocados por `[inicio, inicio + duracao)`."""
+    ini = inicio_min // QUARTO
+    fim = min(POSICOES, -(-(inicio_min + duracao_min) // QUARTO))
+    return ((1 << (fim - ini)) - 1) << ini if fim > ini else 0
+
+
+def ja_passou(data):
+    """HH:MM até onde os inícios de `data` já passaram: agora, se `data` é hoje; "" nos outros dias."""
+    return datetime.now().strftime("%H:%M") if data == date.today().isoformat() else ""
+
+
+def mascara_expediente(turnos):
+    livre = 0
+    for inicio, fim in turnos:
+        livre |= mascara(inicio, fim - inicio)
+    return livre
+
+
+class MotorAgenda:
+    """Horários livres para um serviço, considerando duração e equipe."""
+
+    def __init__(self, indice, catalogo):
+        self._indice   = indice
+        self._catalogo = catalogo
+
+    def _livre_por_profissional(self, dia_semana, intervalos):
+        """{profissional_id: bitset livre} no dia, já descontados os intervalos ocupados."""
+        ocupado = {}
+        for prof, inicio, duracao in intervalos:
+            ocupado[prof] = ocupado.get(prof, 0) | mascara(inicio, duracao)
+        equipe = self._catalogo.atual.profissionais
+        if not equipe:
+            return {None: DIA_TODO & ~ocupado.get(None, 0)}
+        todas = ocupado.get(None, 0)
+        return {
+            p.id: mascara_expediente(p.turnos(dia_semana)) & ~(ocupado.get(p.id, 0) | todas)
+            for p in equipe
+        }
+
+    def _encaixar(self, data, duracao, intervalos, horarios=None):
+        dia    = date.fromisoformat(data).isoweekday()
+        livres = self._livre_por_profissional(dia, intervalos)
+        encaixes = {}
+        for h in horarios or self._catalogo.atual.horarios(dia):
+            m = mascara(minutos(h), duracao)
+            for prof, livre in livres.items():
+                if m and livre & m == m:
+                    encaixes[h] = prof
+                    break
+        return encaixes
+
+    async def encaixes(self, data, servico=None, ignorar=None, horarios=None):
+        """{horario: profissional_id} onde o serviço cabe inteiro em `data` (ordem do catálogo).
+
+        `ignorar` é o agendamento sendo remarcado, que não conta como ocupado;
+        `horarios` troca os modelos do catálogo pelos inícios dados (edição do TI).
+        Hoje, os modelos que já passaram ficam de fora; os `horarios` dados valem como vieram.
+        """
+        duracao  = self._catalogo.atual.duracao(servico)
+        encaixes = self._encaixar(data, duracao, await self._indice.intervalos(data, ignorar), horarios)
+        if horarios is None:
+            agora    = ja_passou(data)
+            encaixes = {h: prof for h, prof in encaixes.items() if h > agora}
+        return encaixes
+
+    async def livres(self, data, servico=None, ignorar=None):
+        return list(await self.encaixes(data, servico, ignorar))
+
+    async def primeiros_livres(self, servico=None, n=6, dias=30, desde=None, ignorar=None):
+        """Os `n` primeiros `(data, horario)` livres para o serviço nos próximos `dias`."""
+        inicio = desde or date.today()
+        datas  = [(inicio + timedelta(days=i)).isoformat() for i in range(dias)]
+        await self._indice.carregar(datas)    # uma única consulta para a janela toda
+        duracao = self._catalogo.atual.duracao(servico)
+        achados = []
+        for d in datas:
+            agora = ja_passou(d)
+            for h in self._encaixar(d, duracao, await self._indice.intervalos(d, ignorar)):
+                if h <= agora:
+                    continue
+                achados.append((d, h))
+                if len(achados) >= n:
+                    return achados
+        return achados
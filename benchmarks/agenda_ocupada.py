@@ -0,0 +1,158 @@
+"""Busca de horários livres numa agenda sintética lotada (30 dias, várias profissionais).
+
+Cada profissional trabalha das 08:00 às 20:00 de segunda a sábado, os
+modelos de horário vão de 15 em 15 minutos e os agendamentos (de 30 a
+180 minutos) enchem os dias até sobrarem só buracos menores que o
+serviço procurado. As primeiras datas com vaga ficam no fim da janela,
+então `primeiros_livres` precisa varrer os 30 dias.
+
+Compara o `MotorAgenda` (bitset de quartos de hora) com a conta ingênua
+que testa cada início contra a lista de intervalos do dia, e confere que
+os dois acham os mesmos horários.
+
+Uso: python benchmarks/agenda_ocupada.py [--profissionais 4] [--repeticoes 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agenda import MotorAgenda, minutos                                 # noqa: E402
+from catalogo import Catalogo, Horario, Profissional, Servico           # noqa: E402
+from disponibilidade import IndiceOcupacao                              # noqa: E402
+
+DIAS        = 30
+ABRE, FECHA = 8 * 60, 20 * 60
+DURACOES    = (30, 45, 60, 90, 120)
+PROCURADO   = ("Mega hair", 180)
+
+
+class RepoSintetico:
+    """Só o `ocupacao()` do repositório, servindo a agenda gerada."""
+
+    def __init__(self, linhas):
+        self._linhas = linhas
+        self.consultas = 0
+
+    async def ocupacao(self, inicio, fim):
+        self.consultas += 1
+        return [l for l in self._linhas if inicio <= l["data"] <= fim]
+
+
+def montar_catalogo(n_profissionais):
+    servicos  = [Servico(f"Serviço {d}", d) for d in DURACOES] + [Servico(*PROCURADO)]
+    horarios  = [Horario(i, f"{m // 60:02d}:{m % 60:02d}") for i, m in enumerate(range(ABRE, FECHA, 15), 1)]
+    expediente = ((),) + tuple(((ABRE, FECHA),) if d < 7 else () for d in range(1, 8))   # domingo fechado
+    equipe    = [Profissional(p, f"Profissional {p}", expediente) for p in range(1, n_profissionais + 1)]
+    return Catalogo.montar(1, servicos, horarios, equipe)
+
+
+def montar_agenda(inicio, n_profissionais, semente=7):
+    """Enche cada dia de cada profissional; só os dois últimos dias úteis deixam vaga de 3 h à tarde."""
+    sorteio, linhas = random.Random(semente), []
+    datas  = [inicio + timedelta(days=i) for i in range(DIAS)]
+    vagas  = [d for d in datas if d.isoweekday() < 7][-2:]
+    for d in datas:
+        data = d.isoformat()
+        for prof in range(1, n_profissionais + 1):
+            agora = ABRE
+            while agora < FECHA:
+                # Buracos de até 45 min entre atendimentos: nunca cabe o serviço de 3 h
+                agora += sorteio.choice((0, 0, 15, 30, 45))
+                duracao = min(sorteio.choice(DURACOES), FECHA - agora)
+                if d in vagas and agora < 17 * 60 and agora + duracao > 14 * 60:
+                    # Das 14:00 às 17:00 fica livre para o serviço procurado
+                    duracao = max(0, 14 * 60 - agora)
+                    if not duracao:
+                        agora = 17 * 60
+                        continue
+                if duracao <= 0:
+                    break
+                linhas.append({"id": f"{data}-{prof}-{agora}", "data": data, "profissional_id": prof,
+                               "horario": f"{agora // 60:02d}:{agora % 60:02d}:00", "duracao_min": duracao})
+                agora += duracao
+    return linhas
+
+
+def ingenua(catalogo, linhas, inicio, duracao, n):
+    """Referência: cada início × cada profissional × cada intervalo do dia."""
+    por_dia = {}
+    for l in linhas:
+        por_dia.setdefault(l["data"], []).append((l["profissional_id"], minutos(l["horario"]), l["duracao_min"]))
+    achados = []
+    for i in range(DIAS):
+        d   = inicio + timedelta(days=i)
+        dia = d.isoweekday()
+        for h in catalogo.horarios(dia):
+            ini, fim = minutos(h), minutos(h) + duracao
+            for p in catalogo.profissionais:
+                aberto = any(a <= ini and fim <= b for a, b in p.turnos(dia))
+                if aberto and all(prof != p.id or fim <= o or o + dur <= ini
+                                  for prof, o, dur in por_dia.get(d.isoformat(), ())):
+                    achados.append((d.isoformat(), h))
+                    break
+            if len(achados) >= n:
+                return achados
+    return achados
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tempos), max(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profissionais", type=int, default=4)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    parser.add_argument("-n", type=int, default=6, help="quantos horários livres procurar")
+    args = parser.parse_args()
+
+    inicio   = date.today() + timedelta(days=1)
+    catalogo = montar_catalogo(args.profissionais)
+    linhas   = montar_agenda(inicio, args.profissionais)
+    repo     = RepoSintetico(linhas)
+    indice   = IndiceOcupacao(repo, ttl=3600)
+    motor    = MotorAgenda(indice, SimpleNamespace(atual=catalogo))
+    servico, duracao = PROCURADO
+
+    async def fria():
+        indice._validade.clear()
+        return await motor.primeiros_livres(servico, n=args.n, dias=DIAS, desde=inicio)
+
+    async def quente():
+        return await motor.primeiros_livres(servico, n=args.n, dias=DIAS, desde=inicio)
+
+    loop = asyncio.new_event_loop()
+    try:
+        achados = loop.run_until_complete(fria())
+        assert achados == ingenua(catalogo, linhas, inicio, duracao, args.n), "bitset e referência divergem"
+        cenarios = [
+            ("bitset, índice carregando", lambda: loop.run_until_complete(fria())),
+            ("bitset, índice em memória", lambda: loop.run_until_complete(quente())),
+            ("ingênua (lista de intervalos)", lambda: ingenua(catalogo, linhas, inicio, duracao, args.n)),
+        ]
+        print(f"{len(linhas)} agendamentos em {DIAS} dias, {args.profissionais} profissionais, "
+              f"{len(catalogo.horarios(1))} inícios por dia")
+        print(f"Primeiros {args.n} livres para {servico} ({duracao} min): {achados[0]} … {achados[-1]}\n")
+        print(f"{'busca':<32}{'mediana (ms)':>14}{'máx (ms)':>10}")
+        for nome, funcao in cenarios:
+            mediana, maximo = medir(funcao, args.repeticoes)
+            print(f"{nome:<32}{mediana:>14.2f}{maximo:>10.2f}")
+    finally:
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
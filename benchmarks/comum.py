@@ -0,0 +1,89 @@
+"""Peças comuns dos benchmarks que passam pela `Application` de verdade.
+
+`preparar_ambiente` aponta o `bot` para o PostgREST local e manda os
+arquivos SQLite para um diretório temporário (antes de importar o bot);
+`conversar` manda o roteiro de cada cliente pela fila de updates do PTB,
+um passo depois da resposta do anterior, todas as clientes ao mesmo tempo.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(AQUI))
+sys.path.insert(0, AQUI)
+
+from postgrest_local import CHAVE          # noqa: E402
+from telegram_local import botao, mensagem  # noqa: E402
+
+_update_ids = itertools.count(1)
+
+
+def preparar_ambiente(url, **extra):
+    """Variáveis lidas na importação do `bot`; devolve o diretório temporário."""
+    pasta = tempfile.mkdtemp(prefix="bench-")
+    os.environ.update({
+        "SUPABASE_URL": url, "SUPABASE_KEY": CHAVE, "REPLICA": "0", "ARQUIVO_MESES": "0",
+        "NOTIFICACOES_ARQUIVO": os.path.join(pasta, "notificacoes.sqlite3"),
+        "DIARIO_ARQUIVO": os.path.join(pasta, "diario.sqlite3"),
+        **extra,
+    })
+    return pasta
+
+
+def importar_bot():
+    from telegram.warnings import PTBUserWarning
+    import bot
+    logging.disable(logging.INFO)
+    warnings.filterwarnings("ignore", category=PTBUserWarning)   # per_message dos ConversationHandler
+    return bot
+
+
+async def conectar(bot, url):
+    repo = bot.repo
+    await repo.fechar()
+    repo._url, repo._key = url, CHAVE
+    await repo.conectar()
+
+
+async def conversar(app, roteiros):
+    """`roteiros`: {uid: [("msg", "/start") ou ("botao", "agendar"), ...]}. Devolve a latência (s) de cada update, da fila ao fim dos handlers."""
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    esperando = {}
+
+    async def concluido(update, _):
+        futuro = esperando.pop(update.update_id, None)
+        if futuro is not None and not futuro.done():
+            futuro.set_result(time.perf_counter())
+
+    app.add_handler(TypeHandler(Update, concluido), group=99)   # roda depois dos handlers do bot
+    loop = asyncio.get_running_loop()
+
+    async def cliente(uid, roteiro):
+        latencias = []
+        for tipo, texto in roteiro:
+            uid_update = next(_update_ids)
+            dados  = mensagem(uid, texto, uid_update) if tipo == "msg" else botao(uid, texto, uid_update)
+            update = Update.de_json(dados, app.bot)
+            esperando[uid_update] = loop.create_future()
+            inicio = time.perf_counter()
+            app.update_queue.put_nowait(update)
+            latencias.append(await asyncio.wait_for(esperando[uid_update], timeout=600) - inicio)
+        return latencias
+
+    por_cliente = await asyncio.gather(*(cliente(uid, r) for uid, r in roteiros.items()))
+    return [l for ls in por_cliente for l in ls]
+
+
+def percentis(latencias):
+    """(p50, p99, máx) em milissegundos."""
+    cortes = statistics.quantiles(latencias, n=100, method="inclusive")
+    return cortes[49] * 1000, cortes[98] * 1000, max(latencias) * 1000
@@ -0,0 +1,67 @@
+"""Latência por mensagem com a persistência das conversas desligada, em SQLite e no Supabase.
+
+N clientes fazem, ao mesmo tempo, o começo de um agendamento pelos
+handlers do bot (/start, botão "Agendar", nome), cada passo depois da
+resposta do anterior. Cada passo muda o estado da conversa e o
+`user_data`, que a persistência grava em lote a cada `--intervalo`
+segundos, fora do caminho da mensagem. No Supabase (compartilhado entre
+instâncias), o estado do usuário é relido antes de cada update: essa
+ida ao banco é o custo que aparece aqui.
+
+Uso: python benchmarks/latencia_persistencia.py [-n 200] [--atraso-ms 20] [--intervalo 1]
+"""
+import argparse
+import asyncio
+import os
+
+from comum import conectar, conversar, importar_bot, percentis, preparar_ambiente
+from postgrest_local import PostgrestLocal
+from telegram_local import TelegramLocal
+
+ROTEIRO = [("msg", "/start"), ("botao", "agendar"), ("msg", "Cliente de Teste")]
+
+
+async def cenario(bot, url, pasta, n, tipo, intervalo):
+    from telegram.ext import Application
+    from concorrencia import ProcessadorPorConversa
+    from persistencia import criar_persistencia
+
+    await conectar(bot, url)
+    arquivo      = os.path.join(pasta, f"estado-{tipo}.sqlite3")
+    persistencia = criar_persistencia(tipo, bot.repo, arquivo, intervalo)
+    app = bot.montar_app(
+        Application.builder().token("1:local").request(TelegramLocal()).get_updates_request(TelegramLocal())
+        .concurrent_updates(ProcessadorPorConversa(bot.UPDATES_SIMULTANEOS)),
+        persistencia,
+    )
+    await app.initialize()
+    await app.start()
+    try:
+        return await conversar(app, {20_000 + i: list(ROTEIRO) for i in range(n)})
+    finally:
+        await app.stop()
+        await app.shutdown()
+        await bot.repo.fechar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=200, help="clientes conversando ao mesmo tempo")
+    parser.add_argument("--atraso-ms", type=float, default=20, help="atraso do PostgREST local por requisição")
+    parser.add_argument("--intervalo", type=float, default=1, help="segundos entre gravações em lote")
+    args = parser.parse_args()
+
+    with PostgrestLocal(args.atraso_ms / 1000) as postgrest:
+        pasta = preparar_ambiente(postgrest.url)
+        bot   = importar_bot()
+        asyncio.run(cenario(bot, postgrest.url, pasta, args.n, "nenhuma", args.intervalo))   # aquecimento
+        print(f"{args.n} clientes × {len(ROTEIRO)} mensagens, {args.atraso_ms:g} ms por requisição ao banco\n")
+        print(f"{'persistência':<16}{'p50 (ms)':>10}{'p99 (ms)':>10}{'máx (ms)':>10}")
+        for tipo in ("nenhuma", "sqlite", "supabase"):
+            latencias = asyncio.run(cenario(bot, postgrest.url, pasta, args.n, tipo, args.intervalo))
+            p50, p99, maximo = percentis(latencias)
+            print(f"{tipo:<16}{p50:>10.1f}{p99:>10.1f}{maximo:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Latência vista pelas clientes: N updates simultâneos passando pelos handlers do bot.
+
+Monta a `Application` de verdade (`bot.montar_app`) com a Bot API local
+(`telegram_local`) e o Supabase apontando para um PostgREST de mentira
+com atraso artificial (`postgrest_local`). N clientes diferentes mandam
+/minhas ao mesmo tempo: cada update cai na fila do PTB, passa pelo
+processador de updates e pelo `ConversationHandler` e faz uma ida ao
+banco. A latência vai da chegada do update na fila ao fim do handler.
+
+- antes: cliente síncrono do supabase chamado dentro do handler e um
+  update por vez, como o bot era.
+- assíncrono, em série: repositório assíncrono, updates um por vez.
+- depois: repositório assíncrono e `ProcessadorPorConversa` (clientes
+  diferentes em paralelo, cada conversa em ordem).
+- depois (pool): o mesmo, com o repositório no pool de threads
+  (supabase-py sem `acreate_client`).
+
+Uso: python benchmarks/latencia_repositorio.py [-n 300] [--atraso-ms 20]
+"""
+import argparse
+import asyncio
+
+from comum import conectar, conversar, importar_bot, percentis, preparar_ambiente
+from postgrest_local import CHAVE, PostgrestLocal
+from telegram_local import TelegramLocal
+
+
+async def usar_repositorio(bot, url, modo):
+    import repositorio
+    from supabase import create_client
+
+    repo = bot.repo
+    repo.__dict__.pop("_enviar", None)
+    if modo == "antes":
+        await repo.fechar()
+        repo._url, repo._key = url, CHAVE
+        repo._cliente = create_client(url, CHAVE)
+
+        async def bloqueante(consulta):   # o handler antigo: HTTP síncrono dentro do async def
+            return consulta.execute()
+
+        repo._enviar = bloqueante
+        return
+    original = repositorio.acreate_client
+    if modo == "pool":
+        repositorio.acreate_client = None
+    try:
+        await conectar(bot, url)
+    finally:
+        repositorio.acreate_client = original
+
+
+async def cenario(bot, url, n, modo, concorrente):
+    from telegram.ext import Application
+    from concorrencia import ProcessadorPorConversa
+
+    await usar_repositorio(bot, url, modo)
+    app = bot.montar_app(
+        Application.builder().token("1:local").request(TelegramLocal()).get_updates_request(TelegramLocal())
+        .concurrent_updates(ProcessadorPorConversa(bot.UPDATES_SIMULTANEOS) if concorrente else False)
+    )
+    await app.initialize()
+    await app.start()
+    try:
+        return await conversar(app, {10_000 + i: [("msg", "/minhas")] for i in range(n)})
+    finally:
+        await app.stop()
+        await app.shutdown()
+        if modo == "antes":
+            bot.repo._cliente = None    # cliente síncrono: não há sessão assíncrona a fechar
+        await bot.repo.fechar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=300, help="clientes mandando /minhas ao mesmo tempo")
+    parser.add_argument("--atraso-ms", type=float, default=20, help="atraso do PostgREST local por requisição")
+    args = parser.parse_args()
+
+    with PostgrestLocal(args.atraso_ms / 1000) as postgrest:
+        preparar_ambiente(postgrest.url)
+        bot = importar_bot()
+        cenarios = [
+            ("antes (síncrono, em série)", "antes", False),
+            ("assíncrono, em série",       "async", False),
+            ("depois (assíncrono)",        "async", True),
+            ("depois (pool de threads)",   "pool",  True),
+        ]
+        print(f"{args.n} updates /minhas simultâneos, {args.atraso_ms:g} ms por requisição ao banco\n")
+        print(f"{'cenário':<30}{'p50 (ms)':>10}{'p99 (ms)':>10}{'máx (ms)':>10}")
+        for nome, modo, concorrente in cenarios:
+            p50, p99, maximo = percentis(asyncio.run(cenario(bot, postgrest.url, args.n, modo, concorrente)))
+            print(f"{nome:<30}{p50:>10.1f}{p99:>10.1f}{maximo:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""PostgREST de mentira para os benchmarks: HTTP local com atraso artificial.
+
+Responde no formato do Supabase (`/rest/v1/<tabela>`) sem guardar nada:
+GET devolve lista vazia, POST e PATCH devolvem a linha enviada (com o
+`id` do filtro `id=eq.X`), DELETE devolve lista vazia. Cada requisição
+dorme `atraso` segundos numa thread própria, como uma ida ao banco.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CHAVE = "cabecalho.carga.assinatura"   # o supabase-py só exige o formato de um JWT
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # mantém a conexão, como o PostgREST atrás do Supabase
+    atraso           = 0.02
+
+    def _corpo(self):
+        bruto = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        return json.loads(bruto) if bruto else {}
+
+    def _responder(self, dados):
+        time.sleep(self.atraso)
+        resposta = json.dumps(dados).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(resposta)))
+        self.end_headers()
+        self.wfile.write(resposta)
+
+    def do_GET(self):
+        self._corpo()   # o cliente do PostgREST manda `{}` até no GET
+        self._responder([])
+
+    def do_DELETE(self):
+        self._corpo()
+        self._responder([])
+
+    def do_POST(self):
+        corpo = self._corpo()
+        self._responder(corpo if isinstance(corpo, list) else [corpo])
+
+    def do_PATCH(self):
+        ag_id = parse_qs(urlparse(self.path).query).get("id", ["eq."])[0][3:]
+        self._responder([{"id": ag_id, **self._corpo()}])
+
+    def log_message(self, *_):
+        pass
+
+
+class PostgrestLocal:
+    def __init__(self, atraso=0.02):
+        handler = type("Handler", (_Handler,), {"atraso": atraso})
+        ThreadingHTTPServer.request_queue_size = 1024
+        ThreadingHTTPServer.daemon_threads     = True
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._servidor.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *_):
+        self._servidor.shutdown()
+        self._servidor.server_close()
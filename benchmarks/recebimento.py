@@ -0,0 +1,176 @@
+"""Vazão e latência de ponta a ponta recebendo por webhook e por long polling.
+
+Reenvia uma gravação de updates da Bot API (JSON Lines, um update por
+linha, como o `getUpdates` devolve) para a `Application` de verdade
+(`bot.montar_app`), uma vez por modo:
+
+- polling: os updates entram na Bot API local (`telegram_local`) e o
+  `Updater.start_polling` do PTB os busca com `getUpdates`;
+- webhook: cada update vai num POST para o servidor embutido do
+  `Updater.start_webhook` em 127.0.0.1, com o header do segredo, até
+  `--conexoes` POSTs simultâneos (o `max_connections` do Telegram) e
+  cada conversa em ordem, o próximo só depois da resposta do anterior.
+
+A rede até o Telegram custa `--rede-ms` de ida e volta: meia volta
+antes de cada POST do webhook, meia em cada ponta do `getUpdates` e a
+volta inteira nas outras chamadas da Bot API. A latência vai do envio
+do update pelo Telegram ao fim dos handlers do bot.
+
+Sem `--gravacao`, grava-se na hora o começo de um agendamento (/start,
+botão "Agendar", nome) de `-n` clientes; `--salvar` guarda essa gravação.
+
+Uso: python benchmarks/recebimento.py [-n 200] [--gravacao updates.jsonl] [--taxa 0]
+                                      [--rede-ms 50] [--atraso-ms 20] [--conexoes 40]
+"""
+import argparse
+import asyncio
+import json
+import socket
+import time
+
+from comum import conectar, importar_bot, percentis, preparar_ambiente
+from postgrest_local import PostgrestLocal
+from telegram_local import TelegramLocal, botao, mensagem
+
+SEGREDO = "segredo-do-benchmark"
+CAMINHO = "telegram"
+ROTEIRO = [("msg", "/start"), ("botao", "agendar"), ("msg", "Cliente de Teste")]
+
+
+def gravar(n):
+    """Os passos de cada cliente intercalados, como chegariam de `n` clientes ao mesmo tempo."""
+    updates, ids = [], iter(range(1, n * len(ROTEIRO) + 1))
+    for tipo, texto in ROTEIRO:
+        for i in range(n):
+            uid = 30_000 + i
+            updates.append(mensagem(uid, texto, next(ids)) if tipo == "msg" else botao(uid, texto, next(ids)))
+    return updates
+
+
+def dono(update):
+    """Id de quem mandou o update (ou do chat), para manter cada conversa em ordem."""
+    for campo in ("message", "edited_message", "callback_query"):
+        if campo in update:
+            corpo = update[campo]
+            return (corpo.get("from") or corpo.get("chat") or {}).get("id")
+    return None
+
+
+def porta_livre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def replay(bot, url, updates, modo, taxa, rede, conexoes):
+    """Devolve (latências em s, duração total em s)."""
+    import httpx
+    from telegram import Update
+    from telegram.ext import Application, TypeHandler
+    from concorrencia import ProcessadorPorConversa
+
+    await conectar(bot, url)
+    recebidos = TelegramLocal(rede)
+    app = bot.montar_app(
+        Application.builder().token("1:local").request(TelegramLocal(rede)).get_updates_request(recebidos)
+        .concurrent_updates(ProcessadorPorConversa(bot.UPDATES_SIMULTANEOS)),
+    )
+    enviado, fim = {}, {}
+    todos = asyncio.Event()
+
+    async def concluido(update, _):
+        fim[update.update_id] = time.perf_counter()
+        if len(fim) == len(updates):
+            todos.set()
+
+    app.add_handler(TypeHandler(Update, concluido), group=99)   # roda depois dos handlers do bot
+    await app.initialize()
+    await app.start()
+    if modo == "polling":
+        await app.updater.start_polling(poll_interval=0, timeout=10, allowed_updates=bot.ATUALIZACOES)
+    else:
+        porta = porta_livre()
+        await app.updater.start_webhook(listen="127.0.0.1", port=porta, url_path=CAMINHO,
+                                        secret_token=SEGREDO, allowed_updates=bot.ATUALIZACOES,
+                                        max_connections=conexoes)
+        endpoint = f"http://127.0.0.1:{porta}/{CAMINHO}"
+
+    inicio = time.perf_counter()
+    quando = [inicio + (i / taxa if taxa else 0) for i in range(len(updates))]
+
+    async def esperar_vez(i):
+        espera = quando[i] - time.perf_counter()
+        if espera > 0:
+            await asyncio.sleep(espera)
+
+    try:
+        if modo == "polling":
+            for i, update in enumerate(updates):
+                await esperar_vez(i)
+                enviado[update["update_id"]] = time.perf_counter()
+                recebidos.publicar([update])
+        else:
+            vagas     = asyncio.Semaphore(conexoes)
+            conversas = {}
+            for i, update in enumerate(updates):
+                conversas.setdefault(dono(update), []).append(i)
+            limites = httpx.Limits(max_connections=conexoes, max_keepalive_connections=conexoes)
+            async with httpx.AsyncClient(limits=limites, timeout=60) as http:
+                async def postar(indices):
+                    for i in indices:
+                        await esperar_vez(i)
+                        async with vagas:
+                            enviado[updates[i]["update_id"]] = time.perf_counter()
+                            await asyncio.sleep(rede / 2)
+                            resposta = await http.post(endpoint, json=updates[i],
+                                                       headers={"X-Telegram-Bot-Api-Secret-Token": SEGREDO})
+                            resposta.raise_for_status()
+
+                await asyncio.gather(*(postar(indices) for indices in conversas.values()))
+        await asyncio.wait_for(todos.wait(), timeout=600)
+        latencias = [fim[u] - enviado[u] for u in fim]
+        return latencias, max(fim.values()) - inicio
+    finally:
+        await app.updater.stop()
+        await app.stop()
+        await app.shutdown()
+        await bot.repo.fechar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=200, help="clientes na gravação gerada na hora")
+    parser.add_argument("--gravacao", help="arquivo JSON Lines com os updates a reenviar")
+    parser.add_argument("--salvar", help="grava em JSON Lines os updates gerados na hora")
+    parser.add_argument("--taxa", type=float, default=0, help="updates por segundo (0: todos de uma vez)")
+    parser.add_argument("--rede-ms", type=float, default=50, help="ida e volta até a Bot API")
+    parser.add_argument("--atraso-ms", type=float, default=20, help="atraso do PostgREST local por requisição")
+    parser.add_argument("--conexoes", type=int, default=40, help="POSTs simultâneos do webhook")
+    args = parser.parse_args()
+
+    if args.gravacao:
+        with open(args.gravacao, encoding="utf-8") as f:
+            updates = [json.loads(linha) for linha in f if linha.strip()]
+    else:
+        updates = gravar(args.n)
+        if args.salvar:
+            with open(args.salvar, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(u, ensure_ascii=False) + "\n" for u in updates)
+
+    with PostgrestLocal(args.atraso_ms / 1000) as postgrest:
+        preparar_ambiente(postgrest.url)
+        bot = importar_bot()
+        asyncio.run(replay(bot, postgrest.url, updates[:50], "polling", 0, 0, args.conexoes))   # aquecimento
+        ritmo = f"{args.taxa:g} por segundo" if args.taxa else "todos de uma vez"
+        print(f"{len(updates)} updates ({ritmo}), {args.rede_ms:g} ms até a Bot API, "
+              f"{args.atraso_ms:g} ms por requisição ao banco\n")
+        print(f"{'modo':<10}{'updates/s':>11}{'p50 (ms)':>10}{'p99 (ms)':>10}{'máx (ms)':>10}")
+        for modo in ("polling", "webhook"):
+            latencias, duracao = asyncio.run(replay(bot, postgrest.url, updates, modo, args.taxa,
+                                                    args.rede_ms / 1000, args.conexoes))
+            p50, p99, maximo = percentis(latencias)
+            print(f"{modo:<10}{len(latencias) / duracao:>11.0f}{p50:>10.1f}{p99:>10.1f}{maximo:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
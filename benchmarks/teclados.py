@@ -0,0 +1,92 @@
+"""Tempo e memória alocada por chamada dos teclados do bot, sem e com o cache.
+
+Cada teclado é medido de duas formas: "antes" chama a função original,
+que monta o markup do zero como o bot fazia a cada update (o
+`__wrapped__` deixado por `functools.cache`, `lru_cache` e
+`por_catalogo`); "depois" chama a versão em cache, como os handlers
+chamam hoje. O tempo vem do `timeit` e a memória do `tracemalloc`
+(pico alocado durante uma chamada, na média). O catálogo tem
+`--servicos` serviços e `--horarios` modelos de horário.
+
+A primeira chamada depois de uma mudança no catálogo custa o mesmo que
+"antes"; todas as outras até a mudança seguinte custam o "depois".
+
+Uso: python benchmarks/teclados.py [--servicos 12] [--horarios 24] [--repeticoes 20000]
+"""
+import argparse
+import timeit
+import tracemalloc
+
+from comum import importar_bot, preparar_ambiente
+
+
+def montar_catalogo(bot, servicos, horarios):
+    from catalogo import Catalogo, Horario, Servico
+
+    modelos = [Horario(i + 1, f"{8 + i * 30 // 60:02d}:{i * 30 % 60:02d}") for i in range(horarios)]
+    bot.catalogo._atual = Catalogo.montar(
+        1, [Servico(f"Serviço {i + 1:02d}", 30 + 15 * (i % 6), 40.0 + i) for i in range(servicos)], modelos,
+    )
+    return [h.horario for h in modelos]
+
+
+def casos(bot, livres):
+    """(nome, chamada antes, chamada depois) — o mesmo teclado pelos dois caminhos."""
+    return [
+        ("menu_admin_kb",        bot.menu_admin_kb.__wrapped__,        bot.menu_admin_kb),
+        ("menu_ti_kb",           bot.menu_ti_kb.__wrapped__,           bot.menu_ti_kb),
+        ("voltar_kb",            lambda: bot.voltar_kb.__wrapped__("ti_voltar"), lambda: bot.voltar_kb("ti_voltar")),
+        ("campos_edicao_kb",     bot.campos_edicao_kb.__wrapped__,     bot.campos_edicao_kb),
+        ("servicos_kb",          bot.servicos_kb.__wrapped__,          bot.servicos_kb),
+        ("horarios_kb",          lambda: bot._horarios_kb.__wrapped__(tuple(livres)), lambda: bot.horarios_kb(livres)),
+        ("remover_servico_kb",   bot.remover_servico_kb.__wrapped__,   bot.remover_servico_kb),
+        ("remover_horario_kb",   bot.remover_horario_kb.__wrapped__,   bot.remover_horario_kb),
+        ("difusao_servicos_kb",  bot.difusao_servicos_kb.__wrapped__,  bot.difusao_servicos_kb),
+    ]
+
+
+def tempo_us(chamada, repeticoes):
+    chamada()   # aquece o cache do "depois"
+    return min(timeit.repeat(chamada, number=repeticoes, repeat=5)) / repeticoes * 1e6
+
+
+def alocado_bytes(chamada, vezes=200):
+    """Pico médio de memória alocada durante uma chamada."""
+    chamada()
+    tracemalloc.start()
+    try:
+        total = 0
+        for _ in range(vezes):
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            chamada()
+            total += tracemalloc.get_traced_memory()[1] - base
+        return total / vezes
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--servicos", type=int, default=12, help="serviços no catálogo")
+    parser.add_argument("--horarios", type=int, default=24, help="modelos de horário no catálogo")
+    parser.add_argument("--repeticoes", type=int, default=20_000, help="chamadas por medida de tempo")
+    args = parser.parse_args()
+
+    preparar_ambiente("http://127.0.0.1:9")   # o bot só é importado, nunca conecta
+    bot    = importar_bot()
+    livres = montar_catalogo(bot, args.servicos, args.horarios)
+
+    print(f"{args.servicos} serviços, {args.horarios} horários\n")
+    print(f"{'teclado':<22}{'antes (µs)':>12}{'depois (µs)':>13}{'antes (B)':>11}{'depois (B)':>12}")
+    somas = [0.0, 0.0, 0.0, 0.0]
+    for nome, antes, depois in casos(bot, livres):
+        medidas = (tempo_us(antes, args.repeticoes), tempo_us(depois, args.repeticoes),
+                   alocado_bytes(antes), alocado_bytes(depois))
+        somas = [s + m for s, m in zip(somas, medidas)]
+        print(f"{nome:<22}{medidas[0]:>12.2f}{medidas[1]:>13.2f}{medidas[2]:>11.0f}{medidas[3]:>12.0f}")
+    print(f"{'um de cada':<22}{somas[0]:>12.2f}{somas[1]:>13.2f}{somas[2]:>11.0f}{somas[3]:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Bot API do Telegram de mentira para os benchmarks, sem rede.
+
+`TelegramLocal` entra no lugar do `HTTPXRequest` do PTB
+(`Application.builder().request(...)`): responde a cada método com um
+resultado plausível e, no `getUpdates`, entrega os updates enfileirados
+com `publicar()` respeitando `offset`, `limit` e a espera do long polling.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+from telegram.request import BaseRequest
+
+BOT = {"id": 1, "is_bot": True, "first_name": "Studio", "username": "studio_bot"}
+
+
+def mensagem(uid, texto, update_id):
+    """Update de mensagem privada da cliente `uid` (comando vira entidade `bot_command`)."""
+    msg = {"message_id": update_id, "date": int(time.time()), "text": texto,
+           "chat": {"id": uid, "type": "private"},
+           "from": {"id": uid, "is_bot": False, "first_name": f"Cliente {uid}"}}
+    if texto.startswith("/"):
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(texto.split()[0])}]
+    return {"update_id": update_id, "message": msg}
+
+
+def botao(uid, dados, update_id):
+    """Update de toque num botão inline `dados` numa mensagem do bot."""
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "chat_instance": str(uid), "data": dados,
+        "from": {"id": uid, "is_bot": False, "first_name": f"Cliente {uid}"},
+        "message": {"message_id": update_id, "date": int(time.time()), "text": "…",
+                    "chat": {"id": uid, "type": "private"}, "from": BOT},
+    }}
+
+
+class TelegramLocal(BaseRequest):
+    def __init__(self, atraso=0.0):
+        self.atraso    = atraso          # segundos de ida e volta por chamada (latência da Bot API)
+        self.chamadas  = Counter()
+        self._updates  = []
+        self._chegou   = asyncio.Event()
+        self._ids      = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def publicar(self, updates):
+        """Enfileira updates para o próximo `getUpdates`."""
+        self._updates.extend(updates)
+        self._chegou.set()
+
+    async def do_request(self, url, method, request_data=None, **_):
+        metodo = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.chamadas[metodo] += 1
+        if metodo == "getUpdates":   # meia volta até o Telegram, a espera do long polling e meia volta de resposta
+            if self.atraso:
+                await asyncio.sleep(self.atraso / 2)
+            updates = await self._get_updates(params)
+            if self.atraso:
+                await asyncio.sleep(self.atraso / 2)
+            return 200, self._corpo(updates)
+        if self.atraso:
+            await asyncio.sleep(self.atraso)
+        if metodo == "getMe":
+            return 200, self._corpo(BOT)
+        if metodo in ("sendMessage", "editMessageText", "sendDocument"):
+            chat = params.get("chat_id", 1)
+            return 200, self._corpo({"message_id": next(self._ids), "date": int(time.time()),
+                                     "chat": {"id": chat, "type": "private"}, "from": BOT,
+                                     "text": params.get("text", "")})
+        return 200, self._corpo(True)
+
+    async def _get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        limite = int(params.get("limit") or 100)
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates:
+            self._chegou.clear()
+            try:
+                await asyncio.wait_for(self._chegou.wait(), timeout=float(params.get("timeout") or 0) or 0.01)
+            except asyncio.TimeoutError:
+                return []
+        return self._updates[:limite]
+
+    @staticmethod
+    def _corpo(resultado):
+        return json.dumps({"ok": True, "result": resultado}).encode()
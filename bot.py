@@ -1,9 +1,14 @@
 import os
 import re
+import asyncio
+import functools
 import logging
-from datetime import datetime
+import unicodedata
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -11,9 +16,27 @@ from telegram.ext import (
     MessageHandler,
     ConversationHandler,
     ContextTypes,
+    TypeHandler,
     filters,
 )
-from supabase import create_client, Client
+from repositorio import RepositorioAgendamentos, HorarioOcupado
+from disponibilidade import IndiceOcupacao
+from agenda import MotorAgenda
+from espera import ListaEspera, FAIXAS
+import historico
+from estatisticas import PainelEstatisticas
+from catalogo import CacheCatalogo
+from persistencia import criar_persistencia
+from notificacoes import FilaNotificacoes
+from lembretes import AgendadorLembretes
+from difusao import Difusao, SEGMENTOS
+from clientes import CacheClientes
+from diario import DiarioEscritas
+from replica import ReplicaAgendamentos
+from concorrencia import ProcessadorPorConversa
+from roteador import TODOS, Roteador, PayloadInvalido, para_base62, de_base62
+import metricas
+from metricas import medir
 
 # ─── Logs ─────────────────────────────────────────────────────────────
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
@@ -25,8 +48,75 @@ TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 SUPABASE_URL   = os.getenv("SUPABASE_URL")
 SUPABASE_KEY   = os.getenv("SUPABASE_KEY")
 
+# Modo de recebimento: "polling" (padrão) ou "webhook"
+MODO           = os.getenv("MODO", "polling")
+WEBHOOK_URL    = os.getenv("WEBHOOK_URL")          # URL pública, ex: https://bot.exemplo.com
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")       # conferido no header X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_PORTA  = int(os.getenv("WEBHOOK_PORTA", "8443"))
+WEBHOOK_CAMINHO = os.getenv("WEBHOOK_CAMINHO", "telegram")
+
+# Estado das conversas: "nenhuma" (só memória), "sqlite" ou "supabase"
+PERSISTENCIA   = os.getenv("PERSISTENCIA", "nenhuma")
+PERSISTENCIA_ARQUIVO   = os.getenv("PERSISTENCIA_ARQUIVO", "estado_bot.sqlite3")
+PERSISTENCIA_INTERVALO = float(os.getenv("PERSISTENCIA_INTERVALO", "5"))
+
+# Endpoint /metrics (Prometheus); desligado se METRICAS_PORTA não for definida
+METRICAS_PORTA = os.getenv("METRICAS_PORTA")
+METRICAS_HOST  = os.getenv("METRICAS_HOST", "127.0.0.1")
+
+# Réplica em memória dos agendamentos ativos para as telas do painel (REPLICA=1)
+REPLICA           = os.getenv("REPLICA", "0") == "1"
+REPLICA_INTERVALO = int(os.getenv("REPLICA_INTERVALO", "60"))
+
+# Agendamentos com mais de ARQUIVO_MESES meses vão para agendamentos_arquivo (0 desliga)
+ARQUIVO_MESES  = int(os.getenv("ARQUIVO_MESES", "12"))
+
+# Updates de clientes diferentes rodam juntos (até este limite); os da mesma cliente, em ordem
+UPDATES_SIMULTANEOS = int(os.getenv("UPDATES_SIMULTANEOS", "64"))
+
+# Os handlers só tratam mensagens e botões; o resto nem precisa chegar
+ATUALIZACOES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
 # ─── Supabase ─────────────────────────────────────────────────────────
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+repo     = RepositorioAgendamentos(SUPABASE_URL, SUPABASE_KEY)
+ocupacao = IndiceOcupacao(repo, ttl=int(os.getenv("OCUPACAO_TTL", "60")))
+painel   = PainelEstatisticas(repo, ttl=int(os.getenv("ESTATISTICAS_TTL", "30")))
+catalogo = CacheCatalogo(repo, intervalo=int(os.getenv("CATALOGO_INTERVALO", "30")))
+agenda   = MotorAgenda(ocupacao, catalogo)
+fila     = FilaNotificacoes(os.getenv("NOTIFICACOES_ARQUIVO", "notificacoes.sqlite3"))
+lembretes = AgendadorLembretes(repo, fila)
+difusao  = Difusao(repo, fila)
+clientes = CacheClientes(repo)
+diario   = DiarioEscritas(repo, os.getenv("DIARIO_ARQUIVO", "diario.sqlite3"))
+replica  = ReplicaAgendamentos(repo, REPLICA_INTERVALO) if REPLICA else None
+arquivador = historico.Arquivador(repo, ARQUIVO_MESES) if ARQUIVO_MESES > 0 else None
+espera   = ListaEspera(repo, ocupacao, agenda, catalogo, reserva_min=int(os.getenv("ESPERA_RESERVA_MIN", "15")))
+
+repo.ao_alterar(ocupacao.ao_alterar)
+repo.ao_alterar(espera.ao_alterar)    # depois da ocupação: o casamento lê o índice já atualizado
+repo.ao_alterar(painel.ao_alterar)
+repo.ao_alterar(lembretes.ao_alterar)
+repo.ao_alterar(clientes.ao_alterar)
+repo.ao_alterar(diario.ao_alterar)
+ocupacao.tolerar_falhas(diario.tolerar)   # banco fora do ar: datas novas ainda aceitam reserva no diário
+if replica:
+    repo.ao_alterar(replica.ao_alterar)
+    diario.usar_copia(replica.obter)
+repo.ao_consultar(metricas.registrar_consulta)
+
+# ─── Métricas ─────────────────────────────────────────────────────────
+perfilador = metricas.Perfilador()
+metricas.REGISTRO.medidor("fila_notificacoes_pendentes", "Mensagens aguardando envio", lambda: fila.pendentes)
+metricas.REGISTRO.medidor("lembretes_programados", "Lembretes no heap", lambda: lembretes.pendentes)
+metricas.REGISTRO.medidor("diario_pendentes", "Escritas aguardando o Supabase", lambda: diario.pendentes)
+metricas.REGISTRO.medidor("diario_mortas", "Escritas do diário recusadas ou com erro, fora da fila", lambda: diario.total_mortas)
+metricas.REGISTRO.medidor("lista_espera_aguardando", "Clientes na lista de espera", lambda: espera.aguardando)
+if replica:
+    metricas.REGISTRO.medidor("replica_agendamentos", "Agendamentos ativos na réplica", lambda: len(replica))
+servidor_metricas = (
+    metricas.ServidorMetricas(metricas.REGISTRO, perfilador, METRICAS_HOST, int(METRICAS_PORTA))
+    if METRICAS_PORTA else None
+)
 
 # ─── IDs ──────────────────────────────────────────────────────────────
 ADMIN_ID = 7539142683
@@ -42,25 +132,102 @@ TI_ID    = 8367937028
     TI_AGUARD_EDITAR_ID,
     TI_AGUARD_EDITAR_CAMPO,
     TI_AGUARD_EDITAR_VALOR,
-) = range(12)
+    AGUARD_DIFUSAO_TEXTO,
+) = range(13)
 
 # ─── Dados dinâmicos ──────────────────────────────────────────────────
-SERVICOS = ["Manicure", "Pedicure", "Alongamento", "Blindagem", "Nail Art"]
-HORARIOS = ["09:00", "10:00", "11:00", "13:00", "14:00", "15:00", "16:00", "17:00"]
+# Serviços e horários ficam nas tabelas `servicos`/`horarios` (ver catalogo.py)
+DIAS_VITRINE = 7   # dias exibidos em "Ver horários disponíveis"
+PAGINA_TAMANHO = 10
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
 
 
 # ══════════════════════════════════════════════════════════════════════
 #  HELPERS
 # ══════════════════════════════════════════════════════════════════════
 
-def validar_data(s):
+def ler_data(s):
+    """Converte DD/MM/AAAA (formato digitado pela cliente) em `date`, ou None."""
     try:
-        return datetime.strptime(s, "%d/%m/%Y").date() >= datetime.now().date()
+        return datetime.strptime(s, "%d/%m/%Y").date()
     except ValueError:
-        return False
+        return None
+
+def validar_data(s):
+    d = ler_data(s)
+    return d is not None and d >= datetime.now().date()
+
+def hoje_iso():
+    return datetime.now().date().isoformat()
+
+def fmt_data(d):
+    """Data do banco (AAAA-MM-DD) → DD/MM/AAAA."""
+    return datetime.strptime(str(d)[:10], "%Y-%m-%d").strftime("%d/%m/%Y")
+
+def fmt_hora(h):
+    """Horário do banco (HH:MM:SS) → HH:MM."""
+    return str(h)[:5]
+
+def dia_semana(data_iso):
+    return date.fromisoformat(data_iso).isoweekday()
+
+def validar_horario(h, data_iso):
+    return catalogo.atual.horario_valido(h, dia_semana(data_iso))
+
+def ler_dia_semana(s):
+    """"Sáb", "sab" ou "6" → 6 (ISO); None se não reconhecer."""
+    s = unicodedata.normalize("NFKD", s.strip().lower()).encode("ascii", "ignore").decode()
+    if s.isdigit() and 1 <= int(s) <= 7:
+        return int(s)
+    for i, nome in enumerate(DIAS_SEMANA, start=1):
+        if s[:3] == unicodedata.normalize("NFKD", nome.lower()).encode("ascii", "ignore").decode():
+            return i
+    return None
+
+def fmt_servico(sv):
+    texto = f"{sv.nome} — {sv.duracao_min} min"
+    if sv.preco is not None:
+        texto += f" — R$ {float(sv.preco):.2f}".replace(".", ",")
+    return texto
+
+def fmt_modelo(h):
+    return h.horario + (f" ({DIAS_SEMANA[h.dia_semana - 1]})" if h.dia_semana else "")
+
+# ─── Teclados em cache ─────────────────────────────────────────────────
+# Os objetos de markup do PTB são imutáveis, então a mesma instância pode
+# ir em todas as respostas. Menus fixos são montados uma vez; os que vêm
+# do catálogo são refeitos só quando o snapshot do catálogo muda.
+
+REMOVER_TECLADO = ReplyKeyboardRemove()
 
-def validar_horario(h):
-    return h in HORARIOS
+def por_catalogo(construir):
+    """Memoiza `construir()` enquanto `catalogo.atual` for o mesmo snapshot."""
+    cache = {"snapshot": None, "markup": None}
+
+    @functools.wraps(construir)
+    def envolto():
+        atual = catalogo.atual
+        if cache["snapshot"] is not atual:
+            cache["markup"], cache["snapshot"] = construir(), atual
+        return cache["markup"]
+
+    return envolto
+
+@por_catalogo
+def servicos_kb():
+    return ReplyKeyboardMarkup([[s] for s in catalogo.atual.nomes_servicos], one_time_keyboard=True, resize_keyboard=True)
+
+def proximos_livres(livres, horario):
+    """Horários livres a partir de `horario`, seguidos dos anteriores."""
+    return [h for h in livres if h > horario] + [h for h in livres if h < horario]
+
+def horarios_kb(horarios):
+    return _horarios_kb(tuple(horarios))
+
+@functools.lru_cache(maxsize=256)
+def _horarios_kb(horarios):
+    # A chave é o próprio conteúdo (horários livres), então não há o que invalidar
+    return ReplyKeyboardMarkup([horarios[i:i+2] for i in range(0, len(horarios), 2)], one_time_keyboard=True, resize_keyboard=True)
 
 async def safe_edit(query, text, markup=None, parse_mode="Markdown"):
     """Edita mensagem ignorando erro de conteúdo idêntico."""
@@ -80,12 +247,47 @@ def fmt_ag(ag):
     emoji  = {"pendente": "⏳", "confirmado": "✅", "cancelado": "❌"}.get(status, "⏳")
     return (
         f"{emoji} *{ag['nome']}* — {ag['servico']}\n"
-        f"   📅 {ag['data']} às 🕐 {ag['horario']} | {status.upper()}\n"
-        f"   🆔 `{str(ag['id'])[:8]}`\n"
+        f"   📅 {fmt_data(ag['data'])} às 🕐 {fmt_hora(ag['horario'])} | {status.upper()}\n"
+        f"   🆔 `{ag.get('codigo') or str(ag['id'])[:8]}`\n"
+    )
+
+def texto_lembrete(ag, tipo):
+    dia = date.fromisoformat(str(ag["data"])[:10])
+    if tipo != "24h":
+        quando = "daqui a pouco"
+    elif dia == date.today():
+        quando = "hoje"
+    elif dia == date.today() + timedelta(days=1):
+        quando = "amanhã"
+    else:
+        quando = f"em {fmt_data(ag['data'])}"
+    return (
+        f"⏰ *Lembrete:* seu horário no Studio Dandara Britto é {quando}! 👑\n\n"
+        f"💅 *Serviço:* {ag['servico']}\n"
+        f"📅 *Data:* {fmt_data(ag['data'])}\n"
+        f"🕐 *Horário:* {fmt_hora(ag['horario'])}\n\n"
+        "_Estamos à sua espera, querida!_ 🌸"
+    )
+
+def texto_confirmado(ag):
+    return (
+        "✅ *Seu agendamento foi confirmado!* 👑\n\n"
+        f"💅 *Serviço:* {ag['servico']}\n"
+        f"📅 *Data:* {fmt_data(ag['data'])}\n"
+        f"🕐 *Horário:* {fmt_hora(ag['horario'])}\n\n"
+        "_Te esperamos! Até lá, querida!_ 🌸"
+    )
+
+def texto_cancelado(ag):
+    return (
+        "😔 *Seu agendamento foi cancelado.*\n\n"
+        f"📅 {fmt_data(ag['data'])} às 🕐 {fmt_hora(ag['horario'])}\n\n"
+        "_Entre em contato para reagendar._ 🌸"
     )
 
 # ─── Menus ────────────────────────────────────────────────────────────
 
+@functools.cache
 def menu_admin_kb():
     return InlineKeyboardMarkup([
         [InlineKeyboardButton("📋 Agendamentos de hoje",  callback_data="adm_hoje")],
@@ -94,8 +296,10 @@ def menu_admin_kb():
         [InlineKeyboardButton("❌ Cancelar agendamento",   callback_data="adm_cancelar_ag")],
         [InlineKeyboardButton("🗑 Excluir agendamento",   callback_data="excluir_menu")],
         [InlineKeyboardButton("💬 Enviar msg a cliente",  callback_data="adm_msg")],
+        [InlineKeyboardButton("📣 Mensagem para um grupo", callback_data="adm_difusao")],
     ])
 
+@functools.cache
 def menu_ti_kb():
     return InlineKeyboardMarkup([
         [InlineKeyboardButton("📋 Ver todos agendamentos",   callback_data="ti_todos")],
@@ -107,16 +311,42 @@ def menu_ti_kb():
         [InlineKeyboardButton("🕐 Remover horário",          callback_data="ti_del_horario")],
         [InlineKeyboardButton("📊 Estatísticas",             callback_data="ti_stats")],
         [InlineKeyboardButton("🔄 Listar serviços/horários", callback_data="ti_listar")],
+        [InlineKeyboardButton("🔬 Perfilador (ligar/desligar)", callback_data="ti_perfil")],
     ])
 
+@functools.lru_cache(maxsize=32)
 def voltar_kb(destino):
     return InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Voltar", callback_data=destino)]])
 
+@functools.cache
+def espera_kb():
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton(rotulo, callback_data=f"espera_entrar:{faixa}") for faixa, (_, _, rotulo) in FAIXAS.items()
+    ]])
+
+@functools.cache
+def campos_edicao_kb():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("👤 Nome",    callback_data=rotas.dados("edit_campo", Campo.de("nome")))],
+        [InlineKeyboardButton("💅 Serviço", callback_data=rotas.dados("edit_campo", Campo.de("servico")))],
+        [InlineKeyboardButton("📅 Data",    callback_data=rotas.dados("edit_campo", Campo.de("data")))],
+        [InlineKeyboardButton("🕐 Horário", callback_data=rotas.dados("edit_campo", Campo.de("horario")))],
+        [InlineKeyboardButton("🔙 Voltar",  callback_data="ti_voltar")],
+    ])
+
+def texto_edicao(ag):
+    return (
+        f"✏️ *Editando: {ag['nome']}* (🆔 `{ag['codigo']}`)\n\n"
+        f"💅 {ag['servico']} | 📅 {fmt_data(ag['data'])} às {fmt_hora(ag['horario'])}\n\n"
+        "*Qual campo alterar?*"
+    )
+
 
 # ══════════════════════════════════════════════════════════════════════
 #  FLUXO CLIENTE
 # ══════════════════════════════════════════════════════════════════════
 
+@medir
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     kb = InlineKeyboardMarkup([
         [InlineKeyboardButton("📅 Agendar horário",          callback_data="agendar")],
@@ -133,14 +363,22 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     )
     return MENU
 
+@medir
 async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     query = update.callback_query
     await query.answer()
 
     if query.data == "horarios":
-        texto = "\n".join(f"🕐 {h}" for h in HORARIOS)
+        hoje  = datetime.now().date()
+        datas = [(hoje + timedelta(days=i)).isoformat() for i in range(DIAS_VITRINE)]
+        await ocupacao.carregar(datas)
+        linhas = []
+        for d in datas:
+            livres = await agenda.livres(d)
+            linhas.append(f"📅 *{fmt_data(d)}:* " + (", ".join(livres) if livres else "_lotado_"))
+        texto = "\n".join(linhas)
         await query.edit_message_text(
-            f"🕐 *Os horários disponíveis nesta temporada são:*\n\n{texto}\n\n"
+            f"🕐 *Os horários disponíveis nos próximos dias são:*\n\n{texto}\n\n"
             "_A agenda da Dandara é bastante disputada, querida. "
             "Não deixe para amanhã o que pode ser agendado hoje._ 🌸\n\n"
             "Use /start para agendar.",
@@ -148,6 +386,19 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         )
         return ConversationHandler.END
 
+    nome = await clientes.nome(query.from_user.id)
+    if nome:
+        # Cliente de volta: pula a pergunta do nome
+        context.user_data["nome"]        = nome
+        context.user_data["telegram_id"] = query.from_user.id
+        await query.edit_message_text(
+            f"✨ *Que alegria revê-la, {nome}!* 👑\n\n"
+            "_Agendando para outra pessoa? Envie /nome._",
+            parse_mode="Markdown",
+        )
+        await query.message.reply_text("Qual serviço a senhora deseja?", reply_markup=servicos_kb())
+        return SERVICO
+
     await query.edit_message_text(
         "✨ *Esplêndido! Uma escolha verdadeiramente sábia.*\n\n"
         "Permita-me colher algumas informações. 📋\n\n"
@@ -156,6 +407,7 @@ async def menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     )
     return NOME
 
+@medir
 async def receber_nome(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     nome = update.message.text.strip()
     if len(nome) < 2:
@@ -163,26 +415,35 @@ async def receber_nome(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         return NOME
     context.user_data["nome"]        = nome
     context.user_data["telegram_id"] = update.effective_user.id
-    markup = ReplyKeyboardMarkup([[s] for s in SERVICOS], one_time_keyboard=True, resize_keyboard=True)
+    markup = servicos_kb()
     await update.message.reply_text(
         f"_Que nome encantador,_ *{nome}*! 👑\n\nQual serviço a senhora deseja?",
         reply_markup=markup, parse_mode="Markdown",
     )
     return SERVICO
 
+@medir
+async def trocar_nome(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    await update.message.reply_text(
+        "Qual é o *nome completo* para este agendamento?",
+        reply_markup=REMOVER_TECLADO, parse_mode="Markdown",
+    )
+    return NOME
+
+@medir
 async def receber_servico(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     servico = update.message.text.strip()
-    if servico not in SERVICOS:
-        markup = ReplyKeyboardMarkup([[s] for s in SERVICOS], one_time_keyboard=True, resize_keyboard=True)
-        await update.message.reply_text("🌸 Escolha um serviço da lista:", reply_markup=markup)
+    if not catalogo.atual.tem_servico(servico):
+        await update.message.reply_text("🌸 Escolha um serviço da lista:", reply_markup=servicos_kb())
         return SERVICO
     context.user_data["servico"] = servico
     await update.message.reply_text(
         f"*{servico}* — uma escolha impecável! ✨\n\nInforme a *data* no formato *DD/MM/AAAA*:",
-        reply_markup=ReplyKeyboardRemove(), parse_mode="Markdown",
+        reply_markup=REMOVER_TECLADO, parse_mode="Markdown",
     )
     return DATA
 
+@medir
 async def receber_data(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     data_str = update.message.text.strip()
     if not validar_data(data_str):
@@ -191,60 +452,127 @@ async def receber_data(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             parse_mode="Markdown",
         )
         return DATA
-    context.user_data["data"] = data_str
-    markup = ReplyKeyboardMarkup([HORARIOS[i:i+2] for i in range(0, len(HORARIOS), 2)], one_time_keyboard=True, resize_keyboard=True)
+    data_iso = ler_data(data_str).isoformat()
+    servico  = context.user_data["servico"]
+    remarcar = context.user_data.get("remarcar")
+    try:
+        livres = await agenda.livres(data_iso, servico, remarcar)
+        vagas  = await agenda.primeiros_livres(servico, ignorar=remarcar) if not livres else []
+    except Exception as e:
+        logger.error(f"Erro ao consultar a agenda de {data_iso}: {e}")
+        await update.message.reply_text(
+            "😔 *Desculpe, minha cara.* Não consegui consultar a agenda agora.\n"
+            "Informe a data de novo em instantes (*DD/MM/AAAA*). 🌸",
+            parse_mode="Markdown",
+        )
+        return DATA
+    if not livres:
+        dicas = "\n".join(f"• {fmt_data(d)} às {h}" for d, h in vagas)
+        await update.message.reply_text(
+            f"😔 *{data_str}* já está com a agenda completa, minha cara.\n\n" +
+            (f"Próximas vagas para *{servico}*:\n{dicas}\n\n" if dicas else "") +
+            "Informe outra data no formato *DD/MM/AAAA*" +
+            ("." if remarcar else " ou entre na *lista de espera* — aviso se vagar:"),
+            reply_markup=None if remarcar else pedir_espera(context, data_iso),
+            parse_mode="Markdown",
+        )
+        return DATA
+    context.user_data["data"] = data_iso
     await update.message.reply_text(
         f"📅 *{data_str}* anotado! 🌸\n\nEm qual *horário* deseja ser recebida?",
-        reply_markup=markup, parse_mode="Markdown",
+        reply_markup=horarios_kb(livres), parse_mode="Markdown",
     )
     return HORARIO
 
+@medir
 async def receber_horario(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    horario = update.message.text.strip()
-    if not validar_horario(horario):
-        markup = ReplyKeyboardMarkup([HORARIOS[i:i+2] for i in range(0, len(HORARIOS), 2)], one_time_keyboard=True, resize_keyboard=True)
-        await update.message.reply_text("🌸 Horário inválido. Escolha um da lista:", reply_markup=markup)
+    horario  = update.message.text.strip()
+    data     = context.user_data["data"]
+    servico  = context.user_data["servico"]
+    remarcar = context.user_data.get("remarcar")
+    # {horario: profissional} onde o serviço cabe inteiro, já contando a duração
+    try:
+        encaixes = await agenda.encaixes(data, servico, remarcar)
+    except Exception as e:
+        logger.error(f"Erro ao consultar a agenda de {data}: {e}")
+        await update.message.reply_text(
+            "😔 *Desculpe, minha cara.* Não consegui consultar a agenda agora.\n"
+            "Envie o horário de novo em instantes. 🌸",
+            parse_mode="Markdown",
+        )
+        return HORARIO
+    if not validar_horario(horario, data) or horario not in encaixes:
+        await update.message.reply_text("🌸 Horário inválido ou já reservado. Escolha um da lista:", reply_markup=horarios_kb(list(encaixes)))
         return HORARIO
 
     nome    = context.user_data["nome"]
-    servico = context.user_data["servico"]
-    data    = context.user_data["data"]
     tg_id   = context.user_data.get("telegram_id")
+    vaga    = {"profissional_id": encaixes[horario], "duracao_min": catalogo.atual.duracao(servico)}
 
-    await update.message.reply_text("✨ Registrando seu agendamento...", reply_markup=ReplyKeyboardRemove())
+    await update.message.reply_text("✨ Registrando seu agendamento...", reply_markup=REMOVER_TECLADO)
 
     try:
-        res   = supabase.table("agendamentos").insert({
-            "nome": nome, "servico": servico, "data": data,
-            "horario": horario, "telegram_id": str(tg_id), "status": "pendente",
-        }).execute()
-        ag_id = res.data[0]["id"] if res.data else "?"
-        ok    = True
+        if remarcar:
+            # Volta a pendente e zera os lembretes; o índice único impede conflito
+            ag = await repo.atualizar_do_cliente(remarcar, tg_id, {
+                "data": data, "horario": horario, "status": "pendente",
+                "lembrete_24h_em": None, "lembrete_2h_em": None, **vaga,
+            })
+        else:
+            # Com o Supabase fora do ar a reserva entra no diário local e é confirmada igual
+            ag = await diario.inserir({
+                "nome": nome, "servico": servico, "data": data,
+                "horario": horario, "telegram_id": str(tg_id), "status": "pendente", **vaga,
+            })
+        ag_id = ag["codigo"] if ag else "?"
+        ok    = ag is not None
+    except HorarioOcupado:
+        # Outra cliente reservou o mesmo horário primeiro: oferece os próximos livres
+        ocupacao.invalidar(data)
+        livres = proximos_livres(await agenda.livres(data, servico, remarcar), horario)
+        if not livres:
+            await update.message.reply_text(
+                f"😔 *Que pena, minha cara!* O horário das {horario} acabou de ser reservado "
+                f"e *{fmt_data(data)}* está com a agenda completa.\n\n"
+                "Informe outra data no formato *DD/MM/AAAA*" +
+                ("." if remarcar else " ou entre na *lista de espera* — aviso se vagar:"),
+                reply_markup=None if remarcar else pedir_espera(context, data),
+                parse_mode="Markdown",
+            )
+            return DATA
+        await update.message.reply_text(
+            f"😔 *Que pena, minha cara!* O horário das {horario} acabou de ser reservado.\n\n"
+            "Estes são os próximos horários livres nesta data:",
+            reply_markup=horarios_kb(livres), parse_mode="Markdown",
+        )
+        return HORARIO
     except Exception as e:
         logger.error(f"Supabase insert error: {e}")
         ok    = False
         ag_id = "?"
 
     if ok:
-        await update.message.reply_text(
+        cabecalho = (
+            "🔁 *Agendamento remarcado!*\n\n" if remarcar else
             "👑 *Que notícia esplêndida!*\n\n"
             "Seu agendamento foi registrado! Os fofoqueiros da sociedade "
             "já estão comentando sobre sua próxima visita! 🌸\n\n"
+        )
+        await update.message.reply_text(
+            cabecalho +
             f"👤 *Nome:* {nome}\n💅 *Serviço:* {servico}\n"
-            f"📅 *Data:* {data}\n🕐 *Horário:* {horario}\n\n"
+            f"📅 *Data:* {fmt_data(data)}\n🕐 *Horário:* {horario}\n\n"
             "_Aguarde a confirmação. Até breve, querida!_ 💖",
             parse_mode="Markdown",
         )
         try:
-            await context.bot.send_message(
-                chat_id=ADMIN_ID,
-                text=(
-                    "🔔 *Novo agendamento!*\n\n"
-                    f"👤 *Nome:* {nome}\n💅 *Serviço:* {servico}\n"
-                    f"📅 *Data:* {data}\n🕐 *Horário:* {horario}\n"
-                    f"🆔 `{ag_id}`\n\nUse /admin para confirmar. 👑"
-                ),
-                parse_mode="Markdown",
+            await fila.enviar(
+                ADMIN_ID,
+                ("🔁 *Agendamento remarcado pela cliente!*\n\n" if remarcar else "🔔 *Novo agendamento!*\n\n") +
+                f"👤 *Nome:* {nome}\n💅 *Serviço:* {servico}\n"
+                f"📅 *Data:* {fmt_data(data)}\n🕐 *Horário:* {horario}\n"
+                f"🆔 `{ag_id}`\n\nUse /admin para confirmar. 👑" +
+                ("\n\n⚠️ _Banco fora do ar: gravado no diário local, será sincronizado._" if diario.degradado else ""),
             )
         except Exception as e:
             logger.warning(f"Erro ao notificar admin: {e}")
@@ -256,11 +584,156 @@ async def receber_horario(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     context.user_data.clear()
     return ConversationHandler.END
 
+# ── Lista de espera ───────────────────────────────────────────────────
+
+def pedir_espera(context, data):
+    """Lembra a data lotada para o botão de entrar na lista de espera."""
+    context.user_data["espera"] = data
+    return espera_kb()
+
+async def ofertar_vaga(bot, oferta):
+    """Vai direto, sem a fila de notificações: a oferta tem prazo e não pode esperar atrás de uma difusão."""
+    e = oferta.entrada
+    await bot.send_message(
+        chat_id=int(e.telegram_id),
+        text=(
+            f"🔔 *Vagou um horário, {e.nome}!*\n\n"
+            f"💅 *Serviço:* {e.servico}\n📅 *Data:* {fmt_data(oferta.data)}\n🕐 *Horário:* {oferta.horario}\n\n"
+            f"_Ele fica reservado para você por {espera.reserva_min} minutos._ 🌸"
+        ),
+        parse_mode="Markdown",
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton("✅ Quero este horário", callback_data=f"espera_aceitar:{oferta.token}"),
+            InlineKeyboardButton("Não, obrigada",        callback_data=f"espera_recusar:{oferta.token}"),
+        ]]),
+    )
+
+@medir
+async def espera_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Botões da lista de espera; funcionam dentro ou fora de uma conversa (devolve None: mantém o estado)."""
+    query = update.callback_query
+    uid   = query.from_user.id
+    acao, _, arg = query.data[len("espera_"):].partition(":")
+
+    if acao == "entrar":
+        await query.answer()
+        ud   = context.user_data
+        data = ud.get("espera")
+        if not data or arg not in FAIXAS or not ud.get("servico") or not ud.get("nome"):
+            await safe_edit(query, "⚠️ _Pedido desatualizado._ Use /start novamente.")
+            return
+        await espera.entrar(uid, ud["nome"], ud["servico"], data, arg)
+        await safe_edit(query,
+            f"🔔 *Você está na lista de espera de {fmt_data(data)}* ({FAIXAS[arg][2]}).\n\n"
+            "_Se um horário vagar, aviso na hora, querida!_ 🌸\n\n"
+            "Se preferir, informe outra data no formato *DD/MM/AAAA*.")
+        return
+
+    if acao == "recusar":
+        await query.answer()
+        await espera.recusar(arg, uid)
+        await safe_edit(query, "🌸 _Tudo bem! A vaga vai para outra cliente e você continua na lista._")
+        return
+
+    oferta = espera.aceitar(arg, uid)
+    if oferta is None:
+        await query.answer("⌛ Esta oferta expirou.", show_alert=True)
+        await safe_edit(query, "⌛ _Esta oferta expirou._ Você continua na lista de espera. 🌸")
+        return
+    await query.answer()
+    e, ag = oferta.entrada, None
+    try:
+        ag = await diario.inserir({
+            "nome": e.nome, "servico": e.servico, "data": oferta.data, "horario": oferta.horario,
+            "telegram_id": e.telegram_id, "status": "pendente",
+            "profissional_id": oferta.profissional_id, "duracao_min": oferta.duracao_min,
+        })
+    except HorarioOcupado:
+        pass
+    except Exception as ex:
+        logger.error(f"Erro ao gravar agendamento da lista de espera: {ex}")
+    await espera.concluir(oferta, ag is not None)
+    if ag is None:
+        await safe_edit(query, "😔 _Que pena, o horário acabou de ser ocupado._ Você continua na lista de espera.")
+        return
+    await safe_edit(query,
+        f"👑 *Vaga garantida!*\n\n💅 *Serviço:* {e.servico}\n"
+        f"📅 *Data:* {fmt_data(oferta.data)}\n🕐 *Horário:* {oferta.horario}\n\n"
+        "_Aguarde a confirmação. Até breve, querida!_ 💖")
+    try:
+        await fila.enviar(
+            ADMIN_ID,
+            "🔔 *Novo agendamento (lista de espera)!*\n\n"
+            f"👤 *Nome:* {e.nome}\n💅 *Serviço:* {e.servico}\n"
+            f"📅 *Data:* {fmt_data(oferta.data)}\n🕐 *Horário:* {oferta.horario}\n"
+            f"🆔 `{ag['codigo']}`\n\nUse /admin para confirmar. 👑",
+        )
+    except Exception as ex:
+        logger.warning(f"Erro ao notificar admin: {ex}")
+
+# ── Leituras do painel ────────────────────────────────────────────────
+
+def replica_pronta():
+    return replica is not None and replica.pronta
+
+async def ags_do_dia(data):
+    """Agendamentos da data: da réplica (só os ativos) quando ligada; senão do banco."""
+    if replica_pronta():
+        return replica.por_data(data)
+    return await diario.ler(repo.listar_por_data, data)
+
+async def ags_por_status(*status):
+    """Agendamentos de hoje em diante com um dos `status`."""
+    if replica_pronta():
+        return replica.por_status(*status, desde=hoje_iso())
+    return await diario.ler(repo.listar_por_status, *status, desde=hoje_iso())
+
+async def ags_do_cliente(tg_id):
+    if replica_pronta():
+        return replica.do_cliente(tg_id, hoje_iso())
+    return await repo.do_cliente(tg_id, hoje_iso())
+
+# ── Minhas reservas ───────────────────────────────────────────────────
+
+async def listar_minhas(context, tg_id, query=None, mensagem=None):
+    """Próximos agendamentos da cliente, com cancelar e remarcar; os botões vão para as rotas `minha_*`."""
+    ags = await ags_do_cliente(tg_id)
+    context.user_data.clear()
+    context.user_data["minhas"] = {
+        ag["id"]: {k: ag[k] for k in ("codigo", "nome", "servico", "data", "horario")} for ag in ags
+    }
+    if not ags:
+        texto, markup = "🌸 _Você não tem agendamentos futuros._\n\nUse /start para agendar.", None
+    else:
+        linhas, botoes = ["👑 *Seus próximos agendamentos:*\n"], []
+        for ag in ags:
+            linhas.append(fmt_ag(ag))
+            rotulo = f"{fmt_data(ag['data'])} {fmt_hora(ag['horario'])}"
+            botoes.append([
+                InlineKeyboardButton(f"❌ Cancelar {rotulo}", callback_data=rotas.dados("minha_cancelar", PorId(ag["id"]))),
+                InlineKeyboardButton("🔁 Remarcar",          callback_data=rotas.dados("minha_remarcar", PorId(ag["id"]))),
+            ])
+        texto, markup = "\n".join(linhas), InlineKeyboardMarkup(botoes)
+    if query:
+        await safe_edit(query, texto, markup)
+    else:
+        await mensagem.reply_text(texto, reply_markup=markup, parse_mode="Markdown")
+    return MENU
+
+@medir
+async def minhas(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """/minhas — próximos agendamentos da própria cliente."""
+    return await listar_minhas(context, update.effective_user.id, mensagem=update.message)
+
+@medir
+async def minhas_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    return await rotas.despachar(update, context)
+
 async def cancelar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     context.user_data.clear()
     await update.message.reply_text(
         "🌸 *Como desejar.*\n\n_Quando estiver pronta, use /start._ 👑",
-        reply_markup=ReplyKeyboardRemove(), parse_mode="Markdown",
+        reply_markup=REMOVER_TECLADO, parse_mode="Markdown",
     )
     return ConversationHandler.END
 
@@ -269,6 +742,7 @@ async def cancelar(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 #  PAINEL ADMIN / TI
 # ══════════════════════════════════════════════════════════════════════
 
+@medir
 async def painel_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     uid = update.effective_user.id
     if uid == ADMIN_ID:
@@ -298,390 +772,913 @@ def voltar_label(uid):
     return "adm_voltar" if uid == ADMIN_ID else "ti_voltar"
 
 
-# ── Callback principal ────────────────────────────────────────────────
-
-async def admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    query   = update.callback_query
-    uid     = query.from_user.id
-    data    = query.data
-
-    if uid not in {ADMIN_ID, TI_ID}:
-        await query.answer("Acesso negado.", show_alert=True)
-        return ConversationHandler.END
+# ── Listagens paginadas ───────────────────────────────────────────────
 
-    await query.answer()
-    menu_kb = voltar_menu_kb(uid)
+def chave_ag(ag):
+    return [ag["data"], ag["horario"], ag["id"]]
 
-    # ══ EXCLUIR — disponível para AMBOS ══════════════════════════════
+async def tela_paginada(query, context, uid, tela, direcao=None):
+    """Exibe uma página de `tela` (adm_todos, ti_todos ou excluir_menu).
 
-    if data == "excluir_menu":
-        # Lista todos os agendamentos com botão de exclusão
-        res = supabase.table("agendamentos").select("*").order("data").order("horario").execute()
-        ags = res.data
+    O cursor (primeira/última chave da página) fica em `context.user_data`,
+    então cada clique em ◀️/▶️ custa uma única consulta limitada.
+    """
+    estado = context.user_data.get(f"pagina_{tela}")
+    if direcao == "prox" and estado:
+        ags, mais = await diario.ler(repo.pagina, apos=estado["ultimo"], limite=PAGINA_TAMANHO)
+        estado = {"pagina": estado["pagina"] + 1, "tem_anterior": True, "tem_proxima": mais}
+    elif direcao == "ant" and estado:
+        ags, mais = await diario.ler(repo.pagina, antes=estado["primeiro"], limite=PAGINA_TAMANHO)
+        estado = {"pagina": max(estado["pagina"] - 1, 1), "tem_anterior": mais, "tem_proxima": True}
+    else:
+        ags = []
+    if not ags:
+        ags, mais = await diario.ler(repo.pagina, limite=PAGINA_TAMANHO)
+        estado = {"pagina": 1, "tem_anterior": False, "tem_proxima": mais}
+    if ags:
+        estado["primeiro"], estado["ultimo"] = chave_ag(ags[0]), chave_ag(ags[-1])
+    context.user_data[f"pagina_{tela}"] = estado
+
+    voltar = voltar_label(uid) if tela == "excluir_menu" else ("adm_voltar" if tela == "adm_todos" else "ti_voltar")
+    nav = []
+    if estado["tem_anterior"]:
+        nav.append(InlineKeyboardButton("◀️", callback_data=rotas.dados("pag", Paginacao("ant", tela))))
+    if estado["tem_proxima"]:
+        nav.append(InlineKeyboardButton("▶️", callback_data=rotas.dados("pag", Paginacao("prox", tela))))
+    rodape = ([nav] if nav else []) + [[InlineKeyboardButton("🔙 Voltar", callback_data=voltar)]]
+    pag = estado["pagina"]
+
+    if tela == "excluir_menu":
         if not ags:
-            await safe_edit(query, "🗑 *Excluir agendamento:*\n\n_Nenhum agendamento encontrado._", menu_kb)
-            return MENU
-
+            await safe_edit(query, "🗑 *Excluir agendamento:*\n\n_Nenhum agendamento encontrado._", voltar_menu_kb(uid))
+            return
         botoes = []
         for ag in ags:
             status_emoji = {"pendente": "⏳", "confirmado": "✅", "cancelado": "❌"}.get(ag.get("status",""), "⏳")
-            label = f"{status_emoji} {ag['nome']} — {ag['data']} {ag['horario']}"
-            botoes.append([InlineKeyboardButton(label, callback_data=f"excluir_{ag['id']}")])
-        botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data=voltar_label(uid))])
+            label = f"{status_emoji} {ag['nome']} — {fmt_data(ag['data'])} {fmt_hora(ag['horario'])}"
+            botoes.append([InlineKeyboardButton(label, callback_data=rotas.dados("excluir", PorId(ag["id"])))])
+        guardar_itens(context, "excluir_menu", ags)
+        botoes.append([InlineKeyboardButton("☑️ Selecionar vários", callback_data=rotas.dados("multi", TelaLote("excluir_menu")))])
+        await safe_edit(query, f"🗑 *Selecione o agendamento para excluir (página {pag}):*", InlineKeyboardMarkup(botoes + rodape))
+        return
+
+    if tela == "adm_todos":
+        titulo, vazio = "📅 *Todos os agendamentos", "📅 *Todos os agendamentos:*\n\n_Nenhum agendamento._ 🌸"
+    else:
+        titulo, vazio = "📋 *Todos", "📋 *Agendamentos:*\n\n_Nenhum agendamento encontrado._"
+    if not ags:
+        texto = vazio
+    else:
+        linhas = [f"{titulo} — página {pag}:*\n"]
+        for ag in ags:
+            linhas.append(fmt_ag(ag))
+        texto = "\n".join(linhas)
+    await safe_edit(query, texto, InlineKeyboardMarkup(rodape))
+
+
+# ── Seleção múltipla ──────────────────────────────────────────────────
+
+# tela -> (rótulo do botão de ação, novo status; None = excluir, texto ao cliente)
+ACOES_LOTE = {
+    "adm_confirmar":   ("✅ Confirmar selecionados", "confirmado", texto_confirmado),
+    "adm_cancelar_ag": ("❌ Cancelar selecionados",  "cancelado",  texto_cancelado),
+    "excluir_menu":    ("🗑 Excluir selecionados",   None,         None),
+}
+
+def guardar_itens(context, tela, ags):
+    """Lembra os itens exibidos para que a seleção não precise consultar o banco de novo."""
+    context.user_data[f"itens_{tela}"] = [
+        [ag["id"], f"{ag['nome']} — {fmt_data(ag['data'])} {fmt_hora(ag['horario'])}"] for ag in ags
+    ]
+
+async def tela_selecao(query, context):
+    """Redesenha a tela de seleção a partir do estado em `context.user_data["lote"]`."""
+    lote   = context.user_data["lote"]
+    sel    = set(lote["sel"])
+    rotulo = ACOES_LOTE[lote["tela"]][0]
+    botoes = [[InlineKeyboardButton(
+        f"{'✅' if ag_id in sel else '⬜'} {label}", callback_data=rotas.dados("sel", PorId(ag_id))
+    )] for ag_id, label in lote["itens"]]
+    if sel:
+        botoes.append([InlineKeyboardButton(f"{rotulo} ({len(sel)})", callback_data="lote_executar")])
+    botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data=lote["tela"])])
+    await safe_edit(query, f"☑️ *Toque para marcar ou desmarcar — {len(sel)} selecionado(s):*", InlineKeyboardMarkup(botoes))
+
+async def notificar_clientes(ags, texto):
+    """Enfileira as mensagens de todos os clientes ao mesmo tempo."""
+    destinos  = [ag for ag in ags if ag.get("telegram_id")]
+    resultado = await asyncio.gather(
+        *(fila.enviar(ag["telegram_id"], texto(ag)) for ag in destinos), return_exceptions=True
+    )
+    for ag, r in zip(destinos, resultado):
+        if isinstance(r, Exception):
+            logger.warning(f"Erro ao notificar cliente {ag['telegram_id']}: {r}")
+
+async def executar_lote(query, context, uid):
+    """Aplica a ação da tela a todos os selecionados numa única requisição."""
+    lote = context.user_data.pop("lote", None)
+    if not lote or not lote["sel"]:
+        await safe_edit(query, "⚠️ _Nenhum agendamento selecionado._", voltar_menu_kb(uid))
+        return
+    _, status, texto = ACOES_LOTE[lote["tela"]]
+    try:
+        if status:
+            ags = await diario.atualizar_status_lote(lote["sel"], status)
+        else:
+            ags = await repo.excluir_lote(lote["sel"])
+    except Exception as e:
+        await safe_edit(query, f"❌ Erro na operação em lote: {e}", voltar_menu_kb(uid))
+        return
+    acao = {"confirmado": "confirmado(s)", "cancelado": "cancelado(s)"}.get(status, "excluído(s)")
+    linhas = [f"*{len(ags)} agendamento(s) {acao}:*\n"]
+    linhas += [f"• {ag['nome']} — {fmt_data(ag['data'])} {fmt_hora(ag['horario'])}" for ag in ags]
+    await safe_edit(query, "\n".join(linhas), voltar_menu_kb(uid))
+    if texto:
+        await notificar_clientes(ags, texto)
 
-        await safe_edit(query, "🗑 *Selecione o agendamento para excluir:*", InlineKeyboardMarkup(botoes))
-        return MENU
 
-    elif data.startswith("excluir_"):
-        ag_id = data.replace("excluir_", "")
-        try:
-            res = supabase.table("agendamentos").select("*").eq("id", ag_id).execute()
-            ag  = res.data[0] if res.data else None
-            supabase.table("agendamentos").delete().eq("id", ag_id).execute()
-            nome = ag["nome"] if ag else "?"
-            await safe_edit(query,
-                f"🗑 *Agendamento de {nome} excluído com sucesso!*",
-                menu_kb)
-        except Exception as e:
-            await safe_edit(query, f"❌ Erro ao excluir: {e}", menu_kb)
-        return MENU
+# ── Rotas dos painéis ─────────────────────────────────────────────────
 
-    # ══ ADMIN ════════════════════════════════════════════════════════
+ADMIN = frozenset({ADMIN_ID})
+TI    = frozenset({TI_ID})
+AMBOS = ADMIN | TI
 
-    elif data == "adm_hoje":
-        hoje = datetime.now().strftime("%d/%m/%Y")
-        res  = supabase.table("agendamentos").select("*").eq("data", hoje).order("horario").execute()
-        ags  = res.data
-        if not ags:
-            texto = f"📋 *Hoje ({hoje}):*\n\n_Nenhum agendamento para hoje._ 🌸"
-        else:
-            linhas = [f"📋 *Agendamentos de hoje ({hoje}) — {len(ags)} cliente(s):*\n"]
-            for ag in ags:
-                linhas.append(fmt_ag(ag))
-            texto = "\n".join(linhas)
-        await safe_edit(query, texto, menu_admin_kb())
-        return MENU
+rotas = Roteador(estado_padrao=MENU, estado_negado=ConversationHandler.END)
 
-    elif data == "adm_todos":
-        res = supabase.table("agendamentos").select("*").order("data").order("horario").execute()
-        ags = res.data
-        if not ags:
-            texto = "📅 *Todos os agendamentos:*\n\n_Nenhum agendamento._ 🌸"
-        else:
-            linhas = [f"📅 *Todos os agendamentos ({len(ags)}):*\n"]
-            for ag in ags:
-                linhas.append(fmt_ag(ag))
-            texto = "\n".join(linhas)
-            if len(texto) > 4000:
-                texto = texto[:4000] + "\n\n_...lista truncada._"
-        await safe_edit(query, texto, menu_admin_kb())
-        return MENU
 
-    elif data == "adm_confirmar":
-        res = supabase.table("agendamentos").select("*").eq("status", "pendente").order("data").execute()
-        ags = res.data
-        if not ags:
-            await safe_edit(query, "✅ *Confirmar:*\n\n_Nenhum agendamento pendente._ 🌸", menu_admin_kb())
-            return MENU
-        botoes = [[InlineKeyboardButton(
-            f"{ag['nome']} — {ag['data']} {ag['horario']}",
-            callback_data=f"confirmar_{ag['id']}"
-        )] for ag in ags]
-        botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data="adm_voltar")])
-        await safe_edit(query, "✅ *Qual agendamento confirmar?*", InlineKeyboardMarkup(botoes))
-        return MENU
+@dataclass(frozen=True)
+class PorId:
+    """UUID do agendamento, em base 62 (22 caracteres em vez de 36)."""
+    id: str
 
-    elif data.startswith("confirmar_"):
-        ag_id = data.replace("confirmar_", "")
-        res   = supabase.table("agendamentos").update({"status": "confirmado"}).eq("id", ag_id).execute()
-        ag    = res.data[0] if res.data else None
-        if ag:
-            await safe_edit(query,
-                f"✅ *{ag['nome']} confirmada!*\n\n📅 {ag['data']} às 🕐 {ag['horario']}",
-                menu_admin_kb())
-            tg_id = ag.get("telegram_id")
-            if tg_id:
-                try:
-                    await context.bot.send_message(
-                        chat_id=int(tg_id),
-                        text=(
-                            "✅ *Seu agendamento foi confirmado!* 👑\n\n"
-                            f"💅 *Serviço:* {ag['servico']}\n"
-                            f"📅 *Data:* {ag['data']}\n"
-                            f"🕐 *Horário:* {ag['horario']}\n\n"
-                            "_Te esperamos! Até lá, querida!_ 🌸"
-                        ),
-                        parse_mode="Markdown",
-                    )
-                except Exception as e:
-                    logger.warning(f"Erro ao notificar cliente: {e}")
-        return MENU
+    def para(self):
+        return para_base62(uuid.UUID(self.id).int)
+
+    @classmethod
+    def de(cls, resto):
+        return cls(str(uuid.UUID(int=de_base62(resto))))
+
+
+@dataclass(frozen=True)
+class PorServico:
+    """Serviço pela posição no catálogo, com a versão do catálogo: `<versão>.<índice>`."""
+    nome: str
+
+    def para(self):
+        atual = catalogo.atual
+        return f"{para_base62(atual.versao)}.{para_base62(atual.nomes_servicos.index(self.nome))}"
+
+    @classmethod
+    def de(cls, resto):
+        versao, _, indice = resto.partition(".")
+        atual = catalogo.atual
+        if de_base62(versao) != atual.versao:
+            raise PayloadInvalido("catálogo mudou desde que o botão foi criado")
+        return cls(atual.nomes_servicos[de_base62(indice)])
+
+
+@dataclass(frozen=True)
+class PorNumero:
+    """Id numérico (modelo de horário), em base 62."""
+    numero: int
+
+    def para(self):
+        return para_base62(self.numero)
+
+    @classmethod
+    def de(cls, resto):
+        return cls(de_base62(resto))
+
+
+@dataclass(frozen=True)
+class PorCliente:
+    """telegram_id da cliente, em base 62; o nome vem do cache de clientes."""
+    telegram_id: int
+
+    def para(self):
+        return para_base62(self.telegram_id)
+
+    @classmethod
+    def de(cls, resto):
+        return cls(de_base62(resto))
+
+
+@dataclass(frozen=True)
+class PorCodigo:
+    """Código curto 🆔 do agendamento."""
+    codigo: str
+
+    def para(self):
+        return self.codigo
+
+    @classmethod
+    def de(cls, resto):
+        if not resto.isalnum() or len(resto) > 12:
+            raise PayloadInvalido(resto)
+        return cls(resto)
+
+
+@dataclass(frozen=True)
+class Paginacao:
+    """`<ant|prox>_<tela>`."""
+    direcao: str
+    tela: str
+
+    def para(self):
+        return f"{self.direcao}_{self.tela}"
+
+    @classmethod
+    def de(cls, resto):
+        direcao, _, tela = resto.partition("_")
+        if direcao not in ("ant", "prox") or tela not in ("adm_todos", "ti_todos", "excluir_menu"):
+            raise PayloadInvalido(resto)
+        return cls(direcao, tela)
+
+
+@dataclass(frozen=True)
+class TelaLote:
+    """Tela com seleção múltipla."""
+    tela: str
+
+    def para(self):
+        return self.tela
+
+    @classmethod
+    def de(cls, resto):
+        if resto not in ACOES_LOTE:
+            raise PayloadInvalido(resto)
+        return cls(resto)
 
-    elif data == "adm_cancelar_ag":
-        res = supabase.table("agendamentos").select("*").in_("status", ["pendente", "confirmado"]).order("data").execute()
-        ags = res.data
-        if not ags:
-            await safe_edit(query, "❌ *Cancelar:*\n\n_Nenhum agendamento ativo._ 🌸", menu_admin_kb())
-            return MENU
-        botoes = [[InlineKeyboardButton(
-            f"{ag['nome']} — {ag['data']} {ag['horario']}",
-            callback_data=f"cancela_{ag['id']}"
-        )] for ag in ags]
-        botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data="adm_voltar")])
-        await safe_edit(query, "❌ *Qual agendamento cancelar?*", InlineKeyboardMarkup(botoes))
-        return MENU
 
-    elif data.startswith("cancela_"):
-        ag_id = data.replace("cancela_", "")
-        res   = supabase.table("agendamentos").update({"status": "cancelado"}).eq("id", ag_id).execute()
-        ag    = res.data[0] if res.data else None
-        if ag:
-            await safe_edit(query,
-                f"❌ *Agendamento de {ag['nome']} cancelado.*\n\n📅 {ag['data']} às {ag['horario']}",
-                menu_admin_kb())
-            tg_id = ag.get("telegram_id")
-            if tg_id:
-                try:
-                    await context.bot.send_message(
-                        chat_id=int(tg_id),
-                        text=(
-                            "😔 *Seu agendamento foi cancelado.*\n\n"
-                            f"📅 {ag['data']} às 🕐 {ag['horario']}\n\n"
-                            "_Entre em contato para reagendar._ 🌸"
-                        ),
-                        parse_mode="Markdown",
-                    )
-                except Exception as e:
-                    logger.warning(f"Erro ao notificar cliente: {e}")
+@dataclass(frozen=True)
+class Segmento:
+    """Segmento da difusão."""
+    segmento: str
+
+    def para(self):
+        return self.segmento
+
+    @classmethod
+    def de(cls, resto):
+        if resto not in SEGMENTOS:
+            raise PayloadInvalido(resto)
+        return cls(resto)
+
+
+@dataclass(frozen=True)
+class Campo:
+    """Campo editável pelo TI."""
+    campo: str
+    descricao: str
+
+    DESCRICOES = {
+        "nome":    "novo nome",
+        "servico": "novo serviço",
+        "data":    "nova data (DD/MM/AAAA)",
+        "horario": "novo horário (HH:MM)",
+    }
+
+    def para(self):
+        return self.campo
+
+    @classmethod
+    def de(cls, resto):
+        if resto not in cls.DESCRICOES:
+            raise PayloadInvalido(resto)
+        return cls(resto, cls.DESCRICOES[resto])
+
+
+@medir
+async def admin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    return await rotas.despachar(update, context)
+
+
+# ══ PAGINAÇÃO E SELEÇÃO MÚLTIPLA ═════════════════════════════════════
+
+@rotas.rota("pag", AMBOS, Paginacao)
+async def rota_paginar(query, context, uid, p):
+    await tela_paginada(query, context, uid, p.tela, p.direcao)
+    return MENU
+
+@rotas.rota("multi", AMBOS, TelaLote)
+async def rota_multi(query, context, uid, p):
+    context.user_data["lote"] = {
+        "tela":  p.tela,
+        "itens": context.user_data.get(f"itens_{p.tela}", []),
+        "sel":   [],
+    }
+    await tela_selecao(query, context)
+    return MENU
+
+@rotas.rota("sel", AMBOS, PorId)
+async def rota_alternar(query, context, uid, p):
+    lote = context.user_data.get("lote")
+    if not lote:
+        await safe_edit(query, "⚠️ _Seleção expirada, abra a lista novamente._", voltar_menu_kb(uid))
         return MENU
+    if p.id in lote["sel"]:
+        lote["sel"].remove(p.id)
+    else:
+        lote["sel"].append(p.id)
+    await tela_selecao(query, context)
+    return MENU
+
+@rotas.rota("lote_executar", AMBOS)
+async def rota_lote(query, context, uid, p):
+    await executar_lote(query, context, uid)
+    return MENU
 
-    elif data == "adm_msg":
-        res = supabase.table("agendamentos").select("*").not_.is_("telegram_id", "null")\
-            .order("criado_em", desc=True).limit(30).execute()
-        ags = res.data
-        vistos, botoes = set(), []
+
+# ══ EXCLUIR — disponível para AMBOS ══════════════════════════════════
+
+@rotas.rota("excluir_menu", AMBOS)
+async def rota_excluir_menu(query, context, uid, p):
+    # Lista os agendamentos, uma página por vez, com botão de exclusão
+    await tela_paginada(query, context, uid, "excluir_menu")
+    return MENU
+
+@rotas.rota("excluir", AMBOS, PorId)
+async def rota_excluir(query, context, uid, p):
+    menu_kb = voltar_menu_kb(uid)
+    try:
+        ag   = await repo.excluir(p.id)
+        nome = ag["nome"] if ag else "?"
+        await safe_edit(query,
+            f"🗑 *Agendamento de {nome} excluído com sucesso!*",
+            menu_kb)
+    except Exception as e:
+        await safe_edit(query, f"❌ Erro ao excluir: {e}", menu_kb)
+    return MENU
+
+
+# ══ CLIENTE — minhas reservas ════════════════════════════════════════
+
+async def minha_da_lista(query, context, p):
+    """O agendamento do botão, se ainda está na lista mostrada pelo /minhas."""
+    ag = context.user_data.get("minhas", {}).get(p.id)
+    if not ag:
+        await safe_edit(query, "⚠️ _Lista desatualizada._ Use /minhas novamente.")
+    return ag
+
+@rotas.rota("minha_lista", TODOS)
+async def rota_minha_lista(query, context, uid, p):
+    return await listar_minhas(context, uid, query=query)
+
+@rotas.rota("minha_cancelar", TODOS, PorId)
+async def rota_minha_cancelar(query, context, uid, p):
+    ag = await minha_da_lista(query, context, p)
+    if not ag:
+        return ConversationHandler.END
+    await safe_edit(query,
+        f"❌ *Cancelar* {ag['servico']} em {fmt_data(ag['data'])} às {fmt_hora(ag['horario'])}?",
+        InlineKeyboardMarkup([[
+            InlineKeyboardButton("Sim, cancelar", callback_data=rotas.dados("minha_sim", p)),
+            InlineKeyboardButton("🔙 Voltar",     callback_data="minha_lista"),
+        ]]))
+    return MENU
+
+@rotas.rota("minha_sim", TODOS, PorId)
+async def rota_minha_sim(query, context, uid, p):
+    ag = await minha_da_lista(query, context, p)
+    if not ag:
+        return ConversationHandler.END
+    quando    = f"{fmt_data(ag['data'])} às {fmt_hora(ag['horario'])}"
+    cancelado = await repo.atualizar_do_cliente(p.id, uid, {"status": "cancelado"})
+    if not cancelado:
+        await safe_edit(query, "⚠️ _Este agendamento já não está ativo._ Use /minhas novamente.")
+        return ConversationHandler.END
+    await safe_edit(query, f"🌸 *Agendamento de {quando} cancelado.*\n\n_Use /start para agendar de novo._")
+    try:
+        await fila.enviar(
+            ADMIN_ID,
+            "😔 *Cancelado pela cliente:*\n\n"
+            f"👤 {cancelado['nome']} — {cancelado['servico']}\n📅 {quando}\n🆔 `{cancelado['codigo']}`",
+        )
+    except Exception as e:
+        logger.warning(f"Erro ao notificar admin: {e}")
+    context.user_data.clear()
+    return ConversationHandler.END
+
+@rotas.rota("minha_remarcar", TODOS, PorId)
+async def rota_minha_remarcar(query, context, uid, p):
+    ag = await minha_da_lista(query, context, p)
+    if not ag:
+        return ConversationHandler.END
+    # Segue pelo mesmo fluxo de data/horário do agendamento novo
+    context.user_data.update({
+        "remarcar": p.id, "nome": ag["nome"], "servico": ag["servico"], "telegram_id": uid,
+    })
+    await safe_edit(query,
+        f"🔁 *Remarcar* {ag['servico']} de {fmt_data(ag['data'])} às {fmt_hora(ag['horario'])}.\n\n"
+        "Informe a nova data no formato *DD/MM/AAAA*:")
+    return DATA
+
+
+# ══ ADMIN ════════════════════════════════════════════════════════════
+
+@rotas.rota("adm_hoje", ADMIN)
+async def rota_adm_hoje(query, context, uid, p):
+    hoje = datetime.now().strftime("%d/%m/%Y")
+    ags  = await ags_do_dia(hoje_iso())
+    if not ags:
+        texto = f"📋 *Hoje ({hoje}):*\n\n_Nenhum agendamento para hoje._ 🌸"
+    else:
+        linhas = [f"📋 *Agendamentos de hoje ({hoje}) — {len(ags)} cliente(s):*\n"]
         for ag in ags:
-            tid = ag.get("telegram_id")
-            if tid and tid not in vistos:
-                vistos.add(tid)
-                botoes.append([InlineKeyboardButton(ag["nome"], callback_data=f"msg_{tid}_{ag['nome'][:15]}")])
-        botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data="adm_voltar")])
-        if len(botoes) == 1:
-            await safe_edit(query, "💬 _Nenhum cliente com ID registrado ainda._ 🌸", menu_admin_kb())
-            return MENU
-        await safe_edit(query, "💬 *Para qual cliente enviar mensagem?*", InlineKeyboardMarkup(botoes))
-        return MENU
+            linhas.append(fmt_ag(ag))
+        texto = "\n".join(linhas)
+    await safe_edit(query, texto, menu_admin_kb())
+    return MENU
+
+@rotas.rota("adm_todos", ADMIN)
+async def rota_adm_todos(query, context, uid, p):
+    await tela_paginada(query, context, uid, "adm_todos")
+    return MENU
 
-    elif data.startswith("msg_"):
-        partes = data[4:].split("_", 1)
-        tid    = partes[0]
-        nome   = partes[1] if len(partes) > 1 else "Cliente"
-        context.user_data["msg_destino_id"]   = tid
-        context.user_data["msg_destino_nome"] = nome
-        await safe_edit(query, f"💬 *Digite a mensagem para {nome}:*\n\n_/cancelar para voltar._")
-        return AGUARD_MSG_USUARIO
-
-    elif data == "adm_voltar":
-        await safe_edit(query, "👑 *Painel Admin — Studio Dandara Britto*\n\n_O que deseja?_", menu_admin_kb())
+@rotas.rota("adm_confirmar", ADMIN)
+async def rota_adm_confirmar(query, context, uid, p):
+    ags = await ags_por_status("pendente")
+    if not ags:
+        await safe_edit(query, "✅ *Confirmar:*\n\n_Nenhum agendamento pendente._ 🌸", menu_admin_kb())
         return MENU
+    botoes = [[InlineKeyboardButton(
+        f"{ag['nome']} — {fmt_data(ag['data'])} {fmt_hora(ag['horario'])}",
+        callback_data=rotas.dados("confirmar", PorId(ag["id"]))
+    )] for ag in ags]
+    guardar_itens(context, "adm_confirmar", ags)
+    botoes.append([InlineKeyboardButton("☑️ Selecionar vários", callback_data=rotas.dados("multi", TelaLote("adm_confirmar")))])
+    botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data="adm_voltar")])
+    await safe_edit(query, "✅ *Qual agendamento confirmar?*", InlineKeyboardMarkup(botoes))
+    return MENU
 
-    # ══ TI ═══════════════════════════════════════════════════════════
+@rotas.rota("confirmar", ADMIN, PorId)
+async def rota_confirmar(query, context, uid, p):
+    ag = await diario.atualizar(p.id, {"status": "confirmado"})
+    if ag:
+        await safe_edit(query,
+            f"✅ *{ag['nome']} confirmada!*\n\n📅 {fmt_data(ag['data'])} às 🕐 {fmt_hora(ag['horario'])}",
+            menu_admin_kb())
+        await notificar_clientes([ag], texto_confirmado)
+    return MENU
 
-    elif data == "ti_todos":
-        res = supabase.table("agendamentos").select("*").order("criado_em", desc=True).execute()
-        ags = res.data
-        if not ags:
-            texto = "📋 *Agendamentos:*\n\n_Nenhum agendamento encontrado._"
-        else:
-            linhas = [f"📋 *Todos ({len(ags)}):*\n"]
-            for ag in ags:
-                linhas.append(fmt_ag(ag))
-            texto = "\n".join(linhas)
-            if len(texto) > 4000:
-                texto = texto[:4000] + "\n_...truncado._"
-        await safe_edit(query, texto, menu_ti_kb())
+@rotas.rota("adm_cancelar_ag", ADMIN)
+async def rota_adm_cancelar(query, context, uid, p):
+    ags = await ags_por_status("pendente", "confirmado")
+    if not ags:
+        await safe_edit(query, "❌ *Cancelar:*\n\n_Nenhum agendamento ativo._ 🌸", menu_admin_kb())
         return MENU
+    botoes = [[InlineKeyboardButton(
+        f"{ag['nome']} — {fmt_data(ag['data'])} {fmt_hora(ag['horario'])}",
+        callback_data=rotas.dados("cancela", PorId(ag["id"]))
+    )] for ag in ags]
+    guardar_itens(context, "adm_cancelar_ag", ags)
+    botoes.append([InlineKeyboardButton("☑️ Selecionar vários", callback_data=rotas.dados("multi", TelaLote("adm_cancelar_ag")))])
+    botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data="adm_voltar")])
+    await safe_edit(query, "❌ *Qual agendamento cancelar?*", InlineKeyboardMarkup(botoes))
+    return MENU
 
-    elif data == "ti_editar":
+@rotas.rota("cancela", ADMIN, PorId)
+async def rota_cancelar(query, context, uid, p):
+    ag = await diario.atualizar(p.id, {"status": "cancelado"})
+    if ag:
         await safe_edit(query,
-            "✏️ *Digite o ID (ou primeiros caracteres) do agendamento a editar:*\n\n_/cancelar para voltar._")
-        return TI_AGUARD_EDITAR_ID
+            f"❌ *Agendamento de {ag['nome']} cancelado.*\n\n📅 {fmt_data(ag['data'])} às {fmt_hora(ag['horario'])}",
+            menu_admin_kb())
+        await notificar_clientes([ag], texto_cancelado)
+    return MENU
 
-    elif data == "ti_add_servico":
-        await safe_edit(query, f"➕ *Serviços atuais:*\n{', '.join(SERVICOS)}\n\n*Digite o novo serviço:*")
-        return TI_AGUARD_ADD_SERVICO
+@rotas.rota("adm_difusao", ADMIN)
+async def rota_difusao(query, context, uid, p):
+    await safe_edit(query, "📣 *Para quem enviar a mensagem?*", segmentos_kb())
+    return MENU
 
-    elif data == "ti_del_servico":
-        botoes = [[InlineKeyboardButton(s, callback_data=f"delserv_{s}")] for s in SERVICOS]
-        botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data="ti_voltar")])
-        await safe_edit(query, "➖ *Qual serviço remover?*", InlineKeyboardMarkup(botoes))
-        return MENU
+@functools.cache
+def segmentos_kb():
+    botoes = [[InlineKeyboardButton(rotulo, callback_data=rotas.dados("dif_seg", Segmento(seg)))] for seg, rotulo in SEGMENTOS.items()]
+    botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data="adm_voltar")])
+    return InlineKeyboardMarkup(botoes)
+
+async def tela_difusao_servicos(query):
+    await safe_edit(query, "💅 *Clientes de qual serviço?*", difusao_servicos_kb())
+    return MENU
 
-    elif data.startswith("delserv_"):
-        servico = data.replace("delserv_", "")
-        if servico in SERVICOS:
-            SERVICOS.remove(servico)
-        await safe_edit(query, f"✅ *{servico}* removido!\n\nServiços: {', '.join(SERVICOS)}", menu_ti_kb())
+@por_catalogo
+def difusao_servicos_kb():
+    botoes = [[InlineKeyboardButton(nome, callback_data=rotas.dados("dif_srv", PorServico(nome)))] for nome in catalogo.atual.nomes_servicos]
+    botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data="adm_difusao")])
+    return InlineKeyboardMarkup(botoes)
+
+@rotas.rota("dif_seg", ADMIN, Segmento)
+async def rota_difusao_segmento(query, context, uid, p):
+    if p.segmento == "servico":
+        return await tela_difusao_servicos(query)
+    descricao = SEGMENTOS[p.segmento].split(" ", 1)[1].lower()
+    return await preparar_difusao(query, context, p.segmento, None, descricao)
+
+@rotas.rota("dif_srv", ADMIN, PorServico)
+async def rota_difusao_servico(query, context, uid, p):
+    return await preparar_difusao(query, context, "servico", p.nome, f"clientes de *{p.nome}*")
+
+async def preparar_difusao(query, context, segmento, servico, descricao):
+    destinos = await difusao.destinatarios(segmento, servico)
+    if not destinos:
+        await safe_edit(query, "📣 _Nenhum cliente neste grupo._ 🌸", menu_admin_kb())
         return MENU
+    context.user_data["difusao"] = {"segmento": segmento, "servico": servico}
+    await safe_edit(query,
+        f"📣 *{len(destinos)} cliente(s)* — {descricao}.\n\nDigite a mensagem:",
+        voltar_kb("adm_voltar"))
+    return AGUARD_DIFUSAO_TEXTO
+
+@rotas.rota("adm_msg", ADMIN)
+async def rota_adm_msg(query, context, uid, p):
+    botoes = [[InlineKeyboardButton(c["nome"], callback_data=rotas.dados("msg", PorCliente(int(c["telegram_id"]))))]
+              for c in await diario.ler(repo.clientes_recentes, 30)]
+    botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data="adm_voltar")])
+    if len(botoes) == 1:
+        await safe_edit(query, "💬 _Nenhum cliente com ID registrado ainda._ 🌸", menu_admin_kb())
+        return MENU
+    await safe_edit(query, "💬 *Para qual cliente enviar mensagem?*", InlineKeyboardMarkup(botoes))
+    return MENU
 
-    elif data == "ti_add_horario":
-        await safe_edit(query, f"⏰ *Horários atuais:*\n{', '.join(HORARIOS)}\n\n*Digite o novo horário (HH:MM):*")
-        return TI_AGUARD_ADD_HORARIO
+@rotas.rota("msg", ADMIN, PorCliente)
+async def rota_msg(query, context, uid, p):
+    nome = await clientes.nome(p.telegram_id) or "Cliente"
+    context.user_data["msg_destino_id"]   = p.telegram_id
+    context.user_data["msg_destino_nome"] = nome
+    await safe_edit(query, f"💬 *Digite a mensagem para {nome}:*\n\n_/cancelar para voltar._")
+    return AGUARD_MSG_USUARIO
+
+@rotas.rota("adm_voltar", ADMIN)
+async def rota_adm_voltar(query, context, uid, p):
+    await safe_edit(query, "👑 *Painel Admin — Studio Dandara Britto*\n\n_O que deseja?_", menu_admin_kb())
+    return MENU
 
-    elif data == "ti_del_horario":
-        botoes = [[InlineKeyboardButton(h, callback_data=f"delhor_{h}")] for h in HORARIOS]
-        botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data="ti_voltar")])
-        await safe_edit(query, "🕐 *Qual horário remover?*", InlineKeyboardMarkup(botoes))
-        return MENU
 
-    elif data.startswith("delhor_"):
-        horario = data.replace("delhor_", "")
-        if horario in HORARIOS:
-            HORARIOS.remove(horario)
-        await safe_edit(query, f"✅ *{horario}* removido!\n\nHorários: {', '.join(HORARIOS)}", menu_ti_kb())
-        return MENU
+# ══ TI ═══════════════════════════════════════════════════════════════
 
-    elif data == "ti_stats":
-        try:
-            hoje     = datetime.now().strftime("%d/%m/%Y")
-            total    = supabase.table("agendamentos").select("*", count="exact").execute()
-            pend     = supabase.table("agendamentos").select("*", count="exact").eq("status", "pendente").execute()
-            conf     = supabase.table("agendamentos").select("*", count="exact").eq("status", "confirmado").execute()
-            canc     = supabase.table("agendamentos").select("*", count="exact").eq("status", "cancelado").execute()
-            hj       = supabase.table("agendamentos").select("*", count="exact").eq("data", hoje).execute()
-            await safe_edit(query,
-                "📊 *Estatísticas:*\n\n"
-                f"📋 Total: *{total.count}*\n"
-                f"⏳ Pendentes: *{pend.count}*\n"
-                f"✅ Confirmados: *{conf.count}*\n"
-                f"❌ Cancelados: *{canc.count}*\n"
-                f"📅 Hoje: *{hj.count}*\n\n"
-                f"💅 Serviços: *{len(SERVICOS)}*\n"
-                f"⏰ Horários: *{len(HORARIOS)}*",
-                menu_ti_kb())
-        except Exception as e:
-            await safe_edit(query, f"❌ Erro: {e}", menu_ti_kb())
-        return MENU
+@rotas.rota("ti_todos", TI)
+async def rota_ti_todos(query, context, uid, p):
+    await tela_paginada(query, context, uid, "ti_todos")
+    return MENU
+
+@rotas.rota("ti_editar", TI)
+async def rota_ti_editar(query, context, uid, p):
+    await safe_edit(query,
+        "✏️ *Digite o código 🆔 (ou os primeiros caracteres) do agendamento a editar:*\n\n_/cancelar para voltar._")
+    return TI_AGUARD_EDITAR_ID
+
+@rotas.rota("ti_add_servico", TI)
+async def rota_ti_add_servico(query, context, uid, p):
+    await safe_edit(query,
+        f"➕ *Serviços atuais:*\n{', '.join(catalogo.atual.nomes_servicos)}\n\n"
+        "*Digite o novo serviço:*\n_Opcional: nome; duração em minutos; preço (ex: Spa dos Pés; 90; 75,00)_")
+    return TI_AGUARD_ADD_SERVICO
+
+@rotas.rota("ti_del_servico", TI)
+async def rota_ti_del_servico(query, context, uid, p):
+    await safe_edit(query, "➖ *Qual serviço remover?*", remover_servico_kb())
+    return MENU
 
-    elif data == "ti_listar":
+@por_catalogo
+def remover_servico_kb():
+    botoes = [[InlineKeyboardButton(s, callback_data=rotas.dados("delserv", PorServico(s)))] for s in catalogo.atual.nomes_servicos]
+    botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data="ti_voltar")])
+    return InlineKeyboardMarkup(botoes)
+
+@rotas.rota("delserv", TI, PorServico)
+async def rota_delserv(query, context, uid, p):
+    try:
+        await catalogo.remover_servico(p.nome)
+        await safe_edit(query,
+            f"✅ *{p.nome}* removido!\n\nServiços: {', '.join(catalogo.atual.nomes_servicos)}", menu_ti_kb())
+    except Exception as e:
+        await safe_edit(query, f"❌ Erro: {e}", menu_ti_kb())
+    return MENU
+
+@rotas.rota("ti_add_horario", TI)
+async def rota_ti_add_horario(query, context, uid, p):
+    await safe_edit(query,
+        f"⏰ *Horários atuais:*\n{', '.join(fmt_modelo(h) for h in catalogo.atual.modelos)}\n\n"
+        "*Digite o novo horário (HH:MM):*\n_Para um dia específico: HH:MM dia (ex: 08:30 Sáb)_")
+    return TI_AGUARD_ADD_HORARIO
+
+@rotas.rota("ti_del_horario", TI)
+async def rota_ti_del_horario(query, context, uid, p):
+    await safe_edit(query, "🕐 *Qual horário remover?*", remover_horario_kb())
+    return MENU
+
+@por_catalogo
+def remover_horario_kb():
+    botoes = [[InlineKeyboardButton(fmt_modelo(h), callback_data=rotas.dados("delhor", PorNumero(h.id)))] for h in catalogo.atual.modelos]
+    botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data="ti_voltar")])
+    return InlineKeyboardMarkup(botoes)
+
+@rotas.rota("delhor", TI, PorNumero)
+async def rota_delhor(query, context, uid, p):
+    try:
+        await catalogo.remover_horario(p.numero)
         await safe_edit(query,
-            "💅 *Serviços:*\n" + "\n".join(f"  • {s}" for s in SERVICOS) +
-            "\n\n⏰ *Horários:*\n" + "\n".join(f"  • {h}" for h in HORARIOS),
+            f"✅ Horário removido!\n\nHorários: {', '.join(fmt_modelo(h) for h in catalogo.atual.modelos)}",
             menu_ti_kb())
-        return MENU
+    except Exception as e:
+        await safe_edit(query, f"❌ Erro: {e}", menu_ti_kb())
+    return MENU
 
-    elif data == "ti_voltar":
-        await safe_edit(query, "🛠 *Painel TI — Studio Dandara Britto*\n\n_O que deseja?_", menu_ti_kb())
-        return MENU
+@rotas.rota("ti_stats", TI)
+async def rota_ti_stats(query, context, uid, p):
+    try:
+        est       = await painel.obter()
+        servicos  = sorted(est["por_servico"].items(), key=lambda kv: -kv[1])
+        dias      = est["por_dia_semana"]
+        await safe_edit(query,
+            "📊 *Estatísticas:*\n\n"
+            f"📋 Total: *{est['total']}*\n"
+            f"⏳ Pendentes: *{est['pendente']}*\n"
+            f"✅ Confirmados: *{est['confirmado']}*\n"
+            f"❌ Cancelados: *{est['cancelado']}*\n"
+            f"📅 Hoje: *{est['hoje']}*\n\n"
+            "💅 *Por serviço:*\n" +
+            ("\n".join(f"  • {s}: {n}" for s, n in servicos) or "  _nenhum_") +
+            "\n\n📆 *Por dia da semana:*\n" +
+            " | ".join(f"{nome} {dias.get(str(i), 0)}" for i, nome in enumerate(DIAS_SEMANA, start=1)) +
+            "\n\n"
+            f"💅 Serviços: *{len(catalogo.atual.servicos)}*\n"
+            f"⏰ Horários: *{len(catalogo.atual.modelos)}*",
+            menu_ti_kb())
+    except Exception as e:
+        await safe_edit(query, f"❌ Erro: {e}", menu_ti_kb())
+    return MENU
 
-    elif data.startswith("edit_campo_"):
-        campo_map = {
-            "edit_campo_nome":    ("nome",    "novo nome"),
-            "edit_campo_servico": ("servico", "novo serviço"),
-            "edit_campo_data":    ("data",    "nova data (DD/MM/AAAA)"),
-            "edit_campo_horario": ("horario", "novo horário (HH:MM)"),
-        }
-        if data in campo_map:
-            campo, desc = campo_map[data]
-            context.user_data["editar_campo"] = campo
-            await safe_edit(query, f"✏️ *Digite o {desc}:*")
-            return TI_AGUARD_EDITAR_VALOR
+@rotas.rota("ti_listar", TI)
+async def rota_ti_listar(query, context, uid, p):
+    await safe_edit(query,
+        "💅 *Serviços:*\n" + "\n".join(f"  • {fmt_servico(s)}" for s in catalogo.atual.servicos) +
+        "\n\n⏰ *Horários:*\n" + "\n".join(f"  • {fmt_modelo(h)}" for h in catalogo.atual.modelos),
+        menu_ti_kb())
+    return MENU
+
+@rotas.rota("ti_perfil", TI)
+async def rota_ti_perfil(query, context, uid, p):
+    if not perfilador.ativo:
+        perfilador.iniciar()
+        await safe_edit(query, "🔬 *Perfilador ligado.*\n\n_Toque de novo para desligar e ver o resultado._", menu_ti_kb())
         return MENU
+    perfilador.parar()
+    total = perfilador.amostras or 1
+    # Sem Markdown: nomes de função têm "_"
+    linhas = [f"🔬 Perfilador desligado — {perfilador.amostras} amostras\n"]
+    linhas += [f"{n / total:6.1%}  {funcao}" for funcao, n in perfilador.mais_frequentes(10)]
+    if servidor_metricas:
+        linhas.append("\nPilhas completas em /perfil (formato collapsed).")
+    await safe_edit(query, "\n".join(linhas), menu_ti_kb(), parse_mode=None)
+    return MENU
 
+@rotas.rota("ti_voltar", TI)
+async def rota_ti_voltar(query, context, uid, p):
+    await safe_edit(query, "🛠 *Painel TI — Studio Dandara Britto*\n\n_O que deseja?_", menu_ti_kb())
     return MENU
 
+@rotas.rota("editar_ag", TI, PorCodigo)
+async def rota_editar_ag(query, context, uid, p):
+    # Escolha feita no teclado de desambiguação de ti_editar_id
+    ag = await diario.ler(repo.obter_por_codigo, p.codigo)
+    if not ag:
+        await safe_edit(query, "❌ Agendamento não encontrado.", menu_ti_kb())
+        return MENU
+    context.user_data["editar_id"] = ag["id"]
+    await safe_edit(query, texto_edicao(ag), campos_edicao_kb())
+    return TI_AGUARD_EDITAR_CAMPO
+
+@rotas.rota("edit_campo", TI, Campo)
+async def rota_edit_campo(query, context, uid, p):
+    context.user_data["editar_campo"] = p.campo
+    await safe_edit(query, f"✏️ *Digite o {p.descricao}:*")
+    return TI_AGUARD_EDITAR_VALOR
+
 
 # ══════════════════════════════════════════════════════════════════════
 #  HANDLERS DE TEXTO — ADMIN E TI
 # ══════════════════════════════════════════════════════════════════════
 
+@medir
 async def receber_msg_usuario(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     texto = update.message.text.strip()
     tid   = context.user_data.get("msg_destino_id")
     nome  = context.user_data.get("msg_destino_nome", "Cliente")
     try:
-        await context.bot.send_message(
-            chat_id=int(tid),
-            text=f"💬 *Mensagem do Studio Dandara Britto:*\n\n{texto}",
-            parse_mode="Markdown",
-        )
-        await update.message.reply_text(f"✅ Mensagem enviada para *{nome}*! 🌸",
+        await fila.enviar(tid, f"💬 *Mensagem do Studio Dandara Britto:*\n\n{texto}")
+        await update.message.reply_text(f"✅ Mensagem a caminho de *{nome}*! 🌸",
             parse_mode="Markdown", reply_markup=menu_admin_kb())
     except Exception as e:
         await update.message.reply_text(f"❌ Erro: {e}", reply_markup=menu_admin_kb())
     context.user_data.clear()
     return MENU
 
+@medir
+async def receber_difusao(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    alvo = context.user_data.pop("difusao", None)
+    if not alvo:
+        await update.message.reply_text("⚠️ Escolha o grupo novamente.", reply_markup=menu_admin_kb())
+        return MENU
+    texto    = f"📣 *Recado do Studio Dandara Britto:*\n\n{update.message.text.strip()}"
+    destinos = await difusao.destinatarios(alvo["segmento"], alvo["servico"])
+    aviso    = await update.message.reply_text(f"📣 Enviando… 0/{len(destinos)}")
+
+    async def ao_progresso(enviados, falhas, total, fim):
+        if not fim:
+            await aviso.edit_text(f"📣 Enviando… {enviados + len(falhas)}/{total} (falhas: {len(falhas)})")
+            return
+        linhas = [f"📣 *Difusão concluída:* {enviados}/{total} entregue(s)."]
+        if falhas:
+            linhas.append(f"\n⚠️ {len(falhas)} falha(s) (relatório salvo em `difusoes`):")
+            linhas += [f"• `{f['telegram_id']}` — {f['erro'][:60]}" for f in falhas[:5]]
+        await aviso.edit_text("\n".join(linhas), parse_mode="Markdown", reply_markup=menu_admin_kb())
+
+    difusao.disparar(destinos, texto, alvo["segmento"], alvo["servico"], ao_progresso)
+    return MENU
+
+@medir
 async def ti_add_servico(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    novo = update.message.text.strip().title()
-    if novo in SERVICOS:
+    partes = [p.strip() for p in update.message.text.split(";")]
+    novo   = partes[0].title()
+    try:
+        duracao = int(partes[1]) if len(partes) > 1 and partes[1] else 60
+        preco   = float(partes[2].replace(",", ".")) if len(partes) > 2 and partes[2] else None
+    except ValueError:
+        await update.message.reply_text("❌ Use: *nome; minutos; preço* (ex: Spa dos Pés; 90; 75,00)", parse_mode="Markdown")
+        return TI_AGUARD_ADD_SERVICO
+    if catalogo.atual.tem_servico(novo):
         await update.message.reply_text(f"⚠️ *{novo}* já existe!", parse_mode="Markdown", reply_markup=menu_ti_kb())
-    else:
-        SERVICOS.append(novo)
-        await update.message.reply_text(f"✅ *{novo}* adicionado!\n\nServiços: {', '.join(SERVICOS)}",
+        return MENU
+    try:
+        await catalogo.adicionar_servico(novo, duracao, preco)
+        await update.message.reply_text(f"✅ *{novo}* adicionado!\n\nServiços: {', '.join(catalogo.atual.nomes_servicos)}",
             parse_mode="Markdown", reply_markup=menu_ti_kb())
+    except Exception as e:
+        await update.message.reply_text(f"❌ Erro: {e}", reply_markup=menu_ti_kb())
     return MENU
 
+@medir
 async def ti_add_horario(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    novo = update.message.text.strip()
-    if not re.match(r"^\d{2}:\d{2}$", novo):
-        await update.message.reply_text("❌ Use o formato *HH:MM* (ex: 08:30):", parse_mode="Markdown")
+    m = re.match(r"^(\d{2}:\d{2})(?:\s+(\S+))?$", update.message.text.strip())
+    dia = ler_dia_semana(m.group(2)) if m and m.group(2) else None
+    if not m or (m.group(2) and dia is None):
+        await update.message.reply_text("❌ Use o formato *HH:MM* ou *HH:MM dia* (ex: 08:30 ou 08:30 Sáb):", parse_mode="Markdown")
         return TI_AGUARD_ADD_HORARIO
-    if novo in HORARIOS:
+    novo = m.group(1)
+    if any(h.horario == novo and h.dia_semana == dia for h in catalogo.atual.modelos):
         await update.message.reply_text(f"⚠️ *{novo}* já existe!", parse_mode="Markdown", reply_markup=menu_ti_kb())
-    else:
-        HORARIOS.append(novo)
-        HORARIOS.sort()
-        await update.message.reply_text(f"✅ *{novo}* adicionado!\n\nHorários: {', '.join(HORARIOS)}",
+        return MENU
+    try:
+        await catalogo.adicionar_horario(novo, dia)
+        await update.message.reply_text(
+            f"✅ *{novo}* adicionado!\n\nHorários: {', '.join(fmt_modelo(h) for h in catalogo.atual.modelos)}",
             parse_mode="Markdown", reply_markup=menu_ti_kb())
+    except Exception as e:
+        await update.message.reply_text(f"❌ Erro: {e}", reply_markup=menu_ti_kb())
     return MENU
 
+@medir
 async def ti_editar_id(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    ag_id = update.message.text.strip()
+    codigo = update.message.text.strip()
     try:
-        res = supabase.table("agendamentos").select("*").ilike("id", f"{ag_id}%").execute()
-        if not res.data:
+        ags = await diario.ler(repo.buscar_por_codigo, codigo)
+        if not ags:
             await update.message.reply_text("❌ Agendamento não encontrado.", reply_markup=menu_ti_kb())
             return MENU
-        ag = res.data[0]
+        if len(ags) > 1:
+            # Prefixo ambíguo: deixa o TI escolher em vez de pegar o primeiro
+            botoes = [[InlineKeyboardButton(
+                f"{ag['codigo']} — {ag['nome']} {fmt_data(ag['data'])} {fmt_hora(ag['horario'])}",
+                callback_data=rotas.dados("editar_ag", PorCodigo(ag["codigo"]))
+            )] for ag in ags]
+            botoes.append([InlineKeyboardButton("🔙 Voltar", callback_data="ti_voltar")])
+            await update.message.reply_text(
+                f"🔎 *Mais de um agendamento começa com* `{codigo.upper()}`*. Qual deles?*",
+                parse_mode="Markdown", reply_markup=InlineKeyboardMarkup(botoes),
+            )
+            return TI_AGUARD_EDITAR_CAMPO
+        ag = ags[0]
         context.user_data["editar_id"] = ag["id"]
-        kb = InlineKeyboardMarkup([
-            [InlineKeyboardButton("👤 Nome",    callback_data="edit_campo_nome")],
-            [InlineKeyboardButton("💅 Serviço", callback_data="edit_campo_servico")],
-            [InlineKeyboardButton("📅 Data",    callback_data="edit_campo_data")],
-            [InlineKeyboardButton("🕐 Horário", callback_data="edit_campo_horario")],
-            [InlineKeyboardButton("🔙 Voltar",  callback_data="ti_voltar")],
-        ])
-        await update.message.reply_text(
-            f"✏️ *Editando: {ag['nome']}*\n\n"
-            f"💅 {ag['servico']} | 📅 {ag['data']} às {ag['horario']}\n\n"
-            "*Qual campo alterar?*",
-            parse_mode="Markdown", reply_markup=kb,
-        )
+        await update.message.reply_text(texto_edicao(ag), parse_mode="Markdown", reply_markup=campos_edicao_kb())
         return TI_AGUARD_EDITAR_CAMPO
     except Exception as e:
         await update.message.reply_text(f"❌ Erro: {e}", reply_markup=menu_ti_kb())
         return MENU
 
+@medir
 async def ti_editar_valor(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     novo  = update.message.text.strip()
     ag_id = context.user_data.get("editar_id")
     campo = context.user_data.get("editar_campo")
+    valor = novo
+    if campo == "data":
+        d = ler_data(novo)
+        if d is None:
+            await update.message.reply_text("❌ Use o formato *DD/MM/AAAA*:", parse_mode="Markdown")
+            return TI_AGUARD_EDITAR_VALOR
+        valor = d.isoformat()
+    elif campo == "horario" and not re.match(r"^\d{2}:\d{2}$", novo):
+        await update.message.reply_text("❌ Use o formato *HH:MM* (ex: 08:30):", parse_mode="Markdown")
+        return TI_AGUARD_EDITAR_VALOR
+    elif campo == "servico" and not catalogo.atual.tem_servico(novo):
+        await update.message.reply_text(
+            f"❌ Serviço desconhecido. Serviços: {', '.join(catalogo.atual.nomes_servicos)}")
+        return TI_AGUARD_EDITAR_VALOR
+    campos = {campo: valor}
     try:
-        supabase.table("agendamentos").update({campo: novo}).eq("id", ag_id).execute()
+        if campo in ("data", "horario", "servico"):
+            # Data, horário ou duração mudam: o encaixe (duração e expediente) é refeito
+            ag = await diario.ler(repo.obter, ag_id)
+            if ag is None:
+                await update.message.reply_text("❌ Agendamento não encontrado.", reply_markup=menu_ti_kb())
+                context.user_data.clear()
+                return MENU
+            novo_ag = {**ag, **campos}
+            data, horario, servico = novo_ag["data"], fmt_hora(novo_ag["horario"]), novo_ag["servico"]
+            campos["duracao_min"] = catalogo.atual.duracao(servico)
+            if ag.get("status") != "cancelado":
+                encaixe = await agenda.encaixes(data, servico, ignorar=ag_id, horarios=[horario])
+                if horario not in encaixe:
+                    await update.message.reply_text(
+                        f"⚠️ *{servico}* não cabe em {fmt_data(data)} às {horario}: "
+                        "já há agendamento no intervalo ou fora do expediente.",
+                        parse_mode="Markdown", reply_markup=menu_ti_kb())
+                    context.user_data.clear()
+                    return MENU
+                campos["profissional_id"] = encaixe[horario]
+            if campo != "servico":
+                # Novo horário: os lembretes precisam sair de novo
+                campos.update(lembrete_24h_em=None, lembrete_2h_em=None)
+        await diario.atualizar(ag_id, campos)
         await update.message.reply_text(f"✅ *{campo}* atualizado para *{novo}*!",
             parse_mode="Markdown", reply_markup=menu_ti_kb())
+    except HorarioOcupado:
+        await update.message.reply_text("⚠️ Já existe agendamento ativo nessa data e horário.",
+            reply_markup=menu_ti_kb())
     except Exception as e:
         await update.message.reply_text(f"❌ Erro: {e}", reply_markup=menu_ti_kb())
     context.user_data.clear()
     return MENU
 
 
+# ══════════════════════════════════════════════════════════════════════
+#  EXPORTAÇÃO
+# ══════════════════════════════════════════════════════════════════════
+
+LIMITE_DOCUMENTO = 50 * 1024 * 1024   # maior arquivo que um bot pode enviar
+
+@medir
+async def exportar_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/exportar [DD/MM/AAAA DD/MM/AAAA] [csv|xlsx] — padrão: mês atual em CSV."""
+    if update.effective_user.id not in (ADMIN_ID, TI_ID):
+        return
+    args    = [a.lower() for a in context.args or []]
+    formato = args.pop() if args and args[-1] in ("csv", "xlsx") else "csv"
+    hoje    = datetime.now().date()
+    if not args:
+        inicio, fim = hoje.replace(day=1), hoje
+    elif len(args) == 2 and ler_data(args[0]) and ler_data(args[1]):
+        inicio, fim = ler_data(args[0]), ler_data(args[1])
+    else:
+        inicio = fim = None
+    if inicio is None or inicio > fim:
+        await update.message.reply_text(
+            "❌ Use: */exportar DD/MM/AAAA DD/MM/AAAA [csv|xlsx]*\n_Sem datas, exporta o mês atual._",
+            parse_mode="Markdown")
+        return
+    if formato not in historico.FORMATOS:
+        await update.message.reply_text("⚠️ Exportação em XLSX requer o pacote `openpyxl`; use csv.", parse_mode="Markdown")
+        return
+
+    aviso = await update.message.reply_text("⏳ Gerando a exportação...")
+    try:
+        arquivo, total = await historico.exportar(repo, inicio.isoformat(), fim.isoformat(), formato)
+    except Exception as e:
+        await aviso.edit_text(f"❌ Erro na exportação: {e}")
+        return
+    with arquivo:
+        tamanho = arquivo.seek(0, os.SEEK_END)
+        arquivo.seek(0)
+        if tamanho > LIMITE_DOCUMENTO:
+            await aviso.edit_text("⚠️ O arquivo passou de 50 MB; exporte um intervalo menor.")
+            return
+        nome = f"agendamentos_{inicio:%Y%m%d}_{fim:%Y%m%d}.{formato}"
+        # read_file_handle=False: o upload lê o arquivo aos pedaços em vez de carregá-lo inteiro na memória
+        await update.message.reply_document(
+            document=InputFile(arquivo, filename=nome, read_file_handle=False),
+            caption=f"📊 {total} agendamento(s) de {inicio:%d/%m/%Y} a {fim:%d/%m/%Y}",
+        )
+    await aviso.delete()
+
+
 # ══════════════════════════════════════════════════════════════════════
 #  ERRO
 # ══════════════════════════════════════════════════════════════════════
 
 async def erro_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    metricas.ERROS.inc(tipo=type(context.error).__name__)
     logger.error("Erro inesperado:", exc_info=context.error)
 
 
@@ -689,26 +1686,80 @@ async def erro_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> No
 #  MAIN
 # ══════════════════════════════════════════════════════════════════════
 
-def main() -> None:
-    if not TELEGRAM_TOKEN:
-        raise ValueError("TELEGRAM_TOKEN não encontrado")
-    if not SUPABASE_URL or not SUPABASE_KEY:
-        raise ValueError("SUPABASE_URL ou SUPABASE_KEY não encontrados")
-
-    app = Application.builder().token(TELEGRAM_TOKEN).build()
+async def avisar_recusa(op, ag, erro):
+    """Uma escrita do diário foi recusada ao chegar no banco (horário tomado durante a queda) ou falhou."""
+    if op != "inserir" or not isinstance(erro, HorarioOcupado):
+        await fila.enviar(ADMIN_ID, f"⚠️ Alteração feita offline não pôde ser aplicada ({ag.get('nome', ag.get('id'))}): {erro}",
+                          parse_mode=None)
+        return
+    if ag.get("telegram_id"):
+        await fila.enviar(ag["telegram_id"],
+            f"😔 *Que pena, minha cara!* O horário de {fmt_data(ag['data'])} às {fmt_hora(ag['horario'])} "
+            "foi reservado por outra pessoa enquanto nosso sistema estava instável.\n\n"
+            "Escolha outro horário com /start. 🌸")
+    await fila.enviar(ADMIN_ID, f"⚠️ Agendamento feito offline recusado (horário ocupado):\n{fmt_ag(ag)}")
+
+async def post_init(app: Application) -> None:
+    await repo.conectar()
+    await catalogo.carregar()
+    catalogo.iniciar()
+    await fila.iniciar(app.bot)
+    await lembretes.iniciar(texto_lembrete)
+    await diario.iniciar(avisar_recusa)
+    if replica:
+        await replica.iniciar()
+    await espera.iniciar(functools.partial(ofertar_vaga, app.bot))
+    if arquivador:
+        arquivador.iniciar()
+    if servidor_metricas:
+        await servidor_metricas.iniciar()
+
+async def post_shutdown(app: Application) -> None:
+    if servidor_metricas:
+        await servidor_metricas.parar()
+    perfilador.parar()
+    await lembretes.parar()
+    await difusao.parar()
+    if arquivador:
+        await arquivador.parar()
+    await espera.parar()
+    await diario.parar()
+    if replica:
+        await replica.parar()
+    await fila.parar()
+    await catalogo.parar()
+    await repo.fechar()
+
+async def sincronizar_estado(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Vazio: casar com o update já faz o PTB chamar `refresh_user_data` antes do grupo 0."""
+
+def montar_app(builder, persistencia=None) -> Application:
+    """Constrói a aplicação a partir do `builder` (token, rede, processador) e registra os handlers."""
+    builder = builder.post_init(post_init).post_shutdown(post_shutdown)
+    if persistencia:
+        builder = builder.persistence(persistencia)
+    app = builder.build()
+
+    # Lista de espera: o botão pode chegar no meio de uma conversa ou fora dela
+    espera_h = CallbackQueryHandler(espera_callback, pattern="^espera_")
 
     # Fluxo cliente
     cliente_conv = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
+        entry_points=[CommandHandler("start", start), CommandHandler("minhas", minhas)],
         states={
-            MENU:    [CallbackQueryHandler(menu_callback)],
-            NOME:    [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_nome)],
-            SERVICO: [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_servico)],
-            DATA:    [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_data)],
-            HORARIO: [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_horario)],
+            MENU:    [espera_h,
+                      CallbackQueryHandler(minhas_callback, pattern="^minha_"),
+                      CallbackQueryHandler(menu_callback)],
+            NOME:    [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_nome), espera_h],
+            SERVICO: [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_servico),
+                      CommandHandler("nome", trocar_nome), espera_h],
+            DATA:    [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_data), espera_h],
+            HORARIO: [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_horario), espera_h],
         },
         fallbacks=[CommandHandler("cancelar", cancelar)],
         allow_reentry=True,
+        name="cliente_conv",
+        persistent=persistencia is not None,
     )
 
     # Painel Admin / TI
@@ -720,19 +1771,57 @@ def main() -> None:
             TI_AGUARD_ADD_SERVICO: [MessageHandler(filters.TEXT & ~filters.COMMAND, ti_add_servico)],
             TI_AGUARD_ADD_HORARIO: [MessageHandler(filters.TEXT & ~filters.COMMAND, ti_add_horario)],
             TI_AGUARD_EDITAR_ID:   [MessageHandler(filters.TEXT & ~filters.COMMAND, ti_editar_id)],
-            TI_AGUARD_EDITAR_CAMPO:[CallbackQueryHandler(admin_callback, pattern="^edit_campo_")],
+            TI_AGUARD_EDITAR_CAMPO:[CallbackQueryHandler(admin_callback, pattern="^(edit_campo:|editar_ag:|ti_voltar$)")],
             TI_AGUARD_EDITAR_VALOR:[MessageHandler(filters.TEXT & ~filters.COMMAND, ti_editar_valor)],
+            AGUARD_DIFUSAO_TEXTO:  [MessageHandler(filters.TEXT & ~filters.COMMAND, receber_difusao),
+                                    CallbackQueryHandler(admin_callback, pattern="^adm_voltar$")],
         },
         fallbacks=[CommandHandler("cancelar", cancelar)],
         allow_reentry=True,
+        name="admin_conv",
+        persistent=persistencia is not None,
     )
 
+    if persistencia and persistencia.compartilhada:
+        # Estado gravado por outras instâncias: o refresh precisa rodar antes dos ConversationHandlers
+        persistencia.acompanhar(cliente_conv, admin_conv)
+        app.add_handler(TypeHandler(Update, sincronizar_estado), group=-1)
     app.add_handler(cliente_conv)
     app.add_handler(admin_conv)
+    app.add_handler(espera_h)
+    app.add_handler(CommandHandler("exportar", exportar_cmd))
     app.add_error_handler(erro_handler)
+    return app
 
-    logger.info("🌸 Studio Dandara Britto Bot iniciado!")
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+def main() -> None:
+    if not TELEGRAM_TOKEN:
+        raise ValueError("TELEGRAM_TOKEN não encontrado")
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        raise ValueError("SUPABASE_URL ou SUPABASE_KEY não encontrados")
+
+    persistencia = criar_persistencia(PERSISTENCIA, repo, PERSISTENCIA_ARQUIVO, PERSISTENCIA_INTERVALO)
+    app = montar_app(
+        Application.builder().token(TELEGRAM_TOKEN).concurrent_updates(ProcessadorPorConversa(UPDATES_SIMULTANEOS)),
+        persistencia,
+    )
+
+    if MODO == "webhook":
+        if not WEBHOOK_URL or not WEBHOOK_SECRET:
+            raise ValueError("WEBHOOK_URL ou WEBHOOK_SECRET não encontrados")
+        if not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", WEBHOOK_SECRET):
+            raise ValueError("WEBHOOK_SECRET deve ter 1-256 caracteres entre A-Z, a-z, 0-9, _ e -")
+        logger.info(f"🌸 Studio Dandara Britto Bot iniciado (webhook na porta {WEBHOOK_PORTA})!")
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=WEBHOOK_PORTA,
+            url_path=WEBHOOK_CAMINHO,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_CAMINHO}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=ATUALIZACOES,
+        )
+    else:
+        logger.info("🌸 Studio Dandara Britto Bot iniciado!")
+        app.run_polling(allowed_updates=ATUALIZACOES)
 
 
 if __name__ == "__main__":
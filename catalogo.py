@@ -0,0 +1,182 @@
+"""Catálogo de serviços e horários, persistido no Supabase.
+
+O bot lê sempre um `Catalogo` imutável (serviços com duração, modelos de
+horário e as profissionais com o expediente de cada uma); qualquer alteração (deste ou de
+outro processo) gera um novo snapshot que substitui o anterior numa única
+atribuição. A tabela `catalogo_versao` é incrementada por gatilho a cada
+mudança, então basta consultar uma linha periodicamente para saber se é
+preciso recarregar.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Servico:
+    nome: str
+    duracao_min: int = 60
+    preco: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class Horario:
+    id: int
+    horario: str                       # HH:MM
+    dia_semana: Optional[int] = None   # 1 = segunda … 7 = domingo; None = todos os dias
+
+
+@dataclass(frozen=True)
+class Profissional:
+    id: int
+    nome: str
+    expediente: tuple = ((),) * 8   # índice = dia ISO (0 sem uso): ((inicio_min, fim_min), ...)
+
+    def turnos(self, dia_semana):
+        return self.expediente[dia_semana]
+
+
+@dataclass(frozen=True)
+class Catalogo:
+    """Snapshot imutável com índices prontos para consultas O(1)."""
+
+    versao: int = 0
+    servicos: tuple = ()
+    modelos: tuple = ()             # todos os `Horario`, ordenados
+    profissionais: tuple = ()       # vazio = uma única cadeira, aberta o dia todo
+    _por_nome: MappingProxyType = field(default_factory=lambda: MappingProxyType({}), repr=False)
+    _por_dia: tuple = field(default=((),) * 8, repr=False)            # índice 0 = padrão
+    _validos_por_dia: tuple = field(default=(frozenset(),) * 8, repr=False)
+
+    @classmethod
+    def montar(cls, versao, servicos, horarios, profissionais=()):
+        servicos = tuple(sorted(servicos, key=lambda s: s.nome))
+        modelos  = tuple(sorted(horarios, key=lambda h: (h.dia_semana or 0, h.horario)))
+        padrao   = tuple(h.horario for h in modelos if h.dia_semana is None)
+        por_dia  = [padrao]
+        for dia in range(1, 8):
+            # Um modelo específico do dia substitui a lista padrão
+            especificos = tuple(h.horario for h in modelos if h.dia_semana == dia)
+            por_dia.append(especificos or padrao)
+        return cls(
+            versao=versao,
+            servicos=servicos,
+            modelos=modelos,
+            profissionais=tuple(sorted(profissionais, key=lambda p: p.id)),
+            _por_nome=MappingProxyType({s.nome: s for s in servicos}),
+            _por_dia=tuple(por_dia),
+            _validos_por_dia=tuple(frozenset(hs) for hs in por_dia),
+        )
+
+    @property
+    def nomes_servicos(self):
+        return tuple(s.nome for s in self.servicos)
+
+    def servico(self, nome):
+        return self._por_nome.get(nome)
+
+    def tem_servico(self, nome):
+        return nome in self._por_nome
+
+    def duracao(self, nome=None):
+        """Minutos do serviço; sem nome, a do serviço mais curto (vitrine de horários)."""
+        if nome is not None:
+            servico = self._por_nome.get(nome)
+            return servico.duracao_min if servico else 60
+        return min((s.duracao_min for s in self.servicos), default=60)
+
+    def horarios(self, dia_semana=None):
+        """Horários oferecidos no dia da semana (ISO), ou a lista padrão."""
+        return self._por_dia[dia_semana or 0]
+
+    def horario_valido(self, horario, dia_semana=None):
+        return horario in self._validos_por_dia[dia_semana or 0]
+
+
+def _minutos(hhmm):
+    h, m = str(hhmm)[:5].split(":")
+    return int(h) * 60 + int(m)
+
+
+def montar_profissionais(profissionais, expedientes):
+    """Linhas de `profissionais` e `expedientes` → `Profissional` com turnos por dia da semana."""
+    turnos = {}
+    for e in expedientes:
+        dias = turnos.setdefault(e["profissional_id"], [[] for _ in range(8)])
+        dias[e["dia_semana"]].append((_minutos(e["inicio"]), _minutos(e["fim"])))
+    return [
+        Profissional(p["id"], p["nome"], tuple(tuple(sorted(d)) for d in turnos.get(p["id"], [()] * 8)))
+        for p in profissionais
+    ]
+
+
+class CacheCatalogo:
+    """Mantém o snapshot atual e o recarrega quando a versão no banco muda."""
+
+    def __init__(self, repo, intervalo=30):
+        self._repo      = repo
+        self._intervalo = intervalo
+        self._atual     = Catalogo()
+        self._trava     = asyncio.Lock()
+        self._tarefa    = None
+
+    @property
+    def atual(self):
+        return self._atual
+
+    async def carregar(self):
+        async with self._trava:
+            versao, servicos, horarios, profissionais, expedientes = await self._repo.catalogo()
+            self._atual = Catalogo.montar(
+                versao,
+                [Servico(s["nome"], s["duracao_min"], s.get("preco")) for s in servicos],
+                [Horario(h["id"], str(h["horario"])[:5], h.get("dia_semana")) for h in horarios],
+                montar_profissionais(profissionais, expedientes),
+            )
+        logger.info(
+            f"Catálogo v{versao}: {len(servicos)} serviços, {len(horarios)} horários, "
+            f"{len(profissionais)} profissionais"
+        )
+
+    async def verificar(self):
+        """Recarrega se outro processo (ou o SQL Editor) alterou o catálogo."""
+        if await self._repo.versao_catalogo() != self._atual.versao:
+            await self.carregar()
+
+    async def _vigiar(self):
+        while True:
+            await asyncio.sleep(self._intervalo)
+            try:
+                await self.verificar()
+            except Exception as e:
+                logger.warning(f"Falha ao verificar versão do catálogo: {e}")
+
+    def iniciar(self):
+        self._tarefa = asyncio.create_task(self._vigiar())
+
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            self._tarefa = None
+
+    # ─── Alterações feitas pelo TI ────────────────────────────────────
+
+    async def adicionar_servico(self, nome, duracao_min=60, preco=None):
+        await self._repo.inserir_servico({"nome": nome, "duracao_min": duracao_min, "preco": preco})
+        await self.carregar()
+
+    async def remover_servico(self, nome):
+        await self._repo.remover_servico(nome)
+        await self.carregar()
+
+    async def adicionar_horario(self, horario, dia_semana=None):
+        await self._repo.inserir_horario({"horario": horario, "dia_semana": dia_semana})
+        await self.carregar()
+
+    async def remover_horario(self, horario_id):
+        await self._repo.remover_horario(horario_id)
+        await self.carregar()
@@ -0,0 +1,49 @@
+"""Cache LRU das clientes recentes (`telegram_id → nome`).
+
+Quem já agendou não precisa digitar o nome de novo: o nome vem daqui ou,
+numa falta, de uma única busca pela chave primária de `clientes`. As
+ausências também ficam guardadas, e cada agendamento gravado atualiza a
+entrada pelo ouvinte do repositório.
+"""
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_AUSENTE = object()
+
+
+class CacheClientes:
+    """LRU limitado a `capacidade` clientes."""
+
+    def __init__(self, repo, capacidade=1000):
+        self._repo       = repo
+        self._capacidade = capacidade
+        self._nomes      = OrderedDict()   # telegram_id (str) -> nome, ou None se não cadastrada
+
+    async def nome(self, telegram_id):
+        """Nome cadastrado da cliente, ou None."""
+        chave = str(telegram_id)
+        nome  = self._nomes.get(chave, _AUSENTE)
+        if nome is not _AUSENTE:
+            self._nomes.move_to_end(chave)
+            return nome
+        try:
+            cliente = await self._repo.obter_cliente(chave)
+        except Exception as e:
+            logger.warning(f"Falha ao buscar cliente {chave}: {e}")
+            return None
+        nome = cliente["nome"] if cliente else None
+        self._guardar(chave, nome)
+        return nome
+
+    def _guardar(self, chave, nome):
+        self._nomes[chave] = nome
+        self._nomes.move_to_end(chave)
+        while len(self._nomes) > self._capacidade:
+            self._nomes.popitem(last=False)
+
+    def ao_alterar(self, evento, ag):
+        """Ouvinte do repositório: como o gatilho no banco, guarda o nome do último agendamento."""
+        if evento == "inserir" and ag.get("telegram_id") and ag.get("nome"):
+            self._guardar(str(ag["telegram_id"]), ag["nome"])
@@ -0,0 +1,65 @@
+"""Processamento concorrente de updates, em série dentro de cada conversa.
+
+Com `concurrent_updates(True)` puro, duas mensagens seguidas da mesma
+cliente correm juntas e disputam o estado do `ConversationHandler` e o
+`user_data`; sem ele, uma ida lenta ao banco de uma cliente segura todas
+as outras. Aqui cada update espera só pelos anteriores do mesmo usuário
+(ou do mesmo chat, quando não há usuário), na ordem de chegada, e
+conversas diferentes andam em paralelo até `simultaneos` de cada vez.
+
+O limite de execução é tomado depois da trava da conversa: uma cliente
+que manda 50 mensagens seguidas ocupa uma vaga só, e não as 50. O
+semáforo do PTB (`max_concurrent_updates`) vira apenas o teto de updates
+em andamento, esperando ou rodando.
+"""
+import asyncio
+
+from telegram.ext import BaseUpdateProcessor
+
+EM_ANDAMENTO = 4096   # teto de updates aceitos do PTB ao mesmo tempo (esperando a vez ou rodando)
+
+
+def chave_conversa(update):
+    """Usuário do update ou, sem ele, o chat; None para updates sem dono (rodam livres)."""
+    usuario = getattr(update, "effective_user", None)
+    if usuario is not None:
+        return ("usuario", usuario.id)
+    chat = getattr(update, "effective_chat", None)
+    if chat is not None:
+        return ("chat", chat.id)
+    return None
+
+
+class ProcessadorPorConversa(BaseUpdateProcessor):
+    """Uma trava FIFO por conversa, criada sob demanda e descartada quando ninguém mais espera."""
+
+    def __init__(self, simultaneos=64):
+        super().__init__(EM_ANDAMENTO)
+        self._vagas  = asyncio.Semaphore(simultaneos)
+        self._travas = {}   # chave -> [asyncio.Lock, updates esperando ou rodando]
+
+    @property
+    def conversas_ativas(self):
+        return len(self._travas)
+
+    async def do_process_update(self, update, coroutine):
+        chave = chave_conversa(update)
+        if chave is None:
+            async with self._vagas:
+                await coroutine
+            return
+        entrada = self._travas.setdefault(chave, [asyncio.Lock(), 0])
+        entrada[1] += 1
+        try:
+            async with entrada[0], self._vagas:
+                await coroutine
+        finally:
+            entrada[1] -= 1
+            if not entrada[1]:
+                self._travas.pop(chave, None)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
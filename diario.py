@@ -0,0 +1,368 @@
+"""Diário local de escritas para quando o Supabase está fora do ar.
+
+Agendamentos novos e mudanças de status vão primeiro ao banco; se ele nem
+chegar a responder (`falha_de_conexao`), a escrita é gravada num SQLite
+local só de acréscimos (`synchronous=FULL`, cada entrada vai ao disco antes
+da resposta) e o bot confirma na hora. Uma tarefa em segundo plano reaplica
+o diário em ordem: o `id` do agendamento é um UUID gerado aqui e o INSERT
+ignora ids já gravados, então reaplicar a mesma entrada não duplica nada.
+Enquanto houver entradas pendentes, as escritas novas entram atrás delas
+para não passar na frente.
+
+Uma entrada que o banco recusa, ou que falha por qualquer outro motivo
+que não seja a queda, sai da fila e vai para a lista de mortas (`falhou =
+1`, consultável em `mortas()`): nunca segura a reaplicação das seguintes.
+
+As leituras dos painéis passam por `ler`, que guarda o último resultado de
+cada consulta e o devolve (com as escritas pendentes aplicadas por cima)
+quando o banco não responde. Sem cópia da consulta, as buscas por id,
+código e cliente caem nas linhas já conhecidas por este processo.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from postgrest.exceptions import APIError
+
+from repositorio import CodigoDuplicado, HorarioOcupado, falha_de_conexao, gerar_codigo
+
+logger = logging.getLogger(__name__)
+
+
+class DiarioEscritas:
+    """Escritas com fallback local, reaplicação idempotente e cache de leitura."""
+
+    MAX_LEITURAS = 200    # consultas distintas guardadas para o modo degradado
+    MAX_LINHAS   = 5000   # agendamentos conhecidos (base das atualizações offline)
+
+    def __init__(self, repo, caminho="diario.sqlite3", intervalo=15):
+        self._repo       = repo
+        self._caminho    = caminho
+        self._intervalo  = intervalo
+        self._conexao    = None
+        self._trava_db   = threading.Lock()
+        self._pendentes  = 0
+        self._mortas     = 0
+        self._locais     = {}             # id -> linha com as escritas ainda não reaplicadas
+        self._por_ag     = Counter()      # id -> entradas pendentes do agendamento
+        self._linhas     = OrderedDict()  # id -> última versão vista do agendamento
+        self._leituras   = OrderedDict()  # chave da consulta -> último resultado
+        self._tarefa     = None
+        self._ao_falhar  = None
+        self._copia      = None           # ag_id -> linha, de outra fonte local (réplica)
+        self.degradado   = False
+
+    # ─── Armazenamento ────────────────────────────────────────────────
+
+    def _conectar(self):
+        if self._conexao is None:
+            self._conexao = sqlite3.connect(self._caminho, check_same_thread=False)
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute("PRAGMA synchronous=FULL")
+            self._conexao.execute("""
+                CREATE TABLE IF NOT EXISTS diario (
+                    seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+                    op          TEXT    NOT NULL,
+                    ag_id       TEXT    NOT NULL,
+                    dados       TEXT    NOT NULL,
+                    criado_em   REAL    NOT NULL,
+                    tentativas  INTEGER NOT NULL DEFAULT 0,
+                    falhou      INTEGER NOT NULL DEFAULT 0,
+                    erro        TEXT
+                )
+            """)
+        return self._conexao
+
+    def _gravar(self, op, ag_id, dados):
+        with self._trava_db, self._conectar() as con:
+            cur = con.execute(
+                "INSERT INTO diario (op, ag_id, dados, criado_em) VALUES (?, ?, ?, ?)",
+                (op, ag_id, json.dumps(dados, default=str), time.time()),
+            )
+        return cur.lastrowid
+
+    def _concluir(self, seq):
+        with self._trava_db, self._conectar() as con:
+            con.execute("DELETE FROM diario WHERE seq = ?", (seq,))
+
+    def _marcar(self, seq, tentativas, erro, falhou=False):
+        with self._trava_db, self._conectar() as con:
+            con.execute(
+                "UPDATE diario SET tentativas = ?, erro = ?, falhou = ? WHERE seq = ?",
+                (tentativas, erro, int(falhou), seq),
+            )
+
+    def _pendentes_gravados(self):
+        with self._trava_db:
+            return self._conectar().execute(
+                "SELECT seq, op, ag_id, dados, tentativas FROM diario WHERE falhou = 0 ORDER BY seq"
+            ).fetchall()
+
+    def _mortas_gravadas(self):
+        with self._trava_db:
+            return self._conectar().execute(
+                "SELECT seq, op, ag_id, dados, tentativas, erro FROM diario WHERE falhou = 1 ORDER BY seq"
+            ).fetchall()
+
+    # ─── Escrita ──────────────────────────────────────────────────────
+
+    @property
+    def pendentes(self):
+        return self._pendentes
+
+    @property
+    def total_mortas(self):
+        return self._mortas
+
+    async def mortas(self):
+        """Entradas tiradas da fila: [(seq, op, ag_id, dados, tentativas, erro)]."""
+        return await asyncio.to_thread(self._mortas_gravadas)
+
+    async def inserir(self, dados):
+        """Como `repo.inserir`; com o banco fora do ar, grava no diário e devolve a linha provisória."""
+        dados = {"id": str(uuid.uuid4()), **dados}
+        if not self._pendentes:
+            try:
+                ag = await self._repo.inserir(dados)
+                self._recuperar()
+                return ag
+            except Exception as e:
+                if not falha_de_conexao(e):
+                    raise
+                self._degradar(e)
+        ag = {**dados, "codigo": dados.get("codigo") or gerar_codigo()}
+        await self._registrar("inserir", ag["id"], ag, ag)
+        self._repo.registrar_local("inserir", ag)
+        return ag
+
+    async def atualizar(self, ag_id, campos):
+        """Como `repo.atualizar`; offline, só para agendamentos já vistos por este processo."""
+        if not self._pendentes:
+            try:
+                ag = await self._repo.atualizar(ag_id, campos)
+                self._recuperar()
+                return ag
+            except Exception as e:
+                if not falha_de_conexao(e):
+                    raise
+                self._degradar(e)
+        ag = self._offline(ag_id, campos)
+        await self._registrar("atualizar", ag_id, campos, ag)
+        self._repo.registrar_local("atualizar", ag)
+        return ag
+
+    async def atualizar_status_lote(self, ids, status):
+        """Como `repo.atualizar_status_lote`; offline, uma entrada do diário por agendamento."""
+        if not self._pendentes:
+            try:
+                ags = await self._repo.atualizar_status_lote(ids, status)
+                self._recuperar()
+                return ags
+            except Exception as e:
+                if not falha_de_conexao(e):
+                    raise
+                self._degradar(e)
+        ags = [self._offline(ag_id, {"status": status}) for ag_id in ids]
+        for ag in ags:
+            await self._registrar("atualizar", ag["id"], {"status": status}, ag)
+            self._repo.registrar_local("atualizar", ag)
+        return ags
+
+    def usar_copia(self, obter):
+        """`obter(ag_id)` de outra cópia local (a réplica), consultada nas atualizações offline."""
+        self._copia = obter
+
+    def _offline(self, ag_id, campos):
+        base = self._locais.get(ag_id) or self._linhas.get(ag_id) or (self._copia and self._copia(ag_id))
+        if base is None:
+            raise RuntimeError("Banco indisponível e agendamento desconhecido localmente")
+        return {**base, **campos}
+
+    async def _registrar(self, op, ag_id, dados, ag):
+        await asyncio.to_thread(self._gravar, op, ag_id, dados)
+        self._pendentes += 1
+        self._por_ag[ag_id] += 1
+        self._locais[ag_id] = ag
+        logger.warning(f"Diário: {op} {ag_id} gravado localmente ({self._pendentes} pendentes)")
+
+    def tolerar(self, erro):
+        """True (e entra no modo degradado) se `erro` é o banco fora do ar; para leituras de outros módulos."""
+        if not falha_de_conexao(erro):
+            return False
+        self._degradar(erro)
+        return True
+
+    def _degradar(self, erro):
+        if not self.degradado:
+            logger.error(f"Supabase inacessível, usando o diário local: {erro}")
+        self.degradado = True
+
+    def _recuperar(self):
+        if self.degradado:
+            logger.info("Supabase respondeu de novo")
+        self.degradado = False
+
+    # ─── Leitura ──────────────────────────────────────────────────────
+
+    async def ler(self, consulta, *args, **kwargs):
+        """`await consulta(*args, **kwargs)` guardando o resultado; serve a cópia se o banco cair."""
+        chave = json.dumps([consulta.__name__, args, kwargs], default=str, sort_keys=True)
+        try:
+            resultado = await consulta(*args, **kwargs)
+        except Exception as e:
+            if not falha_de_conexao(e):
+                raise
+            if chave in self._leituras:
+                self._degradar(e)
+                self._leituras.move_to_end(chave)
+                return self._sobrepor(self._leituras[chave])
+            local = self._ler_local(consulta.__name__, *args, **kwargs)
+            if local is None:
+                raise
+            self._degradar(e)
+            return local
+        self._recuperar()
+        self._leituras[chave] = resultado
+        self._leituras.move_to_end(chave)
+        while len(self._leituras) > self.MAX_LEITURAS:
+            self._leituras.popitem(last=False)
+        for ag in self._linhas_de(resultado):
+            self._conhecer(ag)
+        return self._sobrepor(resultado)
+
+    def _conhecidas(self):
+        return {**self._linhas, **{i: {**self._linhas.get(i, {}), **ag} for i, ag in self._locais.items()}}
+
+    def _ler_local(self, nome, *args, **kwargs):
+        """Resposta montada com as linhas conhecidas para consultas nunca feitas; None se não souber."""
+        if nome == "obter":
+            return self._conhecidas().get(args[0])
+        if nome in ("obter_por_codigo", "buscar_por_codigo"):
+            alvo = "".join(c for c in args[0] if c.isalnum()).upper()
+            achados = [ag for ag in self._conhecidas().values() if str(ag.get("codigo") or "").startswith(alvo)]
+            if nome == "obter_por_codigo":
+                return next((ag for ag in achados if ag["codigo"] == alvo), None)
+            return achados[:kwargs.get("limite", 6)] if alvo else []
+        if nome == "clientes_recentes":
+            vistos = {}
+            for ag in reversed(list(self._conhecidas().values())):
+                if ag.get("telegram_id") and ag["telegram_id"] not in vistos:
+                    vistos[ag["telegram_id"]] = {"telegram_id": ag["telegram_id"], "nome": ag.get("nome")}
+            return list(vistos.values())[:args[0] if args else kwargs.get("limite", 30)]
+        return None
+
+    @staticmethod
+    def _linhas_de(resultado):
+        """As linhas de uma listagem (lista), de uma página (`(linhas, tem_mais)`) ou de uma busca (dict)."""
+        if isinstance(resultado, dict):
+            return [resultado] if "id" in resultado else []
+        if isinstance(resultado, tuple) and resultado and isinstance(resultado[0], list):
+            resultado = resultado[0]
+        if isinstance(resultado, list):
+            return [ag for ag in resultado if isinstance(ag, dict) and "id" in ag]
+        return []
+
+    def _sobrepor(self, resultado):
+        if not self._locais:
+            return resultado
+        if isinstance(resultado, dict):
+            return {**resultado, **self._locais[resultado["id"]]} if resultado.get("id") in self._locais else resultado
+        if isinstance(resultado, tuple) and resultado and isinstance(resultado[0], list):
+            return (self._sobrepor(resultado[0]),) + resultado[1:]
+        if isinstance(resultado, list):
+            return [{**ag, **self._locais[ag["id"]]} if isinstance(ag, dict) and ag.get("id") in self._locais else ag
+                    for ag in resultado]
+        return resultado
+
+    def _conhecer(self, ag):
+        self._linhas[ag["id"]] = ag
+        self._linhas.move_to_end(ag["id"])
+        while len(self._linhas) > self.MAX_LINHAS:
+            self._linhas.popitem(last=False)
+
+    def ao_alterar(self, evento, ag):
+        """Ouvinte do repositório: mantém a última versão conhecida de cada agendamento."""
+        if evento == "excluir":
+            self._linhas.pop(ag["id"], None)
+        elif ag["id"] in self._linhas:
+            self._conhecer({**self._linhas[ag["id"]], **ag})
+        else:
+            self._conhecer(ag)
+
+    # ─── Reaplicação ──────────────────────────────────────────────────
+
+    async def iniciar(self, ao_falhar=None):
+        """`ao_falhar(op, dados, erro)` é aguardado quando o banco recusa uma entrada do diário."""
+        self._ao_falhar = ao_falhar
+        gravados = await asyncio.to_thread(self._pendentes_gravados)
+        self._pendentes = len(gravados)
+        self._mortas    = len(await asyncio.to_thread(self._mortas_gravadas))
+        for _, op, ag_id, dados, _ in gravados:
+            self._por_ag[ag_id] += 1
+            self._locais[ag_id] = {**self._locais.get(ag_id, {}), **json.loads(dados)}
+        if gravados:
+            logger.info(f"Diário: {len(gravados)} escritas pendentes retomadas")
+        self._tarefa = asyncio.create_task(self._laco())
+
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            self._tarefa = None
+
+    async def _laco(self):
+        while True:
+            await asyncio.sleep(self._intervalo)
+            if not self._pendentes:
+                continue
+            try:
+                await self.reaplicar()
+            except Exception as e:
+                logger.error(f"Erro ao reaplicar o diário: {e}")
+
+    async def reaplicar(self):
+        """Envia as entradas em ordem; para na primeira falha de conexão e tira da fila as que falham de outro jeito."""
+        for seq, op, ag_id, bruto, tentativas in await asyncio.to_thread(self._pendentes_gravados):
+            dados = {"id": ag_id}
+            try:
+                dados = json.loads(bruto)
+                if op == "inserir":
+                    await self._repo.inserir(dados, idempotente=True)
+                else:
+                    await self._repo.atualizar(ag_id, dados)
+            except Exception as e:
+                if falha_de_conexao(e):
+                    self._degradar(e)
+                    await asyncio.to_thread(self._marcar, seq, tentativas + 1, str(e))
+                    return
+                if isinstance(e, (APIError, HorarioOcupado, CodigoDuplicado)):
+                    # Recusada pelo banco (ex.: o horário foi tomado por outra cliente durante a queda)
+                    logger.warning(f"Diário: {op} {ag_id} recusado pelo banco: {e}")
+                else:
+                    logger.exception(f"Diário: {op} {ag_id} falhou sem ser queda; vai para as mortas")
+                await asyncio.to_thread(self._marcar, seq, tentativas + 1, repr(e), True)
+                self._mortas += 1
+                self._descontar(ag_id)
+                if op == "inserir":
+                    self._repo.registrar_local("excluir", {**dados, "id": ag_id})
+                if self._ao_falhar:
+                    try:
+                        await self._ao_falhar(op, self._linhas.get(ag_id) or dados, e)
+                    except Exception as e2:
+                        logger.warning(f"Falha ao avisar sobre entrada recusada do diário: {e2}")
+                continue
+            await asyncio.to_thread(self._concluir, seq)
+            self._descontar(ag_id)
+        self._recuperar()
+        logger.info("Diário: todas as escritas pendentes foram aplicadas")
+
+    def _descontar(self, ag_id):
+        self._pendentes = max(self._pendentes - 1, 0)
+        self._por_ag[ag_id] -= 1
+        if self._por_ag[ag_id] <= 0:
+            del self._por_ag[ag_id]
+            self._locais.pop(ag_id, None)
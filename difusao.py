@@ -0,0 +1,95 @@
+"""Envio de uma mensagem a um segmento de clientes (difusão).
+
+O segmento é resolvido no banco com um `SELECT DISTINCT telegram_id`. O
+envio passa pela fila de notificações, que já respeita os limites do
+Telegram, com no máximo `concorrencia` mensagens em voo. O progresso é
+relatado periodicamente a quem disparou e, ao final, o relatório com as
+falhas fica gravado na tabela `difusoes`.
+"""
+import asyncio
+import logging
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+SEGMENTOS = {
+    "todos":   "👥 Todos os clientes",
+    "semana":  "📅 Com horário nesta semana",
+    "servico": "💅 Clientes de um serviço",
+}
+
+
+class Difusao:
+    """Resolve segmentos e distribui a mensagem com concorrência limitada."""
+
+    def __init__(self, repo, fila, concorrencia=20, intervalo_progresso=3):
+        self._repo         = repo
+        self._fila         = fila
+        self._concorrencia = concorrencia
+        self._intervalo    = intervalo_progresso
+        self._tarefas      = set()
+
+    async def destinatarios(self, segmento, servico=None):
+        """`telegram_id` distintos do segmento ("todos", "semana" ou "servico")."""
+        inicio = fim = None
+        if segmento == "semana":
+            hoje   = date.today()
+            inicio = hoje - timedelta(days=hoje.weekday())
+            fim    = inicio + timedelta(days=6)
+            inicio, fim = inicio.isoformat(), fim.isoformat()
+        return await self._repo.clientes_segmento(segmento, servico, inicio, fim)
+
+    def disparar(self, destinos, texto, segmento, servico=None, ao_progresso=None):
+        """Roda `executar` em segundo plano, mantendo a referência da tarefa."""
+        tarefa = asyncio.create_task(self.executar(destinos, texto, segmento, servico, ao_progresso))
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+        return tarefa
+
+    async def executar(self, destinos, texto, segmento, servico=None, ao_progresso=None):
+        """Envia a todos e devolve o relatório; `ao_progresso(enviados, falhas, total, fim)` é aguardado."""
+        total, enviados, falhas = len(destinos), 0, []
+        limite = asyncio.Semaphore(self._concorrencia)
+
+        async def enviar_um(tid):
+            nonlocal enviados
+            async with limite:
+                try:
+                    erro = await self._fila.enviar_e_aguardar(tid, texto)
+                except Exception as e:
+                    erro = str(e)
+            if erro:
+                falhas.append({"telegram_id": tid, "erro": erro})
+            else:
+                enviados += 1
+
+        envio = asyncio.ensure_future(asyncio.gather(*(enviar_um(t) for t in destinos)))
+        while True:
+            feito, _ = await asyncio.wait({envio}, timeout=self._intervalo)
+            if feito:
+                break
+            await self._relatar(ao_progresso, enviados, falhas, total, False)
+        await self._relatar(ao_progresso, enviados, falhas, total, True)
+
+        relatorio = {
+            "segmento": segmento, "servico": servico, "texto": texto,
+            "total": total, "enviados": enviados, "falhas": falhas,
+        }
+        try:
+            await self._repo.registrar_difusao(relatorio)
+        except Exception as e:
+            logger.warning(f"Falha ao gravar relatório da difusão: {e}")
+        logger.info(f"Difusão '{segmento}': {enviados}/{total} entregues, {len(falhas)} falhas")
+        return relatorio
+
+    async def _relatar(self, ao_progresso, enviados, falhas, total, fim):
+        if ao_progresso is None:
+            return
+        try:
+            await ao_progresso(enviados, falhas, total, fim)
+        except Exception as e:
+            logger.warning(f"Falha ao atualizar progresso da difusão: {e}")
+
+    async def parar(self):
+        for tarefa in self._tarefas:
+            tarefa.cancel()
@@ -0,0 +1,134 @@
+"""Índice em memória de ocupação por data.
+
+Mantém `data → {id: (profissional_id, início em minutos, duração)}` com os
+agendamentos não cancelados (datas em AAAA-MM-DD). Cada data é carregada
+do banco uma vez e depois atualizada incrementalmente pelos eventos de
+escrita do repositório; o TTL garante que escritas de outros processos
+sejam percebidas. O encaixe de serviços nesses intervalos fica em
+`agenda.py`.
+"""
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class IndiceOcupacao:
+    """Ocupação por data com carga preguiçosa, TTL e atualização por eventos."""
+
+    def __init__(self, repo, ttl=60):
+        self._repo       = repo
+        self._ttl        = ttl
+        self._ocupados   = {}   # data -> {id: (profissional_id, inicio_min, duracao_min)}
+        self._por_id     = {}   # id -> data
+        self._validade   = {}   # data -> instante (monotonic) de expiração
+        self._pendentes  = {}   # data -> eventos recebidos durante a carga
+        self._reservas   = {}   # data -> {chave: intervalo} segurados fora do banco (lista de espera)
+        self._trava      = asyncio.Lock()
+        self._tolerar    = None   # erro -> True para seguir sem o banco (modo degradado do diário)
+
+    # ─── Consulta ─────────────────────────────────────────────────────
+
+    async def intervalos(self, data, ignorar=None):
+        """[(profissional_id, inicio_min, duracao_min)] ocupados em `data`, sem o agendamento `ignorar`."""
+        await self.carregar([data])
+        ocupados = [v for ag_id, v in self._ocupados.get(data, {}).items() if ag_id != ignorar]
+        return ocupados + list(self._reservas.get(data, {}).values())
+
+    async def carregar(self, datas):
+        """Garante que as datas estejam válidas no índice (uma consulta por intervalo para todas as expiradas)."""
+        agora    = time.monotonic()
+        vencidas = [d for d in datas if self._validade.get(d, 0) <= agora]
+        if not vencidas:
+            return
+        async with self._trava:
+            agora    = time.monotonic()
+            vencidas = [d for d in vencidas if self._validade.get(d, 0) <= agora]
+            if not vencidas:
+                return
+            for d in vencidas:
+                self._pendentes[d] = []
+            try:
+                linhas = await self._repo.ocupacao(min(vencidas), max(vencidas))
+            except Exception as e:
+                for d in vencidas:
+                    self._pendentes.pop(d, None)
+                if all(d in self._ocupados for d in vencidas):
+                    # Banco fora do ar: a cópia vencida (mantida pelos eventos) ainda serve
+                    logger.warning(f"Ocupação de {vencidas} servida vencida: {e}")
+                    return
+                if self._tolerar and self._tolerar(e):
+                    # Sem cópia: a data começa vazia (só as reservas aceitas no diário a ocupam)
+                    # e continua vencida; conflitos aparecem na reaplicação do diário
+                    sem_copia = [d for d in vencidas if d not in self._ocupados]
+                    for d in sem_copia:
+                        self._ocupados[d] = {}
+                    logger.warning(f"Ocupação de {sem_copia} desconhecida com o banco fora do ar; tratada como livre")
+                    return
+                raise
+            for d in vencidas:
+                self._descartar_data(d)
+                self._ocupados[d] = {}
+            alvo = set(vencidas)
+            for ag in linhas:
+                if ag["data"] in alvo:
+                    self._marcar(ag["id"], ag["data"], ag["horario"], ag.get("profissional_id"), ag.get("duracao_min"))
+            for d in vencidas:
+                for evento, ag in self._pendentes.pop(d, []):
+                    self._aplicar(evento, ag)
+                self._validade[d] = agora + self._ttl
+
+    # ─── Atualização ──────────────────────────────────────────────────
+
+    def reservar(self, chave, data, horario, profissional_id=None, duracao_min=60):
+        """Segura um intervalo só em memória até `liberar(chave)` (oferta com prazo)."""
+        h, m = str(horario)[:5].split(":")
+        self._reservas.setdefault(data, {})[chave] = (profissional_id, int(h) * 60 + int(m), duracao_min)
+
+    def liberar(self, chave):
+        for data, reservas in list(self._reservas.items()):
+            if reservas.pop(chave, None) is not None and not reservas:
+                del self._reservas[data]
+
+    def tolerar_falhas(self, decidir):
+        """`decidir(erro)` → True para tratar como livres as datas sem cópia quando o banco falha."""
+        self._tolerar = decidir
+
+    def invalidar(self, data=None):
+        """Força recarga de uma data (ou de todas) na próxima consulta."""
+        if data is None:
+            self._validade.clear()
+        else:
+            self._validade.pop(data, None)
+
+    def ao_alterar(self, evento, ag):
+        """Ouvinte do repositório: aplica inserção, edição, cancelamento e exclusão."""
+        for d in {ag.get("data"), self._por_id.get(ag["id"])}:
+            if d in self._pendentes:
+                self._pendentes[d].append((evento, ag))
+        self._aplicar(evento, ag)
+
+    def _aplicar(self, evento, ag):
+        anterior = self._desmarcar(ag["id"])
+        if evento != "excluir" and ag.get("status") != "cancelado":
+            if ag.get("data") in self._ocupados:
+                # Eventos parciais mantêm profissional e duração já conhecidas
+                prof, _, duracao = anterior or (None, None, None)
+                self._marcar(ag["id"], ag["data"], ag["horario"],
+                             ag.get("profissional_id", prof), ag.get("duracao_min") or duracao)
+
+    def _marcar(self, ag_id, data, horario, profissional_id=None, duracao_min=None):
+        h, m = str(horario)[:5].split(":")
+        self._ocupados.setdefault(data, {})[ag_id] = (profissional_id, int(h) * 60 + int(m), duracao_min or 60)
+        self._por_id[ag_id] = data
+
+    def _desmarcar(self, ag_id):
+        data = self._por_id.pop(ag_id, None)
+        if data is not None:
+            return self._ocupados.get(data, {}).pop(ag_id, None)
+        return None
+
+    def _descartar_data(self, data):
+        for ag_id in self._ocupados.pop(data, {}):
+            self._por_id.pop(ag_id, None)
@@ -0,0 +1,233 @@
+"""Lista de espera com oferta automática quando um horário vaga.
+
+Quem encontra uma data lotada pode entrar na lista para aquela data (o dia
+todo, a manhã ou a tarde). Cada data tem um heap com as clientes na ordem
+de entrada. Nada varre a tabela: o ouvinte do repositório avisa de cada
+cancelamento ou exclusão, e só a data afetada é reavaliada. A primeira
+cliente cujo serviço cabe no horário livre recebe a oferta com um botão.
+Enquanto a oferta vale, o horário fica reservado no índice de ocupação.
+Se ela não aceitar a tempo, a vaga passa para a próxima da fila.
+
+A lista fica na tabela `lista_espera`; as ofertas em aberto só existem
+em memória (num reinício, quem estava na lista continua nela).
+"""
+import asyncio
+import heapq
+import logging
+import secrets
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# faixa -> (de, até, rótulo)
+FAIXAS = {
+    "dia":   ("00:00", "23:59", "🕐 Qualquer horário"),
+    "manha": ("00:00", "12:00", "🌅 Manhã"),
+    "tarde": ("12:00", "23:59", "🌇 Tarde"),
+}
+
+
+@dataclass
+class Entrada:
+    id: int
+    telegram_id: str
+    nome: str
+    servico: str
+    data: str
+    de: str
+    ate: str
+    recusados: set = field(default_factory=set)   # horários já oferecidos sem sucesso
+
+    @classmethod
+    def de_linha(cls, linha):
+        return cls(linha["id"], str(linha["telegram_id"]), linha["nome"], linha["servico"],
+                   str(linha["data"]), str(linha["de"])[:5], str(linha["ate"])[:5])
+
+
+@dataclass
+class Oferta:
+    token: str
+    entrada: Entrada
+    data: str
+    horario: str
+    profissional_id: Optional[int]
+    duracao_min: int
+    prazo: Optional[asyncio.TimerHandle] = None
+
+
+class ListaEspera:
+    """Heap por data, casamento disparado por eventos e reserva com prazo."""
+
+    def __init__(self, repo, ocupacao, agenda, catalogo, reserva_min=15):
+        self._repo      = repo
+        self._ocupacao  = ocupacao
+        self._agenda    = agenda
+        self._catalogo  = catalogo
+        self._reserva_s = reserva_min * 60
+        self._por_data  = {}   # data -> heap de ids (id crescente = ordem de entrada)
+        self._entradas  = {}   # id -> Entrada aguardando (ou com oferta em aberto)
+        self._ofertas   = {}   # token -> Oferta
+        self._trava     = asyncio.Lock()
+        self._tarefas   = set()
+        self._ofertar   = None
+
+    @property
+    def aguardando(self):
+        return len(self._entradas)
+
+    @property
+    def reserva_min(self):
+        return self._reserva_s // 60
+
+    async def iniciar(self, ofertar):
+        """`ofertar(oferta)` é aguardado para mandar a oferta à cliente."""
+        self._ofertar = ofertar
+        for linha in await self._repo.espera_aguardando(date.today().isoformat()):
+            self._enfileirar(Entrada.de_linha(linha))
+        logger.info(f"Lista de espera: {len(self._entradas)} clientes aguardando")
+
+    async def parar(self):
+        for oferta in self._ofertas.values():
+            if oferta.prazo:
+                oferta.prazo.cancel()
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+
+    def _disparar(self, corrotina):
+        tarefa = asyncio.create_task(corrotina)
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+
+    def _enfileirar(self, entrada):
+        self._entradas[entrada.id] = entrada
+        heapq.heappush(self._por_data.setdefault(entrada.data, []), entrada.id)
+
+    # ─── Entrada na lista ─────────────────────────────────────────────
+
+    async def entrar(self, telegram_id, nome, servico, data, faixa="dia"):
+        """Coloca a cliente na fila da data (sem duplicar) e já tenta encaixá-la."""
+        de, ate, _ = FAIXAS[faixa]
+        for e in self._entradas.values():
+            if (e.telegram_id, e.data, e.servico, e.de, e.ate) == (str(telegram_id), data, servico, de, ate):
+                return e
+        linha = await self._repo.espera_inserir({
+            "telegram_id": str(telegram_id), "nome": nome, "servico": servico,
+            "data": data, "de": de, "ate": ate,
+        })
+        entrada = Entrada.de_linha(linha)
+        self._enfileirar(entrada)
+        self._disparar(self._casar(data))
+        return entrada
+
+    # ─── Casamento ────────────────────────────────────────────────────
+
+    def ao_alterar(self, evento, ag):
+        """Ouvinte do repositório: cancelamento ou exclusão liberam vaga na data."""
+        vagou = (
+            (evento == "excluir" and ag.get("status") != "cancelado")
+            or (evento == "atualizar" and ag.get("status") == "cancelado")
+        )
+        data = str(ag.get("data"))
+        if vagou and self._por_data.get(data):
+            self._disparar(self._casar(data))
+
+    async def _casar(self, data):
+        """Oferece as vagas da data às clientes da fila, na ordem de entrada."""
+        async with self._trava:
+            fila = self._por_data.get(data)
+            if not fila:
+                return
+            if data < date.today().isoformat():
+                for entrada_id in self._por_data.pop(data):
+                    self._entradas.pop(entrada_id, None)
+                return
+            agora    = datetime.now().strftime("%H:%M") if data == date.today().isoformat() else ""
+            adiadas  = []
+            encaixes = {}   # servico -> {horario: profissional}, refeito após cada oferta
+            while fila:
+                entrada = self._entradas.get(heapq.heappop(fila))
+                if entrada is None:
+                    continue
+                if entrada.servico not in encaixes:
+                    encaixes[entrada.servico] = await self._agenda.encaixes(data, entrada.servico)
+                livres  = encaixes[entrada.servico]
+                horario = next((h for h in livres
+                                if entrada.de <= h < entrada.ate and h > agora and h not in entrada.recusados), None)
+                if horario is None:
+                    adiadas.append(entrada.id)
+                    continue
+                await self._oferecer(entrada, data, horario, livres[horario])
+                encaixes.clear()
+            for entrada_id in adiadas:
+                heapq.heappush(fila, entrada_id)
+
+    async def _oferecer(self, entrada, data, horario, profissional_id):
+        # Aleatório, não sequencial: um botão de oferta de antes de um reinício não casa com outra
+        token  = secrets.token_urlsafe(6)
+        oferta = Oferta(token, entrada, data, horario, profissional_id,
+                        self._catalogo.atual.duracao(entrada.servico))
+        self._ocupacao.reservar(("espera", token), data, horario, profissional_id, oferta.duracao_min)
+        self._ofertas[token] = oferta
+        oferta.prazo = asyncio.get_running_loop().call_later(self._reserva_s, self._vencer, token)
+        try:
+            await self._ofertar(oferta)
+            logger.info(f"Lista de espera: {data} {horario} oferecido a {entrada.telegram_id}")
+        except Exception as e:
+            logger.warning(f"Falha ao oferecer vaga a {entrada.telegram_id}: {e}")
+            self._soltar(token)
+
+    def _soltar(self, token):
+        """Desfaz a oferta e devolve a cliente à fila (sem repetir o mesmo horário)."""
+        oferta = self._ofertas.pop(token, None)
+        if oferta is None:
+            return None
+        if oferta.prazo:
+            oferta.prazo.cancel()
+        self._ocupacao.liberar(("espera", token))
+        oferta.entrada.recusados.add(oferta.horario)
+        if oferta.entrada.id in self._entradas:
+            heapq.heappush(self._por_data.setdefault(oferta.data, []), oferta.entrada.id)
+        return oferta
+
+    def _vencer(self, token):
+        oferta = self._soltar(token)
+        if oferta is not None:
+            logger.info(f"Lista de espera: oferta {oferta.data} {oferta.horario} expirou")
+            self._disparar(self._casar(oferta.data))
+
+    # ─── Resposta da cliente ──────────────────────────────────────────
+
+    def aceitar(self, token, telegram_id):
+        """Tira a oferta do relógio; devolve a `Oferta` ou None se venceu ou não é dela.
+
+        A reserva no índice continua até `concluir`, depois da gravação.
+        """
+        oferta = self._ofertas.get(token)
+        if oferta is None or oferta.entrada.telegram_id != str(telegram_id):
+            return None
+        del self._ofertas[token]
+        oferta.prazo.cancel()
+        return oferta
+
+    async def concluir(self, oferta, ok):
+        self._ocupacao.liberar(("espera", oferta.token))
+        if ok:
+            self._entradas.pop(oferta.entrada.id, None)
+            try:
+                await self._repo.espera_atualizar(oferta.entrada.id, "atendida")
+            except Exception as e:
+                logger.warning(f"Falha ao marcar espera {oferta.entrada.id} como atendida: {e}")
+            return
+        oferta.entrada.recusados.add(oferta.horario)
+        heapq.heappush(self._por_data.setdefault(oferta.data, []), oferta.entrada.id)
+        self._disparar(self._casar(oferta.data))
+
+    async def recusar(self, token, telegram_id):
+        oferta = self._ofertas.get(token)
+        if oferta is None or oferta.entrada.telegram_id != str(telegram_id):
+            return False
+        self._soltar(token)
+        await self._casar(oferta.data)
+        return True
@@ -0,0 +1,40 @@
+"""Cache de curta duração para o painel de estatísticas do TI."""
+import asyncio
+import time
+from datetime import datetime
+
+
+class PainelEstatisticas:
+    """Guarda o resultado de `estatisticas_agendamentos` por `ttl` segundos.
+
+    Qualquer escrita feita pelo bot invalida o cache (via ouvinte do
+    repositório), então toques repetidos em "📊 Estatísticas" não vão ao banco.
+    """
+
+    def __init__(self, repo, ttl=30):
+        self._repo   = repo
+        self._ttl    = ttl
+        self._valor  = None
+        self._chave  = None
+        self._expira = 0.0
+        self._trava  = asyncio.Lock()
+
+    async def obter(self):
+        hoje = datetime.now().date().isoformat()
+        if self._valido(hoje):
+            return self._valor
+        async with self._trava:
+            if not self._valido(hoje):
+                self._valor  = await self._repo.estatisticas(hoje)
+                self._chave  = hoje
+                self._expira = time.monotonic() + self._ttl
+        return self._valor
+
+    def invalidar(self):
+        self._expira = 0.0
+
+    def ao_alterar(self, evento, ag):
+        self.invalidar()
+
+    def _valido(self, hoje):
+        return self._valor is not None and self._chave == hoje and time.monotonic() < self._expira
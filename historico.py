@@ -0,0 +1,140 @@
+"""Exportação do histórico de agendamentos e arquivo dos antigos.
+
+`exportar` percorre um intervalo de datas em páginas de tamanho fixo (keyset
+em data, horario, id), primeiro no arquivo e depois na tabela quente, e
+escreve cada página num arquivo temporário em CSV ou XLSX (`openpyxl` em
+modo write_only, que também grava linha a linha). A memória fica em uma
+página, qualquer que seja o número de linhas.
+
+`Arquivador` roda uma vez por dia e move os agendamentos com mais de
+`meses` meses para `agendamentos_arquivo` (função SQL
+`arquivar_agendamentos`, em lotes curtos), para que a tabela quente e os
+seus índices continuem pequenos.
+"""
+import asyncio
+import csv
+import io
+import logging
+import tempfile
+from datetime import date
+
+try:
+    from openpyxl import Workbook
+except ImportError:  # opcional: sem ele só há exportação em CSV
+    Workbook = None
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_EXPORTACAO = (
+    "codigo", "nome", "servico", "data", "horario", "duracao_min",
+    "profissional_id", "status", "telegram_id", "criado_em",
+)
+CABECALHO = (
+    "Código", "Nome", "Serviço", "Data", "Horário", "Duração (min)",
+    "Profissional", "Status", "Telegram", "Criado em",
+)
+FORMATOS  = ("csv", "xlsx") if Workbook is not None else ("csv",)
+
+
+class _EscritorCSV:
+    def __init__(self, arquivo):
+        # utf-8-sig: o Excel reconhece a acentuação ao abrir o CSV direto
+        self._texto  = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="", write_through=True)
+        self._csv    = csv.writer(self._texto, delimiter=";")
+        self._csv.writerow(CABECALHO)
+
+    def linhas(self, linhas):
+        self._csv.writerows(linhas)
+
+    def fechar(self):
+        self._texto.flush()
+        self._texto.detach()
+
+
+class _EscritorXLSX:
+    def __init__(self, arquivo):
+        self._arquivo = arquivo
+        self._livro   = Workbook(write_only=True)
+        self._folha   = self._livro.create_sheet("Agendamentos")
+        self._folha.append(CABECALHO)
+
+    def linhas(self, linhas):
+        for linha in linhas:
+            self._folha.append(linha)
+
+    def fechar(self):
+        self._livro.save(self._arquivo)
+
+
+async def exportar(repo, inicio, fim, formato="csv", pagina=500):
+    """Arquivo temporário (posicionado no início) e o total de linhas de `inicio` a `fim`."""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato indisponível: {formato}")
+    arquivo  = tempfile.TemporaryFile()
+    escritor = await asyncio.to_thread(_EscritorXLSX if formato == "xlsx" else _EscritorCSV, arquivo)
+    total    = 0
+    try:
+        for tabela in ("agendamentos_arquivo", "agendamentos"):
+            apos = None
+            while True:
+                linhas = await repo.exportar_pagina(tabela, inicio, fim, apos, pagina, ",".join(COLUNAS_EXPORTACAO + ("id",)))
+                if not linhas:
+                    break
+                await asyncio.to_thread(escritor.linhas, [
+                    [str(ag[c])[:5] if c == "horario" else ag.get(c) for c in COLUNAS_EXPORTACAO] for ag in linhas
+                ])
+                total += len(linhas)
+                if len(linhas) < pagina:
+                    break
+                ultimo = linhas[-1]
+                apos   = (ultimo["data"], ultimo["horario"], ultimo["id"])
+        await asyncio.to_thread(escritor.fechar)
+    except BaseException:
+        arquivo.close()
+        raise
+    arquivo.seek(0)
+    return arquivo, total
+
+
+class Arquivador:
+    """Move para o arquivo, uma vez por `intervalo` segundos, o que passou de `meses` meses."""
+
+    def __init__(self, repo, meses=12, intervalo=24 * 3600, lote=1000):
+        self._repo      = repo
+        self._meses     = meses
+        self._intervalo = intervalo
+        self._lote      = lote
+        self._tarefa    = None
+
+    def corte(self, hoje=None):
+        hoje = hoje or date.today()
+        ano, mes = divmod(hoje.year * 12 + hoje.month - 1 - self._meses, 12)
+        return date(ano, mes + 1, 1).isoformat()
+
+    async def arquivar(self):
+        """Move em lotes até não restar nada antes do corte; devolve quantos foram movidos."""
+        corte, movidos = self.corte(), 0
+        while True:
+            n = await self._repo.arquivar_agendamentos(corte, self._lote)
+            movidos += n
+            if n < self._lote:
+                break
+        if movidos:
+            logger.info(f"Arquivo: {movidos} agendamentos anteriores a {corte} movidos")
+        return movidos
+
+    def iniciar(self):
+        self._tarefa = asyncio.create_task(self._laco())
+
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            self._tarefa = None
+
+    async def _laco(self):
+        while True:
+            try:
+                await self.arquivar()
+            except Exception as e:
+                logger.warning(f"Falha ao arquivar agendamentos antigos: {e}")
+            await asyncio.sleep(self._intervalo)
@@ -0,0 +1,115 @@
+"""Lembretes automáticos 24h e 2h antes de cada agendamento confirmado.
+
+Os disparos ficam num min-heap em memória, carregado uma única vez na
+inicialização e atualizado pelos eventos de escrita do repositório
+(confirmação, cancelamento, edição, exclusão). Uma única tarefa dorme até
+o próximo vencimento, sem varrer a tabela. Antes de enviar, a coluna
+`lembrete_*_em` é marcada com um UPDATE condicional: só quem conseguir
+marcá-la envia, então o lembrete nunca sai duas vezes, nem após um
+reinício nem com várias instâncias no ar.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+ANTECEDENCIAS = {"24h": timedelta(hours=24), "2h": timedelta(hours=2)}
+COLUNAS       = {"24h": "lembrete_24h_em", "2h": "lembrete_2h_em"}
+# Confirmado com menos que isso de antecedência, o lembrete de 24h (atrasado) não sai
+MINIMO_24H    = timedelta(hours=20)
+
+
+def inicio_ag(ag):
+    return datetime.combine(date.fromisoformat(str(ag["data"])[:10]), time.fromisoformat(str(ag["horario"])[:5]))
+
+
+class AgendadorLembretes:
+    """Min-heap de (vencimento, ag_id, tipo) com remoção preguiçosa."""
+
+    def __init__(self, repo, fila):
+        self._repo       = repo
+        self._fila       = fila
+        self._formatar   = None          # formatar(ag, tipo) -> texto da mensagem
+        self._heap       = []
+        self._agendados  = {}            # (ag_id, tipo) -> (vencimento, ag)
+        self._seq        = itertools.count()
+        self._acordar    = asyncio.Event()
+        self._tarefa     = None
+
+    @property
+    def pendentes(self):
+        return len(self._agendados)
+
+    async def iniciar(self, formatar):
+        self._formatar = formatar
+        ags = await self._repo.confirmados_futuros(date.today().isoformat())
+        for ag in ags:
+            self._programar(ag)
+        logger.info(f"Lembretes: {len(self._agendados)} programados")
+        self._tarefa = asyncio.create_task(self._laco())
+
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            self._tarefa = None
+
+    def ao_alterar(self, evento, ag):
+        """Ouvinte do repositório: reprograma o agendamento alterado."""
+        for tipo in ANTECEDENCIAS:
+            self._agendados.pop((ag["id"], tipo), None)
+        if evento != "excluir" and ag.get("status") == "confirmado" and ag.get("telegram_id"):
+            self._programar(ag)
+
+    def _programar(self, ag):
+        inicio = inicio_ag(ag)
+        for tipo, antecedencia in ANTECEDENCIAS.items():
+            if ag.get(COLUNAS[tipo]):
+                continue
+            vencimento = inicio - antecedencia
+            self._agendados[(ag["id"], tipo)] = (vencimento, ag)
+            heapq.heappush(self._heap, (vencimento, next(self._seq), ag["id"], tipo))
+            if self._heap[0][0] == vencimento:
+                self._acordar.set()
+
+    def _topo_valido(self):
+        """Descarta do topo entradas canceladas ou reprogramadas."""
+        while self._heap:
+            vencimento, _, ag_id, tipo = self._heap[0]
+            atual = self._agendados.get((ag_id, tipo))
+            if atual and atual[0] == vencimento:
+                return self._heap[0]
+            heapq.heappop(self._heap)
+        return None
+
+    async def _laco(self):
+        while True:
+            topo = self._topo_valido()
+            espera = (topo[0] - datetime.now()).total_seconds() if topo else 3600
+            if espera > 0:
+                self._acordar.clear()
+                try:
+                    await asyncio.wait_for(self._acordar.wait(), timeout=min(espera, 3600))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, ag_id, tipo = heapq.heappop(self._heap)
+            _, ag = self._agendados.pop((ag_id, tipo))
+            try:
+                await self._disparar(ag, tipo)
+            except Exception as e:
+                logger.warning(f"Falha no lembrete {tipo} de {ag_id}: {e}")
+
+    async def _disparar(self, ag, tipo):
+        falta = inicio_ag(ag) - datetime.now()
+        if falta <= timedelta(0):
+            return
+        if tipo == "24h" and falta < MINIMO_24H:
+            return  # confirmado em cima da hora: basta o lembrete de 2h
+        marcado = await self._repo.reservar_lembrete(
+            ag["id"], COLUNAS[tipo], datetime.now(timezone.utc).isoformat()
+        )
+        if marcado:
+            await self._fila.enviar(marcado["telegram_id"], self._formatar(marcado, tipo))
@@ -0,0 +1,285 @@
+"""Métricas no formato de texto do Prometheus e perfilador por amostragem.
+
+Sem dependências externas: contadores, histogramas e medidores simples,
+expostos em `/metrics` por um servidor HTTP mínimo (asyncio). Os handlers
+são medidos pelo decorador `medir`; as consultas ao Supabase chegam pelo
+ouvinte `registrar_consulta` do repositório. O perfilador amostra a pilha
+da thread do event loop e agrega as pilhas no formato "collapsed" (o que
+flamegraph.pl e speedscope leem), servido em `/perfil`.
+"""
+import asyncio
+import bisect
+import functools
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from roteador import SEPARADOR
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_rotulos(chave, extra=()):
+    pares = list(chave) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+# ─── Tipos de métrica ─────────────────────────────────────────────────
+
+class Contador:
+    def __init__(self, nome, ajuda):
+        self.nome    = nome
+        self.ajuda   = ajuda
+        self._series = defaultdict(float)
+
+    def inc(self, valor=1, **rotulos):
+        self._series[tuple(sorted(rotulos.items()))] += valor
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        for chave, valor in self._series.items():
+            linhas.append(f"{self.nome}{_fmt_rotulos(chave)} {valor:g}")
+        return linhas
+
+
+class Histograma:
+    def __init__(self, nome, ajuda, buckets=BUCKETS_PADRAO):
+        self.nome     = nome
+        self.ajuda    = ajuda
+        self._buckets = tuple(buckets)
+        self._series  = {}   # rótulos -> [contagens por bucket (+Inf no fim), soma, total]
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        serie = self._series.get(chave)
+        if serie is None:
+            serie = self._series[chave] = [[0] * (len(self._buckets) + 1), 0.0, 0]
+        serie[0][bisect.bisect_left(self._buckets, valor)] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        for chave, (contagens, soma, total) in self._series.items():
+            acumulado = 0
+            for limite, n in zip(self._buckets + ("+Inf",), contagens):
+                acumulado += n
+                le = limite if limite == "+Inf" else f"{limite:g}"
+                linhas.append(f"{self.nome}_bucket{_fmt_rotulos(chave, [('le', le)])} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_fmt_rotulos(chave)} {soma:g}")
+            linhas.append(f"{self.nome}_count{_fmt_rotulos(chave)} {total}")
+        return linhas
+
+
+class Medidor:
+    """Valor lido na hora da coleta (profundidade de filas, por exemplo)."""
+
+    def __init__(self, nome, ajuda, funcao):
+        self.nome   = nome
+        self.ajuda  = ajuda
+        self.funcao = funcao
+
+    def exportar(self):
+        try:
+            valor = self.funcao()
+        except Exception as e:
+            logger.warning(f"Medidor {self.nome} falhou: {e}")
+            return []
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} gauge", f"{self.nome} {valor:g}"]
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = []
+
+    def contador(self, nome, ajuda):
+        return self._adicionar(Contador(nome, ajuda))
+
+    def histograma(self, nome, ajuda, buckets=BUCKETS_PADRAO):
+        return self._adicionar(Histograma(nome, ajuda, buckets))
+
+    def medidor(self, nome, ajuda, funcao):
+        return self._adicionar(Medidor(nome, ajuda, funcao))
+
+    def _adicionar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def exportar(self):
+        linhas = []
+        for metrica in self._metricas:
+            linhas.extend(metrica.exportar())
+        return "\n".join(linhas) + "\n"
+
+
+REGISTRO          = Registro()
+HANDLER_SEGUNDOS  = REGISTRO.histograma("bot_handler_segundos", "Latência dos handlers do Telegram")
+HANDLER_ERROS     = REGISTRO.contador("bot_handler_erros_total", "Exceções levantadas pelos handlers")
+CONSULTA_SEGUNDOS = REGISTRO.histograma("supabase_consulta_segundos", "Duração das requisições ao Supabase")
+CONSULTA_LINHAS   = REGISTRO.contador("supabase_linhas_total", "Linhas devolvidas pelo Supabase")
+CONSULTA_ERROS    = REGISTRO.contador("supabase_erros_total", "Requisições ao Supabase que falharam")
+ERROS             = REGISTRO.contador("bot_erros_total", "Erros recebidos pelo error handler")
+
+
+# ─── Instrumentação ───────────────────────────────────────────────────
+
+# Parte fixa do callback_data: tokens minúsculos antes de ids, códigos e nomes
+_ACAO = re.compile(r"^[a-z]+(?:_[a-z]+(?=_|$))*")
+
+
+def acao_callback(data):
+    """`edit_campo:nome` → `edit_campo`, `minha_cancelar_<uuid>` → `minha_cancelar`, `adm_hoje` → ele mesmo."""
+    data = data or ""
+    if SEPARADOR in data:
+        # Botões do roteador: `op:<payload>`; a operação é o rótulo
+        return data.partition(SEPARADOR)[0] or "?"
+    m = _ACAO.match(data)
+    return m.group(0) if m else "?"
+
+
+def medir(handler):
+    """Decorador: latência e erros do handler, com a ação do botão como rótulo."""
+    nome = handler.__name__
+
+    @functools.wraps(handler)
+    async def envolto(update, context, *args, **kwargs):
+        query  = getattr(update, "callback_query", None)
+        acao   = acao_callback(query.data) if query is not None else ""
+        inicio = time.perf_counter()
+        try:
+            return await handler(update, context, *args, **kwargs)
+        except Exception:
+            HANDLER_ERROS.inc(handler=nome, acao=acao)
+            raise
+        finally:
+            HANDLER_SEGUNDOS.observar(time.perf_counter() - inicio, handler=nome, acao=acao)
+
+    return envolto
+
+
+def registrar_consulta(operacao, segundos, linhas, erro):
+    """Ouvinte do repositório para cada requisição ao Supabase."""
+    CONSULTA_SEGUNDOS.observar(segundos, operacao=operacao)
+    if erro:
+        CONSULTA_ERROS.inc(operacao=operacao)
+    elif linhas:
+        CONSULTA_LINHAS.inc(linhas, operacao=operacao)
+
+
+# ─── Perfilador por amostragem ────────────────────────────────────────
+
+class Perfilador:
+    """Amostra a pilha de uma thread a cada `intervalo` segundos, em outra thread."""
+
+    def __init__(self, intervalo=0.005, profundidade=40):
+        self._intervalo    = intervalo
+        self._profundidade = profundidade
+        self._pilhas       = Counter()
+        self._thread       = None
+        self._parar        = threading.Event()
+        self.inicio        = None
+
+    @property
+    def ativo(self):
+        return self._thread is not None
+
+    def iniciar(self):
+        """Começa a amostrar a thread que chamou (a do event loop)."""
+        if self.ativo:
+            return
+        alvo = threading.get_ident()
+        self._pilhas.clear()
+        self._parar.clear()
+        self.inicio  = time.monotonic()
+        self._thread = threading.Thread(target=self._amostrar, args=(alvo,), name="perfilador", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        if not self.ativo:
+            return
+        self._parar.set()
+        self._thread.join()
+        self._thread = None
+
+    def _amostrar(self, alvo):
+        while not self._parar.wait(self._intervalo):
+            quadro = sys._current_frames().get(alvo)
+            pilha  = []
+            while quadro is not None and len(pilha) < self._profundidade:
+                codigo = quadro.f_code
+                pilha.append(f"{codigo.co_name} ({codigo.co_filename.rsplit('/', 1)[-1]}:{quadro.f_lineno})")
+                quadro = quadro.f_back
+            if pilha:
+                self._pilhas[";".join(reversed(pilha))] += 1
+
+    @property
+    def amostras(self):
+        return sum(self._pilhas.values())
+
+    def mais_frequentes(self, n=10):
+        """Funções no topo da pilha com mais amostras: [(função, amostras)]."""
+        topo = Counter()
+        for pilha, qtd in self._pilhas.items():
+            topo[pilha.rsplit(";", 1)[-1]] += qtd
+        return topo.most_common(n)
+
+    def collapsed(self):
+        return "\n".join(f"{pilha} {qtd}" for pilha, qtd in self._pilhas.most_common()) + "\n"
+
+
+# ─── Servidor HTTP ────────────────────────────────────────────────────
+
+class ServidorMetricas:
+    """HTTP mínimo só para GET /metrics e /perfil."""
+
+    def __init__(self, registro, perfilador=None, host="127.0.0.1", porta=9100):
+        self._registro   = registro
+        self._perfilador = perfilador
+        self._host       = host
+        self._porta      = porta
+        self._servidor   = None
+
+    async def iniciar(self):
+        self._servidor = await asyncio.start_server(self._atender, self._host, self._porta)
+        logger.info(f"Métricas em http://{self._host}:{self._porta}/metrics")
+
+    async def parar(self):
+        if self._servidor:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+            self._servidor = None
+
+    async def _atender(self, leitor, escritor):
+        try:
+            linha = await asyncio.wait_for(leitor.readline(), timeout=5)
+            while (await asyncio.wait_for(leitor.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            partes  = linha.decode("latin-1").split()
+            caminho = partes[1].split("?", 1)[0] if len(partes) > 1 else ""
+            if caminho == "/metrics":
+                status, corpo = "200 OK", self._registro.exportar()
+            elif caminho == "/perfil" and self._perfilador is not None:
+                status, corpo = "200 OK", self._perfilador.collapsed()
+            else:
+                status, corpo = "404 Not Found", "não encontrado\n"
+            dados = corpo.encode()
+            escritor.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(dados)}\r\nConnection: close\r\n\r\n".encode() + dados
+            )
+            await escritor.drain()
+        except Exception as e:
+            logger.warning(f"Erro ao servir métricas: {e}")
+        finally:
+            escritor.close()
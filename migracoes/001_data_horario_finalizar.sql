@@ -0,0 +1,31 @@
+-- ╔══════════════════════════════════════════════════════╗
+-- ║   Migração 001 (2/2): troca das colunas de data/hora  ║
+-- ║   Rode somente após backfill_datas.py terminar       ║
+-- ╚══════════════════════════════════════════════════════╝
+
+BEGIN;
+
+DROP TRIGGER  IF EXISTS trg_agendamentos_sincroniza_data ON agendamentos;
+DROP FUNCTION IF EXISTS agendamentos_sincroniza_data();
+DROP FUNCTION IF EXISTS backfill_datas_lote(INT);
+DROP FUNCTION IF EXISTS estatisticas_agendamentos(TEXT);
+
+DROP INDEX IF EXISTS uq_agendamentos_horario_ativo;
+DROP INDEX IF EXISTS idx_agendamentos_keyset;
+DROP INDEX IF EXISTS idx_agendamentos_data;
+
+ALTER TABLE agendamentos DROP COLUMN data;
+ALTER TABLE agendamentos DROP COLUMN horario;
+ALTER TABLE agendamentos RENAME COLUMN data_d    TO data;
+ALTER TABLE agendamentos RENAME COLUMN horario_t TO horario;
+ALTER TABLE agendamentos ALTER COLUMN data    SET NOT NULL;
+ALTER TABLE agendamentos ALTER COLUMN horario SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_agendamentos_keyset ON agendamentos(data, horario, id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_agendamentos_horario_ativo
+    ON agendamentos(data, horario) WHERE status <> 'cancelado';
+
+COMMIT;
+
+-- Em seguida execute supabase_schema.sql novamente para recriar
+-- estatisticas_agendamentos(hoje DATE).
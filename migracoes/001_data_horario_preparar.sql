@@ -0,0 +1,60 @@
+-- ╔══════════════════════════════════════════════════════╗
+-- ║   Migração 001 (1/2): data TEXT → DATE, horario → TIME ║
+-- ║   Execute no SQL Editor do painel do Supabase        ║
+-- ╚══════════════════════════════════════════════════════╝
+--
+-- Ordem:
+--   1. Este arquivo (cria as colunas novas e mantém-nas em dia)
+--   2. python migracoes/backfill_datas.py   (converte as linhas antigas em lotes)
+--   3. 001_data_horario_finalizar.sql       (troca as colunas e recria os índices)
+--   4. supabase_schema.sql                  (recria as funções com os tipos novos)
+--
+-- Entre os passos 1 e 3 o bot antigo pode continuar no ar: o gatilho abaixo
+-- preenche as colunas novas em cada INSERT/UPDATE.
+
+ALTER TABLE agendamentos ADD COLUMN IF NOT EXISTS data_d    DATE;
+ALTER TABLE agendamentos ADD COLUMN IF NOT EXISTS horario_t TIME;
+
+CREATE OR REPLACE FUNCTION agendamentos_sincroniza_data()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.data ~ '^\d{2}/\d{2}/\d{4}$' THEN
+        NEW.data_d := to_date(NEW.data, 'DD/MM/YYYY');
+    END IF;
+    IF NEW.horario ~ '^\d{2}:\d{2}$' THEN
+        NEW.horario_t := NEW.horario::time;
+    END IF;
+    RETURN NEW;
+END $$;
+
+DROP TRIGGER IF EXISTS trg_agendamentos_sincroniza_data ON agendamentos;
+CREATE TRIGGER trg_agendamentos_sincroniza_data
+    BEFORE INSERT OR UPDATE OF data, horario ON agendamentos
+    FOR EACH ROW EXECUTE FUNCTION agendamentos_sincroniza_data();
+
+-- Converte até `tamanho` linhas ainda não migradas; devolve quantas converteu.
+-- Lotes pequenos mantêm cada transação curta e sem travar a tabela inteira.
+CREATE OR REPLACE FUNCTION backfill_datas_lote(tamanho INT)
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    n INT;
+BEGIN
+    UPDATE agendamentos a
+       SET data_d    = to_date(a.data, 'DD/MM/YYYY'),
+           horario_t = a.horario::time
+     WHERE a.id IN (
+        SELECT id FROM agendamentos
+         WHERE (data_d IS NULL OR horario_t IS NULL)
+           AND data    ~ '^\d{2}/\d{2}/\d{4}$'
+           AND horario ~ '^\d{2}:\d{2}$'
+         LIMIT tamanho
+         FOR UPDATE SKIP LOCKED
+     );
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END $$;
+
+-- Linhas em formato inesperado (corrija à mão antes do passo 3):
+-- SELECT id, data, horario FROM agendamentos WHERE data_d IS NULL OR horario_t IS NULL;
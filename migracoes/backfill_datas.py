@@ -0,0 +1,47 @@
+"""Converte em lotes as datas DD/MM/AAAA antigas para as colunas DATE/TIME.
+
+Uso (depois de 001_data_horario_preparar.sql):
+
+    python migracoes/backfill_datas.py [--lote 500] [--pausa 0.2]
+"""
+import argparse
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+from supabase import create_client
+
+logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+logger = logging.getLogger("backfill_datas")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lote",  type=int,   default=500, help="linhas por transação")
+    parser.add_argument("--pausa", type=float, default=0.2, help="segundos entre lotes")
+    args = parser.parse_args()
+
+    load_dotenv()
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+
+    total = 0
+    while True:
+        n = supabase.rpc("backfill_datas_lote", {"tamanho": args.lote}).execute().data
+        if not n:
+            break
+        total += n
+        logger.info(f"{total} linhas convertidas")
+        time.sleep(args.pausa)
+
+    restantes = (
+        supabase.table("agendamentos").select("id", count="exact")
+        .or_("data_d.is.null,horario_t.is.null").execute().count
+    )
+    logger.info(f"Backfill concluído: {total} linhas convertidas, {restantes} pendentes")
+    if restantes:
+        logger.warning("Há linhas em formato inesperado; corrija-as antes de 001_data_horario_finalizar.sql")
+
+
+if __name__ == "__main__":
+    main()
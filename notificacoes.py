@@ -0,0 +1,213 @@
+"""Fila assíncrona de mensagens enviadas pelo bot.
+
+Os handlers apenas enfileiram (`await fila.enviar(...)`) e respondem na
+hora; trabalhadores em segundo plano entregam respeitando os limites do
+Telegram (balde de tokens global e por chat), esperam o `RetryAfter`
+pedido pela API e repetem falhas de rede com recuo exponencial. Cada
+mensagem fica gravada num SQLite local até ser entregue, então nada se
+perde num reinício.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class BaldeTokens:
+    """Permite `taxa` retiradas por segundo, com rajadas de até `capacidade`."""
+
+    def __init__(self, taxa, capacidade=None):
+        self.taxa       = taxa
+        self.capacidade = capacidade or taxa
+        self.tokens     = float(self.capacidade)
+        self.atualizado = time.monotonic()
+
+    def _repor(self):
+        agora = time.monotonic()
+        self.tokens = min(self.capacidade, self.tokens + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+
+    def cheio(self):
+        self._repor()
+        return self.tokens >= self.capacidade
+
+    async def retirar(self):
+        while True:
+            self._repor()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.taxa)
+
+
+class FilaNotificacoes:
+    """Entrega em segundo plano com limite de taxa, novas tentativas e armazenamento durável."""
+
+    MAX_TENTATIVAS = 6
+    RECUO_BASE     = 2      # segundos; dobra a cada tentativa
+    MAX_BALDES     = 1000   # baldes por chat guardados antes de descartar os ociosos
+
+    def __init__(self, caminho="notificacoes.sqlite3", trabalhadores=4, taxa_global=25, taxa_por_chat=1):
+        self._caminho       = caminho
+        self._n_trabalhadores = trabalhadores
+        self._global        = BaldeTokens(taxa_global)
+        self._taxa_por_chat = taxa_por_chat
+        self._por_chat      = {}
+        self._pausa_ate     = 0.0
+        self._fila          = asyncio.Queue()
+        self._trabalhadores = []
+        self._bot           = None
+        self._conexao       = None
+        self._trava_db      = threading.Lock()
+        self._esperas       = {}   # item_id -> Future com None (entregue) ou o erro definitivo
+
+    # ─── Armazenamento ────────────────────────────────────────────────
+
+    def _conectar(self):
+        if self._conexao is None:
+            self._conexao = sqlite3.connect(self._caminho, check_same_thread=False)
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute("PRAGMA synchronous=NORMAL")
+            self._conexao.execute("""
+                CREATE TABLE IF NOT EXISTS notificacoes (
+                    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id     INTEGER NOT NULL,
+                    texto       TEXT    NOT NULL,
+                    parse_mode  TEXT,
+                    tentativas  INTEGER NOT NULL DEFAULT 0,
+                    criado_em   REAL    NOT NULL,
+                    falhou      INTEGER NOT NULL DEFAULT 0,
+                    erro        TEXT
+                )
+            """)
+        return self._conexao
+
+    def _gravar(self, chat_id, texto, parse_mode):
+        with self._trava_db, self._conectar() as con:
+            cur = con.execute(
+                "INSERT INTO notificacoes (chat_id, texto, parse_mode, criado_em) VALUES (?, ?, ?, ?)",
+                (chat_id, texto, parse_mode, time.time()),
+            )
+        return cur.lastrowid
+
+    def _concluir(self, item_id):
+        with self._trava_db, self._conectar() as con:
+            con.execute("DELETE FROM notificacoes WHERE id = ?", (item_id,))
+
+    def _marcar(self, item_id, tentativas, erro, falhou=False):
+        with self._trava_db, self._conectar() as con:
+            con.execute(
+                "UPDATE notificacoes SET tentativas = ?, erro = ?, falhou = ? WHERE id = ?",
+                (tentativas, erro, int(falhou), item_id),
+            )
+
+    def _pendentes_gravados(self):
+        with self._trava_db:
+            return self._conectar().execute(
+                "SELECT id, chat_id, texto, parse_mode, tentativas FROM notificacoes WHERE falhou = 0 ORDER BY id"
+            ).fetchall()
+
+    # ─── API ──────────────────────────────────────────────────────────
+
+    @property
+    def pendentes(self):
+        return self._fila.qsize()
+
+    async def enviar(self, chat_id, texto, parse_mode="Markdown"):
+        """Enfileira a mensagem (já gravada em disco) e retorna sem esperar a entrega."""
+        item_id = await asyncio.to_thread(self._gravar, int(chat_id), texto, parse_mode)
+        self._fila.put_nowait((item_id, int(chat_id), texto, parse_mode, 0))
+        return item_id
+
+    async def enviar_e_aguardar(self, chat_id, texto, parse_mode="Markdown"):
+        """Como `enviar`, mas espera o desfecho: None se entregue, senão a mensagem de erro."""
+        item_id = await asyncio.to_thread(self._gravar, int(chat_id), texto, parse_mode)
+        espera  = self._esperas[item_id] = asyncio.get_running_loop().create_future()
+        self._fila.put_nowait((item_id, int(chat_id), texto, parse_mode, 0))
+        return await espera
+
+    async def iniciar(self, bot):
+        self._bot = bot
+        gravados  = await asyncio.to_thread(self._pendentes_gravados)
+        for linha in gravados:
+            self._fila.put_nowait(tuple(linha))
+        if gravados:
+            logger.info(f"Notificações: {len(gravados)} pendentes retomadas")
+        self._trabalhadores = [asyncio.create_task(self._trabalhar()) for _ in range(self._n_trabalhadores)]
+
+    async def parar(self):
+        for t in self._trabalhadores:
+            t.cancel()
+        self._trabalhadores = []
+        for espera in self._esperas.values():
+            espera.cancel()
+        self._esperas.clear()
+
+    # ─── Entrega ──────────────────────────────────────────────────────
+
+    def _balde_chat(self, chat_id):
+        balde = self._por_chat.get(chat_id)
+        if balde is None:
+            if len(self._por_chat) >= self.MAX_BALDES:
+                self._por_chat = {c: b for c, b in self._por_chat.items() if not b.cheio()}
+            balde = self._por_chat[chat_id] = BaldeTokens(self._taxa_por_chat)
+        return balde
+
+    def _resolver(self, item_id, erro=None):
+        espera = self._esperas.pop(item_id, None)
+        if espera and not espera.done():
+            espera.set_result(erro)
+
+    def _reenfileirar(self, item, atraso):
+        asyncio.get_running_loop().call_later(atraso, self._fila.put_nowait, item)
+
+    async def _trabalhar(self):
+        while True:
+            item = await self._fila.get()
+            try:
+                await self._entregar(item)
+            except Exception as e:
+                logger.error(f"Erro inesperado na fila de notificações: {e}")
+                self._resolver(item[0], str(e))
+            finally:
+                self._fila.task_done()
+
+    async def _entregar(self, item):
+        item_id, chat_id, texto, parse_mode, tentativas = item
+        espera = self._pausa_ate - time.monotonic()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        await self._balde_chat(chat_id).retirar()
+        await self._global.retirar()
+        try:
+            await self._bot.send_message(chat_id=chat_id, text=texto, parse_mode=parse_mode)
+        except RetryAfter as e:
+            # Limite de flood: pausa todos os trabalhadores e tenta de novo, sem contar tentativa
+            atraso = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else float(e.retry_after)
+            self._pausa_ate = max(self._pausa_ate, time.monotonic() + atraso)
+            logger.warning(f"RetryAfter de {atraso}s ao notificar {chat_id}")
+            self._reenfileirar(item, atraso)
+            return
+        except (BadRequest, Forbidden) as e:
+            # Erros permanentes (chat inexistente, bot bloqueado, texto inválido)
+            logger.warning(f"Notificação {item_id} para {chat_id} descartada: {e}")
+            await asyncio.to_thread(self._marcar, item_id, tentativas + 1, str(e), True)
+            self._resolver(item_id, str(e))
+            return
+        except NetworkError as e:
+            tentativas += 1
+            falhou = tentativas >= self.MAX_TENTATIVAS
+            await asyncio.to_thread(self._marcar, item_id, tentativas, str(e), falhou)
+            if falhou:
+                logger.warning(f"Notificação {item_id} para {chat_id} desistida após {tentativas} tentativas: {e}")
+                self._resolver(item_id, str(e))
+            else:
+                self._reenfileirar((item_id, chat_id, texto, parse_mode, tentativas), self.RECUO_BASE ** tentativas)
+            return
+        await asyncio.to_thread(self._concluir, item_id)
+        self._resolver(item_id)
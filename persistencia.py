@@ -0,0 +1,300 @@
+"""Persistência do estado das conversas e de `context.user_data`.
+
+Permite reiniciar o bot no meio de um agendamento e rodar mais de uma
+instância. Há dois backends: SQLite local e Supabase (Postgres). Os dois
+guardam tudo em memória e gravam em segundo plano: o PTB já entrega as
+mudanças em lotes a cada `update_interval` segundos, e cada lote vira uma
+única transação, então nenhuma mensagem espera uma gravação.
+
+O SQLite é de uma instância só. O Supabase é compartilhado: antes de cada
+update, `refresh_user_data` relê numa ida ao banco o `user_data` e os
+estados de conversa daquele usuário gravados por outras instâncias (a
+menos que esta tenha mudanças dele ainda não gravadas, que são mais
+novas). O PTB só chama o refresh depois de escolher o handler, então o
+bot registra um handler vazio no grupo -1 (`acompanhar`) para a releitura
+acontecer antes de o `ConversationHandler` olhar o estado. Uma instância
+vê o que outra gravou depois de até `update_interval` segundos; com várias
+instâncias sem afinidade por usuário, use um intervalo curto.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+
+def _chave(nome, chave):
+    return nome, json.dumps(list(chave))
+
+
+class PersistenciaBase(BasePersistence):
+    """Estado em memória com gravação coalescida; subclasses só leem e gravam lotes."""
+
+    compartilhada = False   # True: outras instâncias gravam no mesmo lugar e o estado é relido a cada update
+
+    # `_usuarios`/`_conversas` espelham o último estado gravado ou lido; o que difere disso no PTB
+    # é mudança local que ainda não chegou aqui
+
+    def __init__(self, update_interval=5):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._usuarios    = None   # user_id -> dict
+        self._conversas   = None   # nome -> {chave (tupla): estado}
+        self._pend_usuarios  = {}  # user_id -> json (None = apagar)
+        self._pend_conversas = {}  # (nome, chave json) -> estado (None = apagar)
+        self._tarefa      = None
+        self._trava       = asyncio.Lock()
+        self._acompanhadas = []    # ConversationHandlers cujo estado é relido no refresh
+
+    # ─── Backend ──────────────────────────────────────────────────────
+
+    async def _ler(self):
+        """Devolve `(usuarios, conversas)`: [(user_id, json)] e [(nome, chave json, estado)]."""
+        raise NotImplementedError
+
+    async def _gravar(self, usuarios, conversas):
+        """Aplica os lotes pendentes numa única transação."""
+        raise NotImplementedError
+
+    async def _ler_usuario(self, user_id):
+        """Devolve `(json ou None, [(nome, chave json, estado)])` de um usuário (backends compartilhados)."""
+        raise NotImplementedError
+
+    # ─── Carga ────────────────────────────────────────────────────────
+
+    async def _garantir_carregado(self):
+        if self._usuarios is not None:
+            return
+        usuarios, conversas = await self._ler()
+        self._usuarios  = {int(uid): json.loads(dados) for uid, dados in usuarios}
+        self._conversas = {}
+        for nome, chave, estado in conversas:
+            self._conversas.setdefault(nome, {})[tuple(json.loads(chave))] = estado
+        logger.info(f"Persistência: {len(self._usuarios)} usuários, {len(conversas)} conversas carregadas")
+
+    async def get_user_data(self):
+        await self._garantir_carregado()
+        return {uid: dict(dados) for uid, dados in self._usuarios.items()}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        await self._garantir_carregado()
+        return dict(self._conversas.get(name, {}))
+
+    # ─── Atualização ──────────────────────────────────────────────────
+
+    async def update_user_data(self, user_id, data):
+        if self._usuarios.get(user_id) == data:
+            return
+        # Serializa agora: o PTB continua alterando o mesmo dict
+        self._usuarios[user_id] = json.loads(json.dumps(data))
+        self._pend_usuarios[user_id] = json.dumps(data)
+        self._agendar()
+
+    async def drop_user_data(self, user_id):
+        self._usuarios.pop(user_id, None)
+        self._pend_usuarios[user_id] = None
+        self._agendar()
+
+    async def update_conversation(self, name, key, new_state):
+        conversas = self._conversas.setdefault(name, {})
+        if conversas.get(key) == new_state:
+            return
+        if new_state is None:
+            conversas.pop(key, None)
+        else:
+            conversas[key] = new_state
+        self._pend_conversas[_chave(name, key)] = new_state
+        self._agendar()
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    def acompanhar(self, *conversas):
+        """ConversationHandlers persistentes cujo estado o refresh atualiza."""
+        self._acompanhadas.extend(conversas)
+
+    async def refresh_user_data(self, user_id, user_data):
+        """Backend compartilhado: troca `user_data` e os estados de conversa do usuário pelos do banco."""
+        if not self.compartilhada:
+            return
+        dados, conversas = await self._ler_usuario(user_id)
+        # Só troca o que não mudou aqui desde a última gravação (o PTB entrega as mudanças com atraso)
+        if user_id not in self._pend_usuarios and user_data == self._usuarios.get(user_id, {}):
+            novos = json.loads(dados) if dados is not None else {}
+            if novos != user_data:
+                user_data.clear()
+                user_data.update(novos)
+            self._usuarios[user_id] = json.loads(json.dumps(novos))
+        remotos = {}
+        for nome, chave, estado in conversas:
+            remotos.setdefault(nome, {})[tuple(json.loads(chave))] = estado
+        for conversa in self._acompanhadas:
+            self._aplicar_conversas(conversa, user_id, remotos.get(conversa.name, {}))
+
+    def _aplicar_conversas(self, conversa, user_id, remotos):
+        # O PTB não expõe o dicionário de estados; `update_no_track` evita regravar o que veio do banco
+        vivos = conversa._conversations   # noqa: SLF001
+        locais = self._conversas.setdefault(conversa.name, {})
+        for chave in [c for c in vivos if c and c[-1] == user_id] + list(remotos):
+            if (conversa.name, json.dumps(list(chave))) in self._pend_conversas or vivos.get(chave) != locais.get(chave):
+                continue   # mudança local ainda não gravada: é a mais nova
+            estado = remotos.get(chave)
+            if estado is None or estado == conversa.END:
+                vivos.data.pop(chave, None)
+                locais.pop(chave, None)
+            elif vivos.get(chave) != estado:
+                vivos.update_no_track({chave: estado})
+                locais[chave] = estado
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass   # chat_data não é persistido
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    # ─── Gravação coalescida ──────────────────────────────────────────
+
+    def _agendar(self):
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._descarregar())
+
+    async def _descarregar(self):
+        # Cede a vez para que as demais chamadas do mesmo ciclo entrem no lote
+        await asyncio.sleep(0)
+        async with self._trava:
+            usuarios, self._pend_usuarios = self._pend_usuarios, {}
+            conversas, self._pend_conversas = self._pend_conversas, {}
+            if not usuarios and not conversas:
+                return
+            try:
+                await self._gravar(usuarios, conversas)
+            except Exception as e:
+                logger.warning(f"Falha ao gravar persistência, nova tentativa no próximo ciclo: {e}")
+                # Devolve o lote sem sobrescrever mudanças mais novas
+                self._pend_usuarios  = {**usuarios, **self._pend_usuarios}
+                self._pend_conversas = {**conversas, **self._pend_conversas}
+
+    async def flush(self):
+        if self._tarefa is not None:
+            await self._tarefa
+        await self._descarregar()
+
+
+class PersistenciaSQLite(PersistenciaBase):
+    """Arquivo SQLite local (uma instância por arquivo)."""
+
+    def __init__(self, caminho="estado_bot.sqlite3", update_interval=5):
+        super().__init__(update_interval=update_interval)
+        self._caminho = caminho
+        self._conexao = None
+
+    def _conectar(self):
+        if self._conexao is None:
+            self._conexao = sqlite3.connect(self._caminho, check_same_thread=False)
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.executescript("""
+                CREATE TABLE IF NOT EXISTS usuarios (user_id INTEGER PRIMARY KEY, dados TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS conversas (
+                    nome TEXT NOT NULL, chave TEXT NOT NULL, estado TEXT NOT NULL,
+                    PRIMARY KEY (nome, chave)
+                );
+            """)
+        return self._conexao
+
+    def _ler_sync(self):
+        con = self._conectar()
+        usuarios  = con.execute("SELECT user_id, dados FROM usuarios").fetchall()
+        conversas = [(n, c, json.loads(e)) for n, c, e in con.execute("SELECT nome, chave, estado FROM conversas")]
+        return usuarios, conversas
+
+    def _gravar_sync(self, usuarios, conversas):
+        con = self._conectar()
+        with con:
+            con.executemany(
+                "INSERT OR REPLACE INTO usuarios (user_id, dados) VALUES (?, ?)",
+                [(uid, d) for uid, d in usuarios.items() if d is not None],
+            )
+            con.executemany("DELETE FROM usuarios WHERE user_id = ?", [(uid,) for uid, d in usuarios.items() if d is None])
+            con.executemany(
+                "INSERT OR REPLACE INTO conversas (nome, chave, estado) VALUES (?, ?, ?)",
+                [(n, c, json.dumps(e)) for (n, c), e in conversas.items() if e is not None],
+            )
+            con.executemany(
+                "DELETE FROM conversas WHERE nome = ? AND chave = ?",
+                [(n, c) for (n, c), e in conversas.items() if e is None],
+            )
+
+    async def _ler(self):
+        return await asyncio.to_thread(self._ler_sync)
+
+    async def _gravar(self, usuarios, conversas):
+        await asyncio.to_thread(self._gravar_sync, usuarios, conversas)
+
+
+class PersistenciaSupabase(PersistenciaBase):
+    """Tabelas `bot_usuarios`/`bot_conversas` no Supabase, compartilhadas entre instâncias."""
+
+    compartilhada = True
+
+    def __init__(self, repo, update_interval=5):
+        super().__init__(update_interval=update_interval)
+        self._repo = repo
+
+    async def _ler(self):
+        # O PTB carrega a persistência antes do post_init
+        await self._repo.conectar()
+        usuarios, conversas = await self._repo.estado_carregar()
+        return (
+            [(u["user_id"], json.dumps(u["dados"])) for u in usuarios],
+            [(c["nome"], c["chave"], c["estado"]) for c in conversas],
+        )
+
+    async def _gravar(self, usuarios, conversas):
+        await self._repo.estado_gravar(
+            [{"user_id": uid, "dados": json.loads(d)} for uid, d in usuarios.items() if d is not None],
+            [uid for uid, d in usuarios.items() if d is None],
+            [{"nome": n, "chave": c, "user_id": json.loads(c)[-1], "estado": e}
+             for (n, c), e in conversas.items() if e is not None],
+            [{"nome": n, "chave": c} for (n, c), e in conversas.items() if e is None],
+        )
+
+    async def _ler_usuario(self, user_id):
+        usuario, conversas = await self._repo.estado_do_usuario(user_id)
+        return (
+            json.dumps(usuario["dados"]) if usuario else None,
+            [(c["nome"], c["chave"], c["estado"]) for c in conversas],
+        )
+
+
+def criar_persistencia(tipo, repo, caminho_sqlite="estado_bot.sqlite3", update_interval=5):
+    """"sqlite", "supabase" ou "nenhuma" (devolve None)."""
+    if tipo == "sqlite":
+        return PersistenciaSQLite(caminho_sqlite, update_interval)
+    if tipo == "supabase":
+        return PersistenciaSupabase(repo, update_interval)
+    if tipo in ("", "nenhuma"):
+        return None
+    raise ValueError(f"PERSISTENCIA desconhecida: {tipo}")
@@ -0,0 +1,244 @@
+"""Réplica em memória dos agendamentos ativos (de hoje em diante, não cancelados).
+
+As telas do painel leem daqui em vez de ir ao banco. A réplica é carregada
+numa única consulta e mantida por dois caminhos: os eventos de escrita do
+próprio bot (ouvinte do repositório) e o Realtime do Supabase
+(`tempo_real.py`), que entrega as mudanças feitas por outros processos.
+De tempos em tempos uma soma MD5 calculada no banco
+(`agendamentos_ativos_checksum`) é comparada à local; se divergirem
+(evento perdido, queda do Realtime, virada do dia), a réplica é
+recarregada. Quando o canal Realtime volta de uma queda a conferência é
+feita na hora.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+COLUNAS_REPLICA = "id,codigo,nome,servico,data,horario,status,telegram_id"
+
+
+class Registro:
+    """Agendamento compacto; lido como dicionário (`ag["nome"]`, `ag.get(...)`) pelas telas."""
+
+    __slots__ = ("id", "codigo", "nome", "servico", "data", "horario", "status", "telegram_id")
+
+    def __init__(self, linha):
+        self.id          = str(linha["id"])
+        self.codigo      = linha.get("codigo")
+        self.nome        = linha.get("nome")
+        self.servico     = linha.get("servico")
+        self.data        = str(linha.get("data"))
+        self.horario     = str(linha.get("horario"))[:5]
+        self.status      = linha.get("status") or "pendente"
+        self.telegram_id = str(linha["telegram_id"]) if linha.get("telegram_id") else None
+
+    def __getitem__(self, campo):
+        try:
+            return getattr(self, campo)
+        except AttributeError:
+            raise KeyError(campo) from None
+
+    def get(self, campo, padrao=None):
+        return getattr(self, campo, padrao)
+
+    def como_dict(self):
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+    def assinatura(self):
+        """Mesma linha que a função SQL concatena para a soma de conferência."""
+        return "|".join((self.id, self.data, self.horario, self.status, self.nome or "",
+                         self.servico or "", self.telegram_id or "", self.codigo or ""))
+
+
+class ReplicaAgendamentos:
+    """Agendamentos ativos em memória, indexados por data, status e telegram_id."""
+
+    def __init__(self, repo, intervalo=60):
+        self._repo       = repo
+        self._intervalo  = intervalo
+        self._por_id     = {}   # id -> Registro
+        self._por_data   = {}   # data -> {id}
+        self._por_status = {}   # status -> {id}
+        self._por_tg     = {}   # telegram_id -> {id}
+        self._durante_carga = None   # eventos recebidos enquanto a carga está em voo
+        self._desde      = None
+        self._tarefa     = None
+        self._canal      = None
+        self._reconferir = None
+        self.pronta      = False
+        self.conferida_em = None
+
+    # ─── Consulta ─────────────────────────────────────────────────────
+
+    def _ordenados(self, ids):
+        return sorted((self._por_id[i] for i in ids), key=lambda r: (r.data, r.horario))
+
+    def obter(self, ag_id):
+        registro = self._por_id.get(str(ag_id))
+        return registro.como_dict() if registro else None
+
+    def por_data(self, data):
+        return self._ordenados(self._por_data.get(data, ()))
+
+    def por_status(self, *status, desde=None):
+        ids = set().union(*(self._por_status.get(s, ()) for s in status))
+        ags = self._ordenados(ids)
+        return [ag for ag in ags if ag.data >= desde] if desde else ags
+
+    def do_cliente(self, telegram_id, desde=None):
+        ags = self._ordenados(self._por_tg.get(str(telegram_id), ()))
+        return [ag for ag in ags if ag.data >= desde] if desde else ags
+
+    def __len__(self):
+        return len(self._por_id)
+
+    @property
+    def realtime(self):
+        """True enquanto o canal Realtime está conectado (senão, só a conferência periódica)."""
+        return self._canal is not None and self._canal.conectado
+
+    # ─── Manutenção ───────────────────────────────────────────────────
+
+    def _indices(self, registro):
+        yield self._por_data, registro.data
+        yield self._por_status, registro.status
+        if registro.telegram_id:
+            yield self._por_tg, registro.telegram_id
+
+    def _remover(self, ag_id):
+        registro = self._por_id.pop(ag_id, None)
+        if registro is None:
+            return
+        for indice, chave in self._indices(registro):
+            ids = indice.get(chave)
+            if ids is not None:
+                ids.discard(ag_id)
+                if not ids:
+                    del indice[chave]
+
+    def _guardar(self, registro):
+        self._remover(registro.id)
+        self._por_id[registro.id] = registro
+        for indice, chave in self._indices(registro):
+            indice.setdefault(chave, set()).add(registro.id)
+
+    def _aplicar(self, evento, linha):
+        ag_id = str(linha["id"])
+        if evento == "excluir":
+            self._remover(ag_id)
+            return
+        anterior = self._por_id.get(ag_id)
+        if anterior is not None:
+            linha = {**anterior.como_dict(), **linha}
+        registro = Registro(linha)
+        if registro.status == "cancelado" or (self._desde and registro.data < self._desde):
+            self._remover(ag_id)
+        else:
+            self._guardar(registro)
+
+    def ao_alterar(self, evento, ag):
+        """Ouvinte do repositório (e do Realtime): aplica inserção, edição e exclusão."""
+        if self._durante_carga is not None:
+            self._durante_carga.append((evento, ag))
+        self._aplicar(evento, ag)
+
+    def _ao_realtime(self, payload):
+        dados  = payload.get("data", payload)
+        tipo   = (dados.get("type") or dados.get("eventType") or "").upper()
+        linha  = dados.get("record") or dados.get("new") or {}
+        antiga = dados.get("old_record") or dados.get("old") or {}
+        try:
+            if tipo == "DELETE" and antiga.get("id"):
+                self.ao_alterar("excluir", antiga)
+            elif tipo in ("INSERT", "UPDATE") and linha.get("id"):
+                self.ao_alterar("inserir" if tipo == "INSERT" else "atualizar", linha)
+        except Exception as e:
+            logger.warning(f"Evento Realtime ignorado ({tipo}): {e}")
+
+    def _ao_reconectar(self):
+        """O canal voltou: eventos da queda se perderam, então confere já em vez de esperar o ciclo."""
+        if self._reconferir is None or self._reconferir.done():
+            self._reconferir = asyncio.create_task(self._conferir_agora())
+
+    async def _conferir_agora(self):
+        try:
+            await (self.conferir() if self.pronta else self.carregar())
+        except Exception as e:
+            logger.warning(f"Falha ao conferir a réplica após reconectar: {e}")
+
+    async def carregar(self):
+        """Relê todos os ativos numa consulta, reaplicando os eventos que chegaram no meio."""
+        desde = date.today().isoformat()
+        self._durante_carga = []
+        try:
+            linhas = await self._repo.ativos(desde, COLUNAS_REPLICA)
+        except Exception:
+            self._durante_carga = None
+            raise
+        eventos, self._durante_carga = self._durante_carga, None
+        self._desde = desde
+        self._por_id.clear()
+        self._por_data.clear()
+        self._por_status.clear()
+        self._por_tg.clear()
+        for linha in linhas:
+            self._guardar(Registro(linha))
+        for evento, ag in eventos:
+            self._aplicar(evento, ag)
+        self.pronta = True
+        self.conferida_em = time.time()
+        logger.info(f"Réplica: {len(self._por_id)} agendamentos ativos carregados")
+
+    def soma(self):
+        linhas = sorted(self._por_id.values(), key=lambda r: r.id)
+        return len(linhas), hashlib.md5("\n".join(r.assinatura() for r in linhas).encode()).hexdigest()
+
+    async def conferir(self):
+        """Compara a soma local com a do banco e recarrega se houver divergência."""
+        if date.today().isoformat() != self._desde:
+            await self.carregar()   # virou o dia: os de ontem saem da réplica
+            return
+        remoto = await self._repo.checksum_ativos(self._desde)
+        total, md5 = self.soma()
+        if (remoto["total"], remoto["md5"]) != (total, md5):
+            logger.warning(f"Réplica divergente ({total} local × {remoto['total']} no banco); recarregando")
+            await self.carregar()
+        else:
+            self.conferida_em = time.time()
+
+    # ─── Ciclo de vida ────────────────────────────────────────────────
+
+    async def iniciar(self):
+        try:
+            self._canal = await self._repo.assinar_alteracoes(self._ao_realtime, self._ao_reconectar)
+            if self._canal is None:
+                logger.warning("Réplica sem Realtime (pacote websockets ausente): só conferência periódica")
+        except Exception as e:
+            logger.warning(f"Realtime indisponível, réplica só por conferência periódica: {e}")
+        try:
+            await self.carregar()
+        except Exception as e:
+            logger.error(f"Falha ao carregar a réplica (telas leem do banco): {e}")
+        self._tarefa = asyncio.create_task(self._laco())
+
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            self._tarefa = None
+        if self._reconferir:
+            self._reconferir.cancel()
+
+    async def _laco(self):
+        while True:
+            await asyncio.sleep(self._intervalo)
+            try:
+                if self.pronta:
+                    await self.conferir()
+                else:
+                    await self.carregar()
+            except Exception as e:
+                logger.warning(f"Falha ao conferir a réplica: {e}")
@@ -0,0 +1,526 @@
+"""Camada de acesso assíncrona à tabela `agendamentos` do Supabase.
+
+Nenhuma chamada HTTP roda dentro do event loop do bot: usamos o cliente
+assíncrono do Supabase quando disponível e, como alternativa, o cliente
+síncrono num pool de threads limitado. Em ambos os casos um único cliente
+(e a sua sessão HTTP) é reutilizado por todas as consultas.
+"""
+import asyncio
+import logging
+import secrets
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from postgrest.exceptions import APIError
+from supabase import create_client
+
+try:
+    from supabase import acreate_client
+except ImportError:  # versões antigas do supabase-py não têm cliente assíncrono
+    acreate_client = None
+
+try:
+    from tempo_real import CanalRealtime
+except ImportError:  # sem o pacote websockets a réplica fica só na conferência periódica
+    CanalRealtime = None
+
+logger = logging.getLogger(__name__)
+
+TABELA = "agendamentos"
+
+VIOLACAO_UNICIDADE = "23505"
+VIOLACAO_EXCLUSAO  = "23P01"   # agendamentos_sem_sobreposicao
+
+# Colunas usadas nas listagens (o necessário para `fmt_ag` e, offline, para avisar a cliente)
+COLUNAS_LISTAGEM = "id,codigo,nome,servico,data,horario,status,telegram_id"
+
+# Erros do PostgREST que querem dizer "o banco não está atendendo" (e não "recusou")
+PGRST_SEM_BANCO   = {"PGRST000", "PGRST001", "PGRST002", "PGRST003"}   # conexão / pool esgotado
+SQLSTATE_SEM_BANCO = ("08", "57P01", "57P02", "57P03", "53300")        # classe 08, desligando, lotado
+
+# Código curto exibido como 🆔: sem 0/O, 1/I/L para facilitar a digitação
+ALFABETO_CODIGO  = "23456789ABCDEFGHJKMNPQRSTUVWXYZ"
+TAMANHO_CODIGO   = 8
+TENTATIVAS_CODIGO = 5
+
+
+def gerar_codigo():
+    return "".join(secrets.choice(ALFABETO_CODIGO) for _ in range(TAMANHO_CODIGO))
+
+
+class HorarioOcupado(Exception):
+    """Já existe agendamento ativo para a mesma data e horário."""
+
+
+class CodigoDuplicado(Exception):
+    """O código curto sorteado já pertence a outro agendamento."""
+
+
+def falha_de_conexao(erro):
+    """True se o banco não chegou a atender: rede, timeout, gateway 5xx ou Postgres indisponível.
+
+    Com o Supabase fora do ar, o gateway responde 502/503/504 sem JSON e o
+    postgrest-py levanta `APIError` com o status HTTP como código; o
+    PostgREST sem conexão com o Postgres responde PGRST000–003. Uma recusa
+    de verdade (violação de restrição, coluna inexistente) não conta:
+    repetir a mesma escrita daria o mesmo resultado. Qualquer outra exceção
+    é defeito do bot, não queda, e também não conta.
+    """
+    if isinstance(erro, (httpx.TransportError, OSError)):   # OSError cobre ConnectionError e TimeoutError
+        return True
+    if not isinstance(erro, APIError):
+        return False
+    codigo = erro.code
+    if isinstance(codigo, int) or (isinstance(codigo, str) and codigo.isdigit() and len(codigo) == 3):
+        return int(codigo) >= 500
+    return codigo in PGRST_SEM_BANCO or str(codigo or "").startswith(SQLSTATE_SEM_BANCO)
+
+
+class RepositorioAgendamentos:
+    """Operações assíncronas sobre `agendamentos`."""
+
+    def __init__(self, url, key, max_threads=8):
+        self._url         = url
+        self._key         = key
+        self._max_threads = max_threads
+        self._cliente     = None
+        self._executor    = None
+        self._ouvintes    = []
+        self._medidores   = []
+        self._canais      = []
+
+    # ─── Conexão ──────────────────────────────────────────────────────
+
+    async def conectar(self):
+        if self._cliente is not None:
+            return
+        if acreate_client is not None:
+            self._cliente = await acreate_client(self._url, self._key)
+            logger.info("Supabase: cliente assíncrono ativo")
+        else:
+            self._cliente  = create_client(self._url, self._key)
+            self._executor = ThreadPoolExecutor(max_workers=self._max_threads, thread_name_prefix="supabase")
+            logger.info(f"Supabase: cliente síncrono em pool de {self._max_threads} threads")
+
+    async def fechar(self):
+        for canal in self._canais:
+            await canal.parar()
+        self._canais.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        elif self._cliente is not None:
+            try:
+                await self._cliente.postgrest.aclose()
+            except Exception as e:
+                logger.warning(f"Erro ao fechar cliente Supabase: {e}")
+        self._cliente = None
+
+    async def assinar_alteracoes(self, callback, ao_reconectar=None):
+        """Assina as mudanças de `agendamentos` pelo Realtime; devolve o canal, ou None sem `websockets`.
+
+        `callback(payload)` recebe o evento do Postgres (INSERT/UPDATE/DELETE);
+        `ao_reconectar()` é chamado quando o canal volta depois de uma queda.
+        """
+        if CanalRealtime is None:
+            return None
+        canal = CanalRealtime(self._url, self._key, TABELA, callback, ao_reconectar)
+        await canal.iniciar()
+        self._canais.append(canal)
+        return canal
+
+    def _tabela(self, nome=TABELA):
+        if self._cliente is None:
+            raise RuntimeError("Repositório não conectado")
+        return self._cliente.table(nome)
+
+    def _rpc(self, funcao, params):
+        if self._cliente is None:
+            raise RuntimeError("Repositório não conectado")
+        return self._cliente.rpc(funcao, params)
+
+    async def _executar(self, consulta, operacao):
+        """Envia a requisição; `operacao` (o método público que a fez) rotula as métricas."""
+        if not self._medidores:
+            return await self._enviar(consulta)
+        inicio = time.perf_counter()
+        try:
+            res = await self._enviar(consulta)
+        except Exception:
+            self._medir(operacao, time.perf_counter() - inicio, 0, True)
+            raise
+        linhas = len(res.data) if isinstance(res.data, list) else 0
+        self._medir(operacao, time.perf_counter() - inicio, linhas, False)
+        return res
+
+    async def _enviar(self, consulta):
+        if self._executor is None:
+            return await consulta.execute()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, consulta.execute)
+
+    # ─── Ouvintes ─────────────────────────────────────────────────────
+
+    def ao_alterar(self, ouvinte):
+        """Registra `ouvinte(evento, ag)`, chamado após cada escrita bem-sucedida.
+
+        `evento` é "inserir", "atualizar" ou "excluir" e `ag` é a linha
+        devolvida pelo banco (estado novo, ou o removido no caso de exclusão).
+        """
+        self._ouvintes.append(ouvinte)
+
+    def ao_consultar(self, medidor):
+        """Registra `medidor(operacao, segundos, linhas, erro)`, chamado após cada requisição."""
+        self._medidores.append(medidor)
+
+    def _medir(self, operacao, segundos, linhas, erro):
+        for medidor in self._medidores:
+            try:
+                medidor(operacao, segundos, linhas, erro)
+            except Exception as e:
+                logger.warning(f"Medidor {medidor!r} falhou: {e}")
+
+    def registrar_local(self, evento, ag):
+        """Avisa os ouvintes de uma escrita aceita fora do banco (diário offline)."""
+        self._notificar(evento, ag)
+
+    def _notificar(self, evento, ag):
+        if not ag:
+            return
+        for ouvinte in self._ouvintes:
+            try:
+                ouvinte(evento, ag)
+            except Exception as e:
+                logger.warning(f"Ouvinte {ouvinte!r} falhou em {evento}: {e}")
+
+    # ─── Escrita ──────────────────────────────────────────────────────
+
+    async def _escrever(self, consulta, operacao):
+        try:
+            return await self._executar(consulta, operacao)
+        except APIError as e:
+            if e.code == VIOLACAO_EXCLUSAO:
+                raise HorarioOcupado(e.message) from e
+            if e.code == VIOLACAO_UNICIDADE:
+                if "codigo" in (e.message or ""):
+                    raise CodigoDuplicado(e.message) from e
+                raise HorarioOcupado(e.message) from e
+            raise
+
+    async def inserir(self, dados, idempotente=False):
+        """Insere o agendamento com um código curto novo.
+
+        O `id` (UUID) é gerado aqui quando não vem em `dados`, então quem
+        chama já o conhece antes da resposta. Com `idempotente`, um `id`
+        já gravado é ignorado e a linha existente é devolvida (reaplicação
+        do diário). Levanta `HorarioOcupado` se o horário já foi reservado;
+        colisões do código são resolvidas sorteando outro.
+        """
+        dados  = {"id": str(uuid.uuid4()), **dados}
+        codigo = dados.pop("codigo", None) or gerar_codigo()
+        for tentativa in range(TENTATIVAS_CODIGO):
+            linha = {**dados, "codigo": codigo}
+            consulta = (
+                self._tabela().upsert(linha, on_conflict="id", ignore_duplicates=True) if idempotente
+                else self._tabela().insert(linha)
+            )
+            try:
+                res = await self._escrever(consulta, "inserir")
+                break
+            except CodigoDuplicado:
+                logger.warning(f"Colisão de código curto (tentativa {tentativa + 1})")
+                codigo = gerar_codigo()
+        else:
+            raise RuntimeError("Não foi possível gerar um código único")
+        if not res.data and idempotente:
+            return await self.obter(dados["id"])
+        ag  = res.data[0] if res.data else None
+        self._notificar("inserir", ag)
+        return ag
+
+    async def atualizar(self, ag_id, campos):
+        res = await self._escrever(self._tabela().update(campos).eq("id", ag_id), "atualizar")
+        ag  = res.data[0] if res.data else None
+        self._notificar("atualizar", ag)
+        return ag
+
+    async def excluir(self, ag_id):
+        """Remove o agendamento e devolve a linha excluída (uma só ida ao banco)."""
+        res = await self._executar(self._tabela().delete().eq("id", ag_id), "excluir")
+        ag  = res.data[0] if res.data else None
+        self._notificar("excluir", ag)
+        return ag
+
+    async def atualizar_status_lote(self, ids, status):
+        """`UPDATE ... WHERE id IN (...)` numa única requisição; devolve as linhas alteradas."""
+        if not ids:
+            return []
+        consulta = self._tabela().update({"status": status}).in_("id", list(ids))
+        res = await self._escrever(consulta, "atualizar_status_lote")
+        for ag in res.data or []:
+            self._notificar("atualizar", ag)
+        return res.data or []
+
+    async def excluir_lote(self, ids):
+        """`DELETE ... WHERE id IN (...) RETURNING *` numa única requisição."""
+        if not ids:
+            return []
+        res = await self._executar(self._tabela().delete().in_("id", list(ids)), "excluir_lote")
+        for ag in res.data or []:
+            self._notificar("excluir", ag)
+        return res.data or []
+
+    async def atualizar_do_cliente(self, ag_id, telegram_id, campos):
+        """Como `atualizar`, mas só altera agendamento ativo da própria cliente."""
+        consulta = (
+            self._tabela().update(campos)
+            .eq("id", ag_id).eq("telegram_id", str(telegram_id)).neq("status", "cancelado")
+        )
+        res = await self._escrever(consulta, "atualizar_do_cliente")
+        ag  = res.data[0] if res.data else None
+        self._notificar("atualizar", ag)
+        return ag
+
+    async def reservar_lembrete(self, ag_id, coluna, agora):
+        """Marca o lembrete como enviado só se ainda não estava; devolve a linha ou None.
+
+        Quem recebe a linha é o único autorizado a enviar o lembrete.
+        """
+        consulta = (
+            self._tabela().update({coluna: agora})
+            .eq("id", ag_id).eq("status", "confirmado").is_(coluna, "null")
+        )
+        res = await self._executar(consulta, "reservar_lembrete")
+        ag  = res.data[0] if res.data else None
+        self._notificar("atualizar", ag)
+        return ag
+
+    # ─── Leitura ──────────────────────────────────────────────────────
+
+    async def pagina(self, apos=None, antes=None, limite=10):
+        """Página por keyset em (data, horario, id).
+
+        `apos`/`antes` são a chave (data, horario, id) da última/primeira
+        linha da página atual. Devolve `(linhas, tem_mais)`, sempre em ordem
+        crescente; `tem_mais` indica se há linhas além da página na direção
+        pedida.
+        """
+        consulta = self._tabela().select(COLUNAS_LISTAGEM)
+        chave, op = (apos, "gt") if antes is None else (antes, "lt")
+        if chave:
+            d, h, i = chave
+            consulta = consulta.or_(
+                f'data.{op}."{d}",'
+                f'and(data.eq."{d}",horario.{op}."{h}"),'
+                f'and(data.eq."{d}",horario.eq."{h}",id.{op}.{i})'
+            )
+        desc = antes is not None
+        for coluna in ("data", "horario", "id"):
+            consulta = consulta.order(coluna, desc=desc)
+        linhas = (await self._executar(consulta.limit(limite + 1), "pagina")).data
+        tem_mais = len(linhas) > limite
+        linhas = linhas[:limite]
+        if desc:
+            linhas.reverse()
+        return linhas, tem_mais
+
+    async def listar_por_data(self, data):
+        consulta = self._tabela().select("*").eq("data", data).order("horario")
+        return (await self._executar(consulta, "listar_por_data")).data
+
+    async def listar_por_status(self, *status, desde=None):
+        consulta = self._tabela().select("*").in_("status", list(status))
+        if desde:
+            consulta = consulta.gte("data", desde)
+        consulta = consulta.order("data").order("horario")
+        return (await self._executar(consulta, "listar_por_status")).data
+
+    async def ocupacao(self, inicio, fim):
+        """Intervalos (início, duração, profissional) não cancelados entre `inicio` e `fim` (inclusive), numa única consulta."""
+        consulta = (
+            self._tabela().select("id,data,horario,profissional_id,duracao_min")
+            .gte("data", inicio).lte("data", fim).neq("status", "cancelado")
+        )
+        return (await self._executar(consulta, "ocupacao")).data
+
+    async def confirmados_futuros(self, desde):
+        consulta = (
+            self._tabela()
+            .select("id,nome,servico,data,horario,status,telegram_id,lembrete_24h_em,lembrete_2h_em")
+            .eq("status", "confirmado").gte("data", desde).not_.is_("telegram_id", "null")
+        )
+        return (await self._executar(consulta, "confirmados_futuros")).data
+
+    async def obter(self, ag_id):
+        res = await self._executar(self._tabela().select("*").eq("id", ag_id), "obter")
+        return res.data[0] if res.data else None
+
+    async def obter_por_codigo(self, codigo):
+        consulta = self._tabela().select("*").eq("codigo", codigo.upper())
+        res = await self._executar(consulta, "obter_por_codigo")
+        return res.data[0] if res.data else None
+
+    async def buscar_por_codigo(self, prefixo, limite=6):
+        """Agendamentos cujo código começa com `prefixo` (sondagem no índice de `codigo`).
+
+        Um código completo vira uma igualdade; prefixos usam o mesmo índice
+        (`text_pattern_ops`) como intervalo.
+        """
+        prefixo = "".join(c for c in prefixo if c.isalnum()).upper()
+        if not prefixo:
+            return []
+        if len(prefixo) >= TAMANHO_CODIGO:
+            ag = await self.obter_por_codigo(prefixo[:TAMANHO_CODIGO])
+            return [ag] if ag else []
+        consulta = (
+            self._tabela().select("*").like("codigo", f"{prefixo}%")
+            .order("codigo").limit(limite)
+        )
+        return (await self._executar(consulta, "buscar_por_codigo")).data
+
+    async def estatisticas(self, hoje):
+        """Todos os contadores do painel numa única chamada (função SQL `estatisticas_agendamentos`)."""
+        res = await self._executar(self._rpc("estatisticas_agendamentos", {"hoje": hoje}), "estatisticas")
+        return res.data
+
+    # ─── Clientes ─────────────────────────────────────────────────────
+
+    async def obter_cliente(self, telegram_id):
+        """Busca pela chave primária de `clientes`; None se a cliente ainda não agendou."""
+        consulta = self._tabela("clientes").select("telegram_id,nome").eq("telegram_id", str(telegram_id)).limit(1)
+        res = await self._executar(consulta, "obter_cliente")
+        return res.data[0] if res.data else None
+
+    async def ativos(self, desde, colunas="*"):
+        """Todos os agendamentos não cancelados de `desde` em diante (carga da réplica)."""
+        consulta = self._tabela().select(colunas).gte("data", desde).neq("status", "cancelado")
+        return (await self._executar(consulta, "ativos")).data
+
+    async def checksum_ativos(self, desde):
+        """`{"total", "md5"}` dos ativos, calculado no banco (função `agendamentos_ativos_checksum`)."""
+        res = await self._executar(self._rpc("agendamentos_ativos_checksum", {"desde": desde}), "checksum_ativos")
+        return res.data
+
+    async def do_cliente(self, telegram_id, desde):
+        """Próximos agendamentos ativos da cliente (sonda em idx_agendamentos_cliente)."""
+        consulta = (
+            self._tabela().select(COLUNAS_LISTAGEM)
+            .eq("telegram_id", str(telegram_id)).gte("data", desde).neq("status", "cancelado")
+            .order("data").order("horario")
+        )
+        return (await self._executar(consulta, "do_cliente")).data
+
+    async def clientes_recentes(self, limite=30):
+        consulta = (
+            self._tabela("clientes").select("telegram_id,nome")
+            .order("ultimo_agendamento_em", desc=True).limit(limite)
+        )
+        return (await self._executar(consulta, "clientes_recentes")).data
+
+    # ─── Difusão ──────────────────────────────────────────────────────
+
+    async def clientes_segmento(self, segmento, servico=None, inicio=None, fim=None):
+        """`SELECT DISTINCT telegram_id` do segmento, resolvido no banco."""
+        res = await self._executar(self._rpc("clientes_segmento", {
+            "segmento": segmento, "servico_alvo": servico, "inicio": inicio, "fim": fim,
+        }), "clientes_segmento")
+        return [linha["telegram_id"] for linha in res.data or []]
+
+    async def registrar_difusao(self, relatorio):
+        await self._executar(self._tabela("difusoes").insert(relatorio), "registrar_difusao")
+
+    # ─── Catálogo (servicos / horarios) ───────────────────────────────
+
+    async def versao_catalogo(self):
+        res = await self._executar(self._tabela("catalogo_versao").select("versao").limit(1), "versao_catalogo")
+        return res.data[0]["versao"] if res.data else 0
+
+    async def catalogo(self):
+        """Versão, serviços ativos, modelos de horário e profissionais ativas com expediente, em paralelo."""
+        versao, servicos, horarios, profissionais, expedientes = await asyncio.gather(
+            self.versao_catalogo(),
+            self._executar(self._tabela("servicos").select("nome,duracao_min,preco").eq("ativo", True), "catalogo"),
+            self._executar(self._tabela("horarios").select("id,horario,dia_semana"), "catalogo"),
+            self._executar(self._tabela("profissionais").select("id,nome").eq("ativo", True), "catalogo"),
+            self._executar(self._tabela("expedientes").select("profissional_id,dia_semana,inicio,fim"), "catalogo"),
+        )
+        return versao, servicos.data, horarios.data, profissionais.data, expedientes.data
+
+    async def inserir_servico(self, dados):
+        await self._executar(self._tabela("servicos").upsert({**dados, "ativo": True}), "inserir_servico")
+
+    async def remover_servico(self, nome):
+        # Desativa em vez de apagar: agendamentos antigos continuam citando o serviço
+        await self._executar(self._tabela("servicos").update({"ativo": False}).eq("nome", nome), "remover_servico")
+
+    async def inserir_horario(self, dados):
+        await self._executar(self._tabela("horarios").insert(dados), "inserir_horario")
+
+    async def remover_horario(self, horario_id):
+        await self._executar(self._tabela("horarios").delete().eq("id", horario_id), "remover_horario")
+
+    # ─── Histórico (historico.py) ─────────────────────────────────────
+
+    async def exportar_pagina(self, tabela, inicio, fim, apos=None, limite=500, colunas="*"):
+        """Página em ordem (data, horario, id) entre `inicio` e `fim`, continuando após a chave `apos`."""
+        consulta = self._tabela(tabela).select(colunas).gte("data", inicio).lte("data", fim)
+        if apos:
+            d, h, i = apos
+            consulta = consulta.or_(
+                f'data.gt."{d}",'
+                f'and(data.eq."{d}",horario.gt."{h}"),'
+                f'and(data.eq."{d}",horario.eq."{h}",id.gt.{i})'
+            )
+        for coluna in ("data", "horario", "id"):
+            consulta = consulta.order(coluna)
+        return (await self._executar(consulta.limit(limite), "exportar_pagina")).data
+
+    async def arquivar_agendamentos(self, antes, lote=1000):
+        """Move até `lote` agendamentos anteriores a `antes` para o arquivo; devolve quantos."""
+        res = await self._executar(
+            self._rpc("arquivar_agendamentos", {"antes": antes, "lote": lote}), "arquivar_agendamentos")
+        return res.data or 0
+
+    # ─── Lista de espera ──────────────────────────────────────────────
+
+    async def espera_aguardando(self, desde):
+        consulta = (
+            self._tabela("lista_espera").select("id,telegram_id,nome,servico,data,de,ate")
+            .eq("status", "aguardando").gte("data", desde).order("id")
+        )
+        return (await self._executar(consulta, "espera_aguardando")).data
+
+    async def espera_inserir(self, dados):
+        res = await self._executar(self._tabela("lista_espera").insert(dados), "espera_inserir")
+        return res.data[0]
+
+    async def espera_atualizar(self, espera_id, status):
+        consulta = self._tabela("lista_espera").update({"status": status}).eq("id", espera_id)
+        await self._executar(consulta, "espera_atualizar")
+
+    # ─── Estado do bot (persistencia.PersistenciaSupabase) ────────────
+
+    async def estado_carregar(self):
+        usuarios, conversas = await asyncio.gather(
+            self._executar(self._tabela("bot_usuarios").select("user_id,dados"), "estado_carregar"),
+            self._executar(self._tabela("bot_conversas").select("nome,chave,estado"), "estado_carregar"),
+        )
+        return usuarios.data, conversas.data
+
+    async def estado_do_usuario(self, user_id):
+        """`(linha de bot_usuarios ou None, [linhas de bot_conversas])` de um usuário, numa ida ao banco."""
+        usuario, conversas = await asyncio.gather(
+            self._executar(self._tabela("bot_usuarios").select("dados").eq("user_id", user_id), "estado_do_usuario"),
+            self._executar(self._tabela("bot_conversas").select("nome,chave,estado").eq("user_id", user_id),
+                           "estado_do_usuario"),
+        )
+        return (usuario.data[0] if usuario.data else None), conversas.data
+
+    async def estado_gravar(self, usuarios, usuarios_apagar, conversas, conversas_apagar):
+        """Grava um lote de estado numa única transação (função SQL `bot_estado_gravar`)."""
+        await self._executar(self._rpc("bot_estado_gravar", {
+            "usuarios": usuarios, "usuarios_apagar": usuarios_apagar,
+            "conversas": conversas, "conversas_apagar": conversas_apagar,
+        }), "estado_gravar")
@@ -0,0 +1,149 @@
+"""Roteamento dos botões (callback_data) dos painéis Admin e TI.
+
+Cada tela se registra com `@rotas.rota("op", papeis, payload)`. O botão
+carrega só `op` ou `op:<payload compacto>` (`rotas.dados(op, payload)`):
+ids viram base 62 e dados do catálogo levam a versão do catálogo, então
+um botão de uma mensagem antiga é recusado em vez de agir na linha
+errada. A busca percorre uma trie caractere a caractere, então o custo
+depende do tamanho do `callback_data` e não da quantidade de telas: a
+rota exata vence e, se não houver, vale o prefixo mais longo. O payload
+vira um objeto tipado (`payload.de(resto)`) antes de chegar à tela, que
+recebe `(query, context, uid, payload)` e devolve o próximo estado.
+Telas da cliente usam `papeis=TODOS`: qualquer usuário pode tocar.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+LIMITE_CALLBACK = 64    # bytes aceitos pelo Telegram em callback_data
+SEPARADOR       = ":"
+ALFABETO_62     = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_VALOR_62       = {c: i for i, c in enumerate(ALFABETO_62)}
+TODOS           = None  # `papeis` de uma rota aberta a qualquer usuário
+
+
+def para_base62(n):
+    if n < 0:
+        raise ValueError("base 62 só para inteiros não negativos")
+    digitos = []
+    while True:
+        n, r = divmod(n, 62)
+        digitos.append(ALFABETO_62[r])
+        if not n:
+            return "".join(reversed(digitos))
+
+
+def de_base62(s):
+    if not s:
+        raise ValueError("vazio")
+    n = 0
+    for c in s:
+        n = n * 62 + _VALOR_62[c]   # KeyError se houver caractere fora do alfabeto
+    return n
+
+
+class PayloadInvalido(ValueError):
+    """O resto do callback_data não tem o formato esperado pela rota."""
+
+
+@dataclass(frozen=True)
+class Rota:
+    chave: str
+    tela: Callable
+    papeis: Optional[frozenset]      # TODOS = qualquer usuário
+    payload: Optional[Any] = None    # classe com `de(resto)`; None = sem payload
+    exata: bool = True
+
+
+class _No:
+    __slots__ = ("filhos", "exata", "prefixo")
+
+    def __init__(self):
+        self.filhos  = {}
+        self.exata   = None
+        self.prefixo = None
+
+
+class Roteador:
+    """Trie de rotas com checagem de papel e conversão do payload."""
+
+    def __init__(self, estado_padrao, estado_negado):
+        self._raiz          = _No()
+        self._conhecidos    = set()          # todos os usuários com algum papel
+        self._publico       = False          # há alguma rota TODOS
+        self._estado_padrao = estado_padrao
+        self._estado_negado = estado_negado
+
+    def rota(self, op, papeis, payload=None):
+        """Decorador. Com `payload`, a rota casa `op:<resto>`; sem, só `op` exato."""
+        def registrar(tela):
+            grupo = TODOS if papeis is TODOS else frozenset(papeis)
+            if payload is None:
+                self.adicionar(Rota(op, tela, grupo))
+            else:
+                self.adicionar(Rota(op + SEPARADOR, tela, grupo, payload, exata=False))
+            return tela
+        return registrar
+
+    @staticmethod
+    def dados(op, payload=None):
+        """callback_data do botão: `op` ou `op:<payload.para()>`."""
+        data = op if payload is None else f"{op}{SEPARADOR}{payload.para()}"
+        if len(data.encode()) > LIMITE_CALLBACK:
+            raise ValueError(f"callback_data com mais de {LIMITE_CALLBACK} bytes: {data!r}")
+        return data
+
+    def adicionar(self, rota):
+        no = self._raiz
+        for c in rota.chave:
+            no = no.filhos.setdefault(c, _No())
+        campo = "exata" if rota.exata else "prefixo"
+        if getattr(no, campo) is not None:
+            raise ValueError(f"Rota duplicada: {rota.chave}")
+        setattr(no, campo, rota)
+        if rota.papeis is TODOS:
+            self._publico = True
+        else:
+            self._conhecidos |= rota.papeis
+
+    def resolver(self, data):
+        """Devolve `(rota, resto)`, ou `(None, None)` se nada casar."""
+        no, achado = self._raiz, (None, None)
+        for i, c in enumerate(data):
+            if no.prefixo is not None:
+                achado = (no.prefixo, data[i:])
+            no = no.filhos.get(c)
+            if no is None:
+                return achado
+        if no.exata is not None:
+            return no.exata, ""
+        if no.prefixo is not None:
+            return no.prefixo, ""
+        return achado
+
+    async def despachar(self, update, context):
+        query = update.callback_query
+        uid   = query.from_user.id
+        data  = query.data or ""
+        rota, resto = self.resolver(data)
+
+        if rota is not None:
+            negado = rota.papeis is not TODOS and uid not in rota.papeis
+        else:   # botão sem rota: quem poderia ter recebido um botão daqui ouve que ele está velho
+            negado = not self._publico and uid not in self._conhecidos
+        if negado:
+            await query.answer("Acesso negado.", show_alert=True)
+            return self._estado_negado
+        try:
+            if rota is None:
+                raise PayloadInvalido("sem rota (formato antigo?)")
+            payload = rota.payload.de(resto) if rota.payload is not None else None
+        except (ValueError, KeyError) as e:
+            logger.info(f"Botão desatualizado {data!r}: {e}")
+            await query.answer("Botão desatualizado — abra o menu de novo.", show_alert=True)
+            return self._estado_padrao
+
+        await query.answer()
+        return await rota.tela(query, context, uid, payload)
@@ -11,22 +11,418 @@ CREATE TABLE IF NOT EXISTS agendamentos (
     id         UUID        PRIMARY KEY DEFAULT uuid_generate_v4(),
     nome       TEXT        NOT NULL,
     servico    TEXT        NOT NULL,
-    data       TEXT        NOT NULL,      -- formato: DD/MM/AAAA
-    horario    TEXT        NOT NULL,      -- formato: HH:MM
+    data       DATE        NOT NULL,
+    horario    TIME        NOT NULL,
+    codigo     TEXT,                      -- código curto exibido como 🆔
+    telegram_id TEXT,
+    status     TEXT        NOT NULL DEFAULT 'pendente',  -- pendente | confirmado | cancelado
+    lembrete_24h_em TIMESTAMPTZ,          -- quando o lembrete de 24h foi enviado
+    lembrete_2h_em  TIMESTAMPTZ,          -- quando o lembrete de 2h foi enviado
     criado_em  TIMESTAMPTZ DEFAULT NOW()
 );
 
--- Índice para buscas por data
-CREATE INDEX IF NOT EXISTS idx_agendamentos_data ON agendamentos(data);
+-- Colunas adicionadas depois da primeira versão (bancos já existentes)
+ALTER TABLE agendamentos ADD COLUMN IF NOT EXISTS telegram_id TEXT;
+ALTER TABLE agendamentos ADD COLUMN IF NOT EXISTS status TEXT NOT NULL DEFAULT 'pendente';
+ALTER TABLE agendamentos ADD COLUMN IF NOT EXISTS codigo TEXT;
+ALTER TABLE agendamentos ADD COLUMN IF NOT EXISTS lembrete_24h_em TIMESTAMPTZ;
+ALTER TABLE agendamentos ADD COLUMN IF NOT EXISTS lembrete_2h_em  TIMESTAMPTZ;
+
+-- Linhas antigas recebem como código os 8 primeiros caracteres do UUID,
+-- que é o que o bot já exibia como 🆔
+UPDATE agendamentos SET codigo = upper(left(id::text, 8)) WHERE codigo IS NULL;
+
+-- Índice composto (data, horario, id): filtros por intervalo de datas
+-- ("hoje", "próximos dias") e paginação por keyset das listagens
+CREATE INDEX IF NOT EXISTS idx_agendamentos_keyset ON agendamentos(data, horario, id);
+
+-- Busca do TI por código: igualdade e prefixo (LIKE 'AB%') no mesmo índice
+CREATE UNIQUE INDEX IF NOT EXISTS uq_agendamentos_codigo ON agendamentos(codigo text_pattern_ops);
+
+-- Carga dos lembretes na inicialização: só confirmados, por data
+CREATE INDEX IF NOT EXISTS idx_agendamentos_confirmados ON agendamentos(data) WHERE status = 'confirmado';
+
+-- Impede dois agendamentos ativos no mesmo horário (reserva atômica no INSERT).
+-- Em bancos com duplicidades antigas, cancele-as antes de criar o índice.
+-- Depois que existir a restrição por intervalo (agendamentos_sem_sobreposicao,
+-- mais abaixo), ela substitui este índice.
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'agendamentos_sem_sobreposicao') THEN
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_agendamentos_horario_ativo
+            ON agendamentos(data, horario) WHERE status <> 'cancelado';
+    END IF;
+END $$;
+
+-- ─── Clientes ─────────────────────────────────────────────────────
+-- Uma linha por cliente do Telegram; o agendamento referencia a cliente
+CREATE TABLE IF NOT EXISTS clientes (
+    telegram_id           TEXT        PRIMARY KEY,
+    nome                  TEXT        NOT NULL,
+    ultimo_agendamento_em TIMESTAMPTZ DEFAULT NOW(),
+    criado_em             TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Clientes que já tinham agendamento (nome do mais recente)
+INSERT INTO clientes (telegram_id, nome, ultimo_agendamento_em)
+    SELECT DISTINCT ON (telegram_id) telegram_id, nome, criado_em
+    FROM agendamentos WHERE telegram_id IS NOT NULL
+    ORDER BY telegram_id, criado_em DESC
+ON CONFLICT (telegram_id) DO NOTHING;
+
+-- Cada agendamento com telegram_id cria ou atualiza a cliente antes da checagem da FK,
+-- então o INSERT do bot continua sendo uma única ida ao banco
+CREATE OR REPLACE FUNCTION agendamentos_garante_cliente()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.telegram_id IS NOT NULL THEN
+        INSERT INTO clientes (telegram_id, nome) VALUES (NEW.telegram_id, NEW.nome)
+        ON CONFLICT (telegram_id) DO UPDATE
+            SET nome = EXCLUDED.nome, ultimo_agendamento_em = NOW();
+    END IF;
+    RETURN NEW;
+END $$;
+
+DROP TRIGGER IF EXISTS trg_agendamentos_garante_cliente ON agendamentos;
+CREATE TRIGGER trg_agendamentos_garante_cliente
+    BEFORE INSERT OR UPDATE OF telegram_id ON agendamentos
+    FOR EACH ROW EXECUTE FUNCTION agendamentos_garante_cliente();
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'fk_agendamentos_cliente') THEN
+        ALTER TABLE agendamentos ADD CONSTRAINT fk_agendamentos_cliente
+            FOREIGN KEY (telegram_id) REFERENCES clientes(telegram_id)
+            ON UPDATE CASCADE ON DELETE SET NULL;
+    END IF;
+END $$;
+
+-- "Meus agendamentos" (telegram_id = ? AND data >= hoje) e a FK: uma sonda no índice
+CREATE INDEX IF NOT EXISTS idx_agendamentos_cliente ON agendamentos(telegram_id, data, horario);
+
+-- Lista de clientes recentes do painel (💬 Enviar msg a cliente)
+CREATE INDEX IF NOT EXISTS idx_clientes_recentes ON clientes(ultimo_agendamento_em DESC);
 
 -- Comentários nas colunas
 COMMENT ON TABLE  agendamentos          IS 'Agendamentos do Studio Dandara Britto via Telegram Bot';
 COMMENT ON COLUMN agendamentos.nome     IS 'Nome completo da cliente';
 COMMENT ON COLUMN agendamentos.servico  IS 'Serviço escolhido (Manicure, Pedicure, etc.)';
-COMMENT ON COLUMN agendamentos.data     IS 'Data do agendamento no formato DD/MM/AAAA';
-COMMENT ON COLUMN agendamentos.horario  IS 'Horário no formato HH:MM';
+COMMENT ON COLUMN agendamentos.data     IS 'Data do agendamento';
+COMMENT ON COLUMN agendamentos.horario  IS 'Horário de início do atendimento';
+COMMENT ON COLUMN agendamentos.codigo   IS 'Código curto (8 caracteres) para localizar o agendamento';
+COMMENT ON COLUMN agendamentos.telegram_id IS 'ID do Telegram da cliente, para notificações';
+COMMENT ON COLUMN agendamentos.status   IS 'pendente, confirmado ou cancelado';
+COMMENT ON COLUMN agendamentos.lembrete_24h_em IS 'Envio do lembrete de 24h (NULL = ainda não enviado)';
+COMMENT ON COLUMN agendamentos.lembrete_2h_em  IS 'Envio do lembrete de 2h (NULL = ainda não enviado)';
 COMMENT ON COLUMN agendamentos.criado_em IS 'Timestamp de criação do registro';
 
+-- ─── Catálogo: serviços e horários ──────────────────────────────────
+CREATE TABLE IF NOT EXISTS servicos (
+    nome        TEXT          PRIMARY KEY,
+    duracao_min INT           NOT NULL DEFAULT 60,
+    preco       NUMERIC(10,2),
+    ativo       BOOLEAN       NOT NULL DEFAULT TRUE,
+    criado_em   TIMESTAMPTZ   DEFAULT NOW()
+);
+
+-- Modelos de horário: dia_semana NULL vale para todos os dias; se houver
+-- linhas para um dia específico (1 = segunda … 7 = domingo), elas
+-- substituem a lista padrão naquele dia.
+CREATE TABLE IF NOT EXISTS horarios (
+    id          BIGSERIAL     PRIMARY KEY,
+    horario     TIME          NOT NULL,
+    dia_semana  SMALLINT      CHECK (dia_semana BETWEEN 1 AND 7),
+    UNIQUE NULLS NOT DISTINCT (horario, dia_semana)
+);
+
+-- Contador incrementado a cada alteração do catálogo; o bot só recarrega
+-- serviços/horários quando ele muda.
+CREATE TABLE IF NOT EXISTS catalogo_versao (
+    id      BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    versao  BIGINT  NOT NULL DEFAULT 0
+);
+INSERT INTO catalogo_versao (id, versao) VALUES (TRUE, 0) ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION catalogo_incrementa_versao()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE catalogo_versao SET versao = versao + 1;
+    RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS trg_servicos_versao ON servicos;
+CREATE TRIGGER trg_servicos_versao AFTER INSERT OR UPDATE OR DELETE ON servicos
+    FOR EACH STATEMENT EXECUTE FUNCTION catalogo_incrementa_versao();
+DROP TRIGGER IF EXISTS trg_horarios_versao ON horarios;
+CREATE TRIGGER trg_horarios_versao AFTER INSERT OR UPDATE OR DELETE ON horarios
+    FOR EACH STATEMENT EXECUTE FUNCTION catalogo_incrementa_versao();
+
+-- Catálogo inicial
+INSERT INTO servicos (nome) VALUES
+    ('Manicure'), ('Pedicure'), ('Alongamento'), ('Blindagem'), ('Nail Art')
+ON CONFLICT DO NOTHING;
+INSERT INTO horarios (horario) VALUES
+    ('09:00'), ('10:00'), ('11:00'), ('13:00'), ('14:00'), ('15:00'), ('16:00'), ('17:00')
+ON CONFLICT DO NOTHING;
+
+-- ─── Profissionais, expediente e duração ──────────────────────────
+-- Sem profissionais cadastradas o bot trata o estúdio como uma cadeira só,
+-- aberta o dia todo; com elas, cada serviço precisa caber inteiro (duracao_min
+-- do serviço) dentro do expediente de alguém e sem sobrepor outro agendamento.
+CREATE TABLE IF NOT EXISTS profissionais (
+    id          BIGSERIAL     PRIMARY KEY,
+    nome        TEXT          NOT NULL UNIQUE,
+    ativo       BOOLEAN       NOT NULL DEFAULT TRUE,
+    criado_em   TIMESTAMPTZ   DEFAULT NOW()
+);
+
+-- Turnos semanais (vários por dia, ex.: 09:00–12:00 e 13:00–18:00)
+CREATE TABLE IF NOT EXISTS expedientes (
+    id               BIGSERIAL PRIMARY KEY,
+    profissional_id  BIGINT    NOT NULL REFERENCES profissionais(id) ON DELETE CASCADE,
+    dia_semana       SMALLINT  NOT NULL CHECK (dia_semana BETWEEN 1 AND 7),
+    inicio           TIME      NOT NULL,
+    fim              TIME      NOT NULL CHECK (fim > inicio)
+);
+
+DROP TRIGGER IF EXISTS trg_profissionais_versao ON profissionais;
+CREATE TRIGGER trg_profissionais_versao AFTER INSERT OR UPDATE OR DELETE ON profissionais
+    FOR EACH STATEMENT EXECUTE FUNCTION catalogo_incrementa_versao();
+DROP TRIGGER IF EXISTS trg_expedientes_versao ON expedientes;
+CREATE TRIGGER trg_expedientes_versao AFTER INSERT OR UPDATE OR DELETE ON expedientes
+    FOR EACH STATEMENT EXECUTE FUNCTION catalogo_incrementa_versao();
+
+-- Cada agendamento guarda a duração do serviço no momento da reserva
+ALTER TABLE agendamentos ADD COLUMN IF NOT EXISTS duracao_min INT NOT NULL DEFAULT 60;
+ALTER TABLE agendamentos ADD COLUMN IF NOT EXISTS profissional_id BIGINT
+    REFERENCES profissionais(id) ON DELETE SET NULL;
+UPDATE agendamentos a SET duracao_min = s.duracao_min
+    FROM servicos s WHERE s.nome = a.servico AND a.duracao_min <> s.duracao_min;
+
+-- Reserva atômica por intervalo: dois agendamentos ativos da mesma
+-- profissional não se sobrepõem (substitui o índice único por data/horário).
+-- Se houver sobreposições antigas o banco só avisa; cancele-as e rode de novo.
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'agendamentos_sem_sobreposicao') THEN
+        ALTER TABLE agendamentos ADD CONSTRAINT agendamentos_sem_sobreposicao EXCLUDE USING gist (
+            (coalesce(profissional_id, 0)) WITH =,
+            tsrange(data + horario, data + horario + duracao_min * INTERVAL '1 minute') WITH &&
+        ) WHERE (status <> 'cancelado');
+    END IF;
+    DROP INDEX IF EXISTS uq_agendamentos_horario_ativo;
+EXCEPTION WHEN exclusion_violation THEN
+    RAISE NOTICE 'Há agendamentos sobrepostos; agendamentos_sem_sobreposicao não foi criada';
+END $$;
+
+-- ─── Estatísticas (uma única ida ao banco) ─────────────────────────
+-- Chamada pelo bot via RPC: supabase.rpc("estatisticas_agendamentos", {"hoje": "AAAA-MM-DD"})
+CREATE OR REPLACE FUNCTION estatisticas_agendamentos(hoje DATE)
+RETURNS JSONB
+LANGUAGE sql STABLE AS $$
+    WITH
+    totais AS (
+        SELECT
+            count(*)                                        AS total,
+            count(*) FILTER (WHERE status = 'pendente')     AS pendente,
+            count(*) FILTER (WHERE status = 'confirmado')   AS confirmado,
+            count(*) FILTER (WHERE status = 'cancelado')    AS cancelado,
+            count(*) FILTER (WHERE data = hoje)             AS hoje
+        FROM agendamentos
+    ),
+    por_servico AS (
+        SELECT servico, count(*) AS n
+        FROM agendamentos WHERE status <> 'cancelado'
+        GROUP BY servico
+    ),
+    por_dia_semana AS (
+        SELECT extract(isodow FROM data)::int AS dow, count(*) AS n
+        FROM agendamentos WHERE status <> 'cancelado'
+        GROUP BY 1
+    )
+    SELECT jsonb_build_object(
+        'total',          t.total,
+        'pendente',       t.pendente,
+        'confirmado',     t.confirmado,
+        'cancelado',      t.cancelado,
+        'hoje',           t.hoje,
+        'por_servico',    (SELECT coalesce(jsonb_object_agg(servico, n), '{}'::jsonb) FROM por_servico),
+        'por_dia_semana', (SELECT coalesce(jsonb_object_agg(dow, n), '{}'::jsonb) FROM por_dia_semana)
+    )
+    FROM totais t;
+$$;
+
+-- ─── Estado das conversas (PERSISTENCIA=supabase) ─────────────────
+CREATE TABLE IF NOT EXISTS bot_usuarios (
+    user_id        BIGINT      PRIMARY KEY,
+    dados          JSONB       NOT NULL,
+    atualizado_em  TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS bot_conversas (
+    nome           TEXT        NOT NULL,   -- nome do ConversationHandler
+    chave          TEXT        NOT NULL,   -- [chat_id, user_id] em JSON
+    user_id        BIGINT,                 -- último elemento da chave (releitura por usuário)
+    estado         JSONB       NOT NULL,
+    atualizado_em  TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (nome, chave)
+);
+
+-- Bancos criados antes da releitura por usuário
+ALTER TABLE bot_conversas ADD COLUMN IF NOT EXISTS user_id BIGINT;
+UPDATE bot_conversas SET user_id = (chave::jsonb ->> -1)::bigint WHERE user_id IS NULL;
+CREATE INDEX IF NOT EXISTS idx_bot_conversas_usuario ON bot_conversas (user_id);
+
+-- Um lote de mudanças de estado numa única transação
+CREATE OR REPLACE FUNCTION bot_estado_gravar(
+    usuarios JSONB, usuarios_apagar BIGINT[], conversas JSONB, conversas_apagar JSONB
+)
+RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO bot_usuarios (user_id, dados, atualizado_em)
+        SELECT (u->>'user_id')::bigint, u->'dados', NOW() FROM jsonb_array_elements(usuarios) u
+    ON CONFLICT (user_id) DO UPDATE SET dados = EXCLUDED.dados, atualizado_em = NOW();
+
+    DELETE FROM bot_usuarios WHERE user_id = ANY(usuarios_apagar);
+
+    INSERT INTO bot_conversas (nome, chave, user_id, estado, atualizado_em)
+        SELECT c->>'nome', c->>'chave', (c->>'user_id')::bigint, c->'estado', NOW()
+        FROM jsonb_array_elements(conversas) c
+    ON CONFLICT (nome, chave) DO UPDATE
+        SET user_id = EXCLUDED.user_id, estado = EXCLUDED.estado, atualizado_em = NOW();
+
+    DELETE FROM bot_conversas b
+     USING jsonb_array_elements(conversas_apagar) c
+     WHERE b.nome = c->>'nome' AND b.chave = c->>'chave';
+END $$;
+
+-- ─── Difusão (mensagem para um segmento de clientes) ──────────────
+-- Chamada pelo bot via RPC: supabase.rpc("clientes_segmento", {"segmento": "todos" | "semana" | "servico", ...})
+CREATE OR REPLACE FUNCTION clientes_segmento(
+    segmento TEXT, servico_alvo TEXT DEFAULT NULL, inicio DATE DEFAULT NULL, fim DATE DEFAULT NULL
+)
+RETURNS TABLE (telegram_id TEXT)
+LANGUAGE sql STABLE AS $$
+    SELECT c.telegram_id FROM clientes c WHERE segmento = 'todos'
+    UNION
+    SELECT DISTINCT a.telegram_id
+    FROM agendamentos a
+    WHERE segmento <> 'todos'
+      AND a.telegram_id IS NOT NULL
+      AND a.status <> 'cancelado'
+      AND (segmento <> 'semana'  OR a.data BETWEEN inicio AND fim)
+      AND (segmento <> 'servico' OR a.servico = servico_alvo);
+$$;
+
+-- Relatório de cada difusão, com a lista de falhas
+CREATE TABLE IF NOT EXISTS difusoes (
+    id             BIGSERIAL   PRIMARY KEY,
+    segmento       TEXT        NOT NULL,
+    servico        TEXT,
+    texto          TEXT        NOT NULL,
+    total          INT         NOT NULL,
+    enviados       INT         NOT NULL,
+    falhas         JSONB       NOT NULL DEFAULT '[]'::jsonb,   -- [{"telegram_id", "erro"}]
+    criado_em      TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- ─── Lista de espera ───────────────────────────────────────────────
+-- Clientes aguardando vaga numa data (faixa de..ate); o bot oferece o
+-- horário quando um agendamento da data é cancelado ou excluído.
+CREATE TABLE IF NOT EXISTS lista_espera (
+    id           BIGSERIAL   PRIMARY KEY,
+    telegram_id  TEXT        NOT NULL,
+    nome         TEXT        NOT NULL,
+    servico      TEXT        NOT NULL,
+    data         DATE        NOT NULL,
+    de           TIME        NOT NULL DEFAULT '00:00',
+    ate          TIME        NOT NULL DEFAULT '23:59',
+    status       TEXT        NOT NULL DEFAULT 'aguardando',  -- aguardando | atendida
+    criado_em    TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Carga na inicialização: só quem ainda aguarda, de hoje em diante
+CREATE INDEX IF NOT EXISTS idx_lista_espera_aguardando ON lista_espera(data, id) WHERE status = 'aguardando';
+
+-- ─── Réplica em memória (REPLICA=1) ────────────────────────────────
+-- O bot assina as mudanças de agendamentos pelo Realtime
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_publication WHERE pubname = 'supabase_realtime')
+       AND NOT EXISTS (SELECT 1 FROM pg_publication_tables
+                       WHERE pubname = 'supabase_realtime' AND tablename = 'agendamentos') THEN
+        ALTER PUBLICATION supabase_realtime ADD TABLE agendamentos;
+    END IF;
+END $$;
+
+-- Conferência periódica: a réplica calcula a mesma soma em memória (replica.Registro.assinatura)
+-- Chamada pelo bot via RPC: supabase.rpc("agendamentos_ativos_checksum", {"desde": "AAAA-MM-DD"})
+CREATE OR REPLACE FUNCTION agendamentos_ativos_checksum(desde DATE)
+RETURNS JSONB
+LANGUAGE sql STABLE AS $$
+    SELECT jsonb_build_object(
+        'total', count(*),
+        'md5',   md5(coalesce(string_agg(
+                     concat_ws('|', id, data, to_char(horario, 'HH24:MI'), status, nome, servico,
+                               coalesce(telegram_id, ''), coalesce(codigo, '')),
+                     E'\n' ORDER BY id), ''))
+    )
+    FROM agendamentos
+    WHERE data >= desde AND status <> 'cancelado';
+$$;
+
+-- ─── Arquivo de agendamentos antigos ───────────────────────────────
+-- Mesmas colunas da tabela quente, sem as restrições de reserva; o bot
+-- move para cá, uma vez por dia, o que passou de ARQUIVO_MESES meses.
+CREATE TABLE IF NOT EXISTS agendamentos_arquivo (LIKE agendamentos INCLUDING DEFAULTS);
+ALTER TABLE agendamentos_arquivo ADD COLUMN IF NOT EXISTS arquivado_em TIMESTAMPTZ DEFAULT NOW();
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'agendamentos_arquivo_pkey') THEN
+        ALTER TABLE agendamentos_arquivo ADD CONSTRAINT agendamentos_arquivo_pkey PRIMARY KEY (id);
+    END IF;
+END $$;
+
+-- Exportação por intervalo de datas (keyset em data, horario, id)
+CREATE INDEX IF NOT EXISTS idx_agendamentos_arquivo_keyset ON agendamentos_arquivo(data, horario, id);
+
+-- Chamada pelo bot via RPC: supabase.rpc("arquivar_agendamentos", {"antes": "AAAA-MM-DD", "lote": 1000})
+-- Lotes curtos mantêm cada transação (e os bloqueios) pequena; jsonb_populate_record
+-- casa as colunas pelo nome, então colunas novas em agendamentos não quebram a cópia.
+-- Devolve quantas linhas saíram da tabela quente (todas entram no arquivo).
+CREATE OR REPLACE FUNCTION arquivar_agendamentos(antes DATE, lote INT DEFAULT 1000)
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    alvo    UUID[];
+    movidos INT;
+BEGIN
+    SELECT array_agg(id) INTO alvo FROM (
+        SELECT id FROM agendamentos WHERE data < antes
+        ORDER BY data, horario, id LIMIT lote
+        FOR UPDATE
+    ) t;
+    IF alvo IS NULL THEN
+        RETURN 0;
+    END IF;
+    -- Uma cópia que já estava no arquivo (restauração manual, por exemplo) dá lugar
+    -- à versão da tabela quente, que é a mais nova; sem ON CONFLICT, qualquer outra
+    -- colisão aborta o lote inteiro em vez de perder a linha
+    DELETE FROM agendamentos_arquivo WHERE id = ANY(alvo);
+    WITH removidos AS (
+        DELETE FROM agendamentos WHERE id = ANY(alvo) RETURNING *
+    )
+    INSERT INTO agendamentos_arquivo
+    SELECT (jsonb_populate_record(NULL::agendamentos_arquivo, to_jsonb(r) || jsonb_build_object('arquivado_em', now()))).*
+    FROM removidos r;
+    GET DIAGNOSTICS movidos = ROW_COUNT;
+    RETURN movidos;
+END $$;
+
 -- ─── Permissões (Row Level Security) ────────────────────────────────
 -- Descomente abaixo se quiser habilitar RLS com política de service_role
 -- ALTER TABLE agendamentos ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,149 @@
+"""Assinatura das mudanças de uma tabela pelo Realtime do Supabase.
+
+O supabase-py fixado (2.5.3) não traz cliente Realtime utilizável: o
+`AsyncClient` não tem `channel()` e o pacote `realtime` 1.x entra no canal
+sem a configuração de `postgres_changes` que o servidor atual exige. Este
+módulo fala o protocolo Phoenix direto pelo WebSocket: entra no canal
+`realtime:<tabela>` pedindo os eventos do Postgres, manda o heartbeat e
+entrega cada `postgres_changes` ao callback. Se a conexão cair, reconecta
+com espera crescente e avisa `ao_reconectar`, porque os eventos do
+intervalo se perderam.
+"""
+import asyncio
+import itertools
+import json
+import logging
+from urllib.parse import urlencode
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+VERSAO_PROTOCOLO = "1.0.0"
+
+
+def url_websocket(url, chave):
+    """`https://x.supabase.co` → `wss://x.supabase.co/realtime/v1/websocket?apikey=...`."""
+    base = url.rstrip("/").replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+    return f"{base}/realtime/v1/websocket?{urlencode({'apikey': chave, 'vsn': VERSAO_PROTOCOLO})}"
+
+
+class CanalRealtime:
+    """Um canal `postgres_changes` (INSERT/UPDATE/DELETE) com heartbeat e reconexão."""
+
+    HEARTBEAT    = 25    # segundos; o servidor derruba a conexão após ~60 s sem heartbeat
+    ESPERA_JOIN  = 10
+    RECUO_MAXIMO = 60
+
+    def __init__(self, url, chave, tabela, callback, ao_reconectar=None, esquema="public"):
+        self._url           = url_websocket(url, chave)
+        self._chave         = chave
+        self._topico        = f"realtime:{tabela}"
+        self._config        = {"postgres_changes": [{"event": "*", "schema": esquema, "table": tabela}]}
+        self._callback      = callback
+        self._ao_reconectar = ao_reconectar
+        self._refs          = itertools.count(1)
+        self._ws            = None
+        self._tarefa        = None
+        self.conectado      = False
+
+    # ─── Ciclo de vida ────────────────────────────────────────────────
+
+    async def iniciar(self):
+        """Conecta e entra no canal; se falhar, segue tentando em segundo plano. True se já entrou."""
+        try:
+            await self._entrar()
+        except Exception as e:
+            logger.warning(f"Realtime: falha ao assinar {self._topico} ({e}); tentando de novo em segundo plano")
+        self._tarefa = asyncio.create_task(self._laco())
+        return self.conectado
+
+    async def parar(self):
+        if self._tarefa:
+            self._tarefa.cancel()
+            self._tarefa = None
+        if self._ws is not None:
+            await self._ws.close()
+            self._ws = None
+        self.conectado = False
+
+    # ─── Protocolo ────────────────────────────────────────────────────
+
+    async def _enviar(self, topico, evento, payload):
+        ref = str(next(self._refs))
+        await self._ws.send(json.dumps({"topic": topico, "event": evento, "payload": payload, "ref": ref, "join_ref": ref}))
+        return ref
+
+    async def _entrar(self):
+        self._ws = await websockets.connect(self._url, open_timeout=self.ESPERA_JOIN)
+        try:
+            ref = await self._enviar(self._topico, "phx_join", {"config": self._config, "access_token": self._chave})
+            resposta = await asyncio.wait_for(self._resposta(ref), self.ESPERA_JOIN)
+            if resposta.get("status") != "ok":
+                raise RuntimeError(f"join recusado: {resposta.get('response')}")
+        except BaseException:
+            await self._ws.close()
+            self._ws = None
+            raise
+        self.conectado = True
+        logger.info(f"Realtime: {self._topico} assinado")
+
+    async def _resposta(self, ref):
+        while True:
+            msg = json.loads(await self._ws.recv())
+            if msg.get("event") == "phx_reply" and msg.get("ref") == ref:
+                return msg.get("payload") or {}
+
+    async def _heartbeat(self):
+        try:
+            while True:
+                await asyncio.sleep(self.HEARTBEAT)
+                await self._enviar("phoenix", "heartbeat", {})
+        except websockets.ConnectionClosed:
+            pass   # `_receber` percebe a queda e o laço reconecta
+
+    async def _receber(self):
+        async for bruto in self._ws:
+            msg    = json.loads(bruto)
+            evento = msg.get("event")
+            if msg.get("topic") != self._topico:
+                continue
+            if evento == "postgres_changes":
+                try:
+                    self._callback(msg.get("payload") or {})
+                except Exception as e:
+                    logger.warning(f"Realtime: callback falhou: {e}")
+            elif evento in ("phx_error", "phx_close"):
+                raise ConnectionError(f"canal encerrado pelo servidor ({evento})")
+            elif evento == "system" and (msg.get("payload") or {}).get("status") == "error":
+                logger.warning(f"Realtime: {msg['payload'].get('message')}")
+
+    async def _laco(self):
+        recuo = 1
+        while True:
+            if self.conectado:
+                batimento = asyncio.create_task(self._heartbeat())
+                try:
+                    await self._receber()
+                    logger.warning(f"Realtime: conexão de {self._topico} fechada")
+                except Exception as e:
+                    logger.warning(f"Realtime: conexão de {self._topico} caiu: {e}")
+                finally:
+                    batimento.cancel()
+                    self.conectado = False
+                    if self._ws is not None:
+                        await self._ws.close()
+                        self._ws = None
+            await asyncio.sleep(recuo)
+            try:
+                await self._entrar()
+            except Exception as e:
+                recuo = min(recuo * 2, self.RECUO_MAXIMO)
+                logger.warning(f"Realtime: nova tentativa em {recuo}s ({e})")
+                continue
+            recuo = 1
+            if self._ao_reconectar:
+                try:
+                    self._ao_reconectar()
+                except Exception as e:
+                    logger.warning(f"Realtime: ao_reconectar falhou: {e}")
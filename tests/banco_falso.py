@@ -0,0 +1,323 @@
+"""Cliente Supabase em memória para os testes.
+
+Imita o pedaço do construtor de consultas do postgrest-py que o
+`RepositorioAgendamentos` usa (`table(...).select/insert/upsert/update/
+delete`, filtros, `or_`, `order`, `limit`, `rpc`) e aplica cada `execute()` de uma
+vez, sem ceder o event loop no meio, como uma transação do banco. Em
+`agendamentos` valem as mesmas restrições do schema: chave primária,
+`codigo` único e `agendamentos_sem_sobreposicao` (23P01).
+
+`latencia` simula a ida e volta da rede antes de cada requisição,
+`fora_do_ar` faz as requisições falharem como se o banco não respondesse
+(ou levantarem a exceção dada, como a resposta de um gateway) e `ao_mudar` recebe `(tipo, tabela, linha, antiga)` a cada linha gravada (o
+"change feed" que o Realtime entregaria).
+"""
+import asyncio
+import copy
+import itertools
+import operator
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+from postgrest.exceptions import APIError
+
+
+def _minutos(hhmm):
+    h, m = str(hhmm)[:5].split(":")
+    return int(h) * 60 + int(m)
+
+
+OPERADORES = {"eq": operator.eq, "neq": operator.ne, "gt": operator.gt,
+              "gte": operator.ge, "lt": operator.lt, "lte": operator.le}
+
+
+def _termos(texto):
+    """Separa nas vírgulas fora de parênteses e aspas."""
+    termos, atual, nivel, aspas = [], "", 0, False
+    for ch in texto:
+        if ch == '"':
+            aspas = not aspas
+        elif not aspas and ch in "()":
+            nivel += 1 if ch == "(" else -1
+        elif ch == "," and not nivel and not aspas:
+            termos.append(atual)
+            atual = ""
+            continue
+        atual += ch
+    return termos + [atual]
+
+
+def _arvore(juncao, texto):
+    """Teste de linha para uma árvore lógica do PostgREST: `c.op.valor`, `and(...)`, `or(...)`."""
+    testes = []
+    for termo in _termos(texto):
+        if termo.startswith(("and(", "or(")):
+            sub, _, resto = termo.partition("(")
+            testes.append(_arvore(sub, resto[:-1]))
+            continue
+        coluna, op, valor = termo.split(".", 2)
+        testes.append(lambda l, c=coluna, f=OPERADORES[op], v=valor.strip('"'):
+                      l.get(c) is not None and f(_comparavel(l[c]), _comparavel(v)))
+    combinar = all if juncao == "and" else any
+    return lambda l: combinar(t(l) for t in testes)
+
+
+def _horario(valor):
+    """TIME volta do banco como HH:MM:SS."""
+    return str(valor)[:5] + ":00" if valor is not None else None
+
+
+# DEFAULTs do schema
+PADROES = {
+    "agendamentos": {"status": "pendente", "duracao_min": 60, "profissional_id": None,
+                     "lembrete_24h_em": None, "lembrete_2h_em": None, "telegram_id": None},
+    "lista_espera": {"status": "aguardando"},
+}
+
+
+class Resposta:
+    def __init__(self, data):
+        self.data = data
+
+
+class Consulta:
+    def __init__(self, cliente, tabela):
+        self._cliente   = cliente
+        self._tabela    = tabela
+        self._op        = "select"
+        self._colunas   = "*"
+        self._dados     = None
+        self._opcoes    = {}
+        self._filtros   = []
+        self._ordem     = []
+        self._limite    = None
+        self._negar     = False
+
+    # ─── Operação ─────────────────────────────────────────────────────
+
+    def select(self, colunas="*"):
+        self._op, self._colunas = "select", colunas
+        return self
+
+    def insert(self, dados):
+        self._op, self._dados = "insert", dados
+        return self
+
+    def upsert(self, dados, on_conflict="id", ignore_duplicates=False):
+        self._op, self._dados = "upsert", dados
+        self._opcoes = {"on_conflict": on_conflict, "ignorar": ignore_duplicates}
+        return self
+
+    def update(self, campos):
+        self._op, self._dados = "update", campos
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    # ─── Filtros ──────────────────────────────────────────────────────
+
+    def _filtro(self, teste):
+        negar, self._negar = self._negar, False
+        self._filtros.append((lambda l: not teste(l)) if negar else teste)
+        return self
+
+    @property
+    def not_(self):
+        self._negar = True
+        return self
+
+    def eq(self, c, v):
+        return self._filtro(lambda l: _comparavel(l.get(c)) == _comparavel(v))
+
+    def neq(self, c, v):
+        return self._filtro(lambda l: _comparavel(l.get(c)) != _comparavel(v))
+
+    def gt(self, c, v):
+        return self._filtro(lambda l: l.get(c) is not None and _comparavel(l[c]) > _comparavel(v))
+
+    def gte(self, c, v):
+        return self._filtro(lambda l: l.get(c) is not None and _comparavel(l[c]) >= _comparavel(v))
+
+    def lt(self, c, v):
+        return self._filtro(lambda l: l.get(c) is not None and _comparavel(l[c]) < _comparavel(v))
+
+    def lte(self, c, v):
+        return self._filtro(lambda l: l.get(c) is not None and _comparavel(l[c]) <= _comparavel(v))
+
+    def or_(self, filtros):
+        return self._filtro(_arvore("or", filtros))
+
+    def in_(self, c, valores):
+        alvo = {_comparavel(v) for v in valores}
+        return self._filtro(lambda l: _comparavel(l.get(c)) in alvo)
+
+    def is_(self, c, v):
+        return self._filtro(lambda l: l.get(c) is None if v == "null" else l.get(c) is v)
+
+    def like(self, c, padrao):
+        prefixo = padrao.rstrip("%")
+        return self._filtro(lambda l: str(l.get(c) or "").startswith(prefixo))
+
+    def order(self, c, desc=False):
+        self._ordem.append((c, desc))
+        return self
+
+    def limit(self, n):
+        self._limite = n
+        return self
+
+    # ─── Execução ─────────────────────────────────────────────────────
+
+    async def execute(self):
+        await self._cliente._ida_e_volta()
+        return Resposta(self._cliente._aplicar(self))
+
+
+def _comparavel(v):
+    """Valor para comparar: HH:MM:SS vira HH:MM; números ficam números; o resto, texto."""
+    if v is None or isinstance(v, (int, float)):
+        return v
+    v = str(v)
+    return v[:5] if len(v) == 8 and v[2] == ":" else v
+
+
+class Chamada:
+    def __init__(self, cliente, funcao, params):
+        self._cliente = cliente
+        self._funcao  = funcao
+        self._params  = params
+
+    async def execute(self):
+        await self._cliente._ida_e_volta()
+        return Resposta(self._cliente.funcoes[self._funcao](self._cliente, self._params))
+
+
+class ClienteFalso:
+    """Tabelas em dicionários; cada `execute()` é atômico."""
+
+    def __init__(self, latencia=0.0):
+        self.latencia    = latencia
+        self.fora_do_ar  = False
+        self.tabelas     = {}
+        self.funcoes     = {}
+        self.ao_mudar    = []
+        self.requisicoes = 0
+        self._seq        = itertools.count(1)
+
+    # ─── Interface do supabase-py ─────────────────────────────────────
+
+    def table(self, nome):
+        return Consulta(self, nome)
+
+    def rpc(self, funcao, params):
+        return Chamada(self, funcao, params)
+
+    async def _ida_e_volta(self):
+        self.requisicoes += 1
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        else:
+            await asyncio.sleep(0)
+        if isinstance(self.fora_do_ar, Exception):
+            raise self.fora_do_ar
+        if self.fora_do_ar:
+            raise httpx.ConnectError("banco fora do ar (teste)")
+
+    # ─── Aplicação ────────────────────────────────────────────────────
+
+    def linhas(self, tabela):
+        return self.tabelas.setdefault(tabela, [])
+
+    def _aplicar(self, c):
+        linhas = self.linhas(c._tabela)
+        alvo   = [l for l in linhas if all(f(l) for f in c._filtros)]
+        if c._op == "select":
+            for coluna, desc in reversed(c._ordem):
+                alvo.sort(key=lambda l: (l.get(coluna) is None, _comparavel(l.get(coluna))), reverse=desc)
+            if c._limite is not None:
+                alvo = alvo[:c._limite]
+            return [self._projetar(l, c._colunas) for l in alvo]
+        if c._op in ("insert", "upsert"):
+            novas = c._dados if isinstance(c._dados, list) else [c._dados]
+            return [l for l in (self._inserir(c._tabela, d, c._op == "upsert", c._opcoes) for d in novas) if l]
+        if c._op == "update":
+            novas = [self._normalizar(c._tabela, {**l, **c._dados}) for l in alvo]
+            for l, nova in zip(alvo, novas):
+                self._validar(c._tabela, nova, ignorar=l)   # tudo ou nada, como o UPDATE
+            resultado = []
+            for l, nova in zip(alvo, novas):
+                antiga = copy.deepcopy(l)
+                l.update(nova)
+                self._avisar("UPDATE", c._tabela, l, antiga)
+                resultado.append(copy.deepcopy(l))
+            return resultado
+        if c._op == "delete":
+            for l in alvo:
+                linhas.remove(l)
+                self._avisar("DELETE", c._tabela, None, l)
+            return [copy.deepcopy(l) for l in alvo]
+        raise NotImplementedError(c._op)
+
+    def _inserir(self, tabela, dados, upsert, opcoes):
+        linhas = self.linhas(tabela)
+        chave  = opcoes.get("on_conflict", "id") if upsert else "id"
+        if upsert and dados.get(chave) is not None:
+            existente = next((l for l in linhas if l.get(chave) == dados[chave]), None)
+            if existente is not None:
+                if opcoes.get("ignorar"):
+                    return None
+                antiga = copy.deepcopy(existente)
+                existente.update(self._normalizar(tabela, {**existente, **dados}))
+                self._avisar("UPDATE", tabela, existente, antiga)
+                return copy.deepcopy(existente)
+        linha = self._normalizar(tabela, {
+            "id": str(uuid.uuid4()) if tabela == "agendamentos" else next(self._seq),
+            "criado_em": datetime.now(timezone.utc).isoformat(),
+            **dados,
+        })
+        linha = {**PADROES.get(tabela, {}), **linha}
+        self._validar(tabela, linha)
+        linhas.append(linha)
+        self._avisar("INSERT", tabela, linha, None)
+        return copy.deepcopy(linha)
+
+    @staticmethod
+    def _normalizar(tabela, linha):
+        if tabela == "agendamentos" and "horario" in linha:
+            linha["horario"] = _horario(linha["horario"])
+        return linha
+
+    def _validar(self, tabela, nova, ignorar=None):
+        for l in self.linhas(tabela):
+            if l is ignorar:
+                continue
+            if l["id"] == nova["id"]:
+                raise APIError({"code": "23505", "message": f'duplicate key value violates unique constraint "{tabela}_pkey"'})
+            if tabela != "agendamentos":
+                continue
+            if nova.get("codigo") and l.get("codigo") == nova["codigo"]:
+                raise APIError({"code": "23505", "message": 'duplicate key value violates unique constraint "agendamentos_codigo_key"'})
+            if self._sobrepoe(l, nova):
+                raise APIError({"code": "23P01", "message": 'conflicting key value violates exclusion constraint "agendamentos_sem_sobreposicao"'})
+
+    @staticmethod
+    def _sobrepoe(a, b):
+        if "cancelado" in (a.get("status"), b.get("status")) or a["data"] != b["data"]:
+            return False
+        if (a.get("profissional_id") or 0) != (b.get("profissional_id") or 0):
+            return False
+        ia, ib = _minutos(a["horario"]), _minutos(b["horario"])
+        return ia < ib + (b.get("duracao_min") or 60) and ib < ia + (a.get("duracao_min") or 60)
+
+    @staticmethod
+    def _projetar(linha, colunas):
+        if colunas.strip() == "*":
+            return copy.deepcopy(linha)
+        return {c: copy.deepcopy(linha.get(c)) for c in (c.strip() for c in colunas.split(","))}
+
+    def _avisar(self, tipo, tabela, linha, antiga):
+        for ouvinte in self.ao_mudar:
+            ouvinte(tipo, tabela, copy.deepcopy(linha), copy.deepcopy(antiga))
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+from collections import Counter, OrderedDict
+from datetime import date, timedelta
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from banco_falso import ClienteFalso          # noqa: E402
+from repositorio import RepositorioAgendamentos  # noqa: E402
+
+HORARIOS = ("09:00", "10:00", "11:00", "14:00", "15:00", "16:00")
+
+
+def proxima_data(dias=7):
+    return (date.today() + timedelta(days=dias)).isoformat()
+
+
+def semear_catalogo(cliente, servicos=(("Manicure", 60), ("Alongamento", 120)), horarios=HORARIOS):
+    cliente.tabelas["catalogo_versao"] = [{"id": 1, "versao": 1}]
+    cliente.tabelas["servicos"]      = [{"nome": n, "duracao_min": d, "preco": None, "ativo": True} for n, d in servicos]
+    cliente.tabelas["horarios"]      = [{"id": i, "horario": h + ":00", "dia_semana": None} for i, h in enumerate(horarios, 1)]
+    cliente.tabelas["profissionais"] = []
+    cliente.tabelas["expedientes"]   = []
+
+
+@pytest.fixture
+def cliente():
+    c = ClienteFalso()
+    semear_catalogo(c)
+    return c
+
+
+@pytest.fixture
+def repo(cliente):
+    r = RepositorioAgendamentos("http://localhost", "chave")
+    r._cliente = cliente
+    return r
+
+
+@pytest.fixture
+def bot(cliente, tmp_path, monkeypatch):
+    """O módulo `bot` com o banco em memória, índices zerados e envios gravados em `bot.enviados`."""
+    import bot as modulo
+
+    monkeypatch.setattr(modulo.repo, "_cliente", cliente)
+    monkeypatch.setattr(modulo.diario, "_caminho", str(tmp_path / "diario.sqlite3"))
+    monkeypatch.setattr(modulo.diario, "_conexao", None)
+    for atributo, vazio in (("_pendentes", 0), ("_mortas", 0), ("_locais", {}), ("_por_ag", Counter()),
+                            ("_linhas", OrderedDict()), ("_leituras", OrderedDict()), ("degradado", False)):
+        monkeypatch.setattr(modulo.diario, atributo, vazio)
+    for atributo in ("_ocupados", "_por_id", "_validade", "_pendentes", "_reservas"):
+        monkeypatch.setattr(modulo.ocupacao, atributo, {})
+    monkeypatch.setattr(modulo.ocupacao, "_trava", asyncio.Lock())
+    monkeypatch.setattr(modulo.catalogo, "_trava", asyncio.Lock())
+    enviados = []
+
+    async def enviar(chat_id, texto, **kwargs):
+        enviados.append((chat_id, texto))
+
+    monkeypatch.setattr(modulo.fila, "enviar", enviar)
+    monkeypatch.setattr(modulo, "enviados", enviados, raising=False)
+    return modulo
@@ -0,0 +1,80 @@
+"""Servidor Realtime local (protocolo Phoenix sobre WebSocket) para os testes.
+
+Aceita `phx_join` em `realtime:<tabela>` com a configuração de
+`postgres_changes`, responde aos heartbeats e repassa, no formato do
+Supabase, cada linha gravada no `ClienteFalso` ao qual está ligado. Como o
+Postgres com REPLICA IDENTITY padrão, o DELETE só traz a chave primária
+em `old_record`.
+"""
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import websockets
+
+
+class RealtimeLocal:
+    def __init__(self, cliente):
+        self._servidor   = None
+        self._assinantes = {}   # conexão -> {tabela}
+        self.ativo       = True  # False: descarta os eventos (simula a janela de uma queda)
+        self.joins       = 0
+        cliente.ao_mudar.append(self._ao_mudar)
+
+    @property
+    def url(self):
+        host, porta = self._servidor.sockets[0].getsockname()[:2]
+        return f"http://{host}:{porta}"
+
+    async def iniciar(self):
+        self._servidor = await websockets.serve(self._atender, "127.0.0.1", 0)
+        return self
+
+    async def parar(self):
+        self._servidor.close()
+        await self._servidor.wait_closed()
+
+    async def derrubar(self):
+        """Fecha todas as conexões abertas, como uma queda do servidor."""
+        for ws in list(self._assinantes):
+            await ws.close(code=1012)
+
+    async def _atender(self, ws, *_):
+        self._assinantes[ws] = set()
+        try:
+            async for bruto in ws:
+                msg = json.loads(bruto)
+                if msg["event"] == "heartbeat":
+                    await self._responder(ws, msg, {})
+                elif msg["event"] == "phx_join":
+                    mudancas = (msg["payload"].get("config") or {}).get("postgres_changes") or []
+                    if not mudancas:
+                        await self._responder(ws, msg, {"reason": "sem postgres_changes"}, "error")
+                        continue
+                    self.joins += 1
+                    self._assinantes[ws] |= {m["table"] for m in mudancas}
+                    await self._responder(ws, msg, {"postgres_changes": [{"id": i, **m} for i, m in enumerate(mudancas, 1)]})
+        finally:
+            self._assinantes.pop(ws, None)
+
+    @staticmethod
+    async def _responder(ws, msg, resposta, status="ok"):
+        await ws.send(json.dumps({
+            "topic": msg["topic"], "event": "phx_reply", "ref": msg["ref"],
+            "payload": {"status": status, "response": resposta},
+        }))
+
+    def _ao_mudar(self, tipo, tabela, linha, antiga):
+        if not self.ativo:
+            return
+        evento = json.dumps({
+            "topic": f"realtime:{tabela}", "event": "postgres_changes", "ref": None,
+            "payload": {"ids": [1], "data": {
+                "type": tipo, "schema": "public", "table": tabela,
+                "commit_timestamp": datetime.now(timezone.utc).isoformat(),
+                "record": linha or {}, "old_record": {"id": antiga["id"]} if antiga else {},
+            }},
+        }, default=str)
+        for ws, tabelas in list(self._assinantes.items()):
+            if tabela in tabelas:
+                asyncio.ensure_future(ws.send(evento))
@@ -0,0 +1,89 @@
+"""Edição de agendamento pelo TI refaz o encaixe: duração do serviço e expediente; hoje, só horários por vir."""
+import asyncio
+from datetime import date, datetime, time
+from types import SimpleNamespace
+
+import agenda
+from agenda import MotorAgenda
+from catalogo import CacheCatalogo
+from conftest import proxima_data
+from disponibilidade import IndiceOcupacao
+from test_concorrencia import Mensagem
+
+
+async def _editar(bot, ag_id, campo, valor):
+    update  = SimpleNamespace(message=Mensagem(valor), effective_user=SimpleNamespace(id=1))
+    context = SimpleNamespace(user_data={"editar_id": ag_id, "editar_campo": campo})
+    await bot.ti_editar_valor(update, context)
+    return update.message.respostas[-1][0]
+
+
+def test_trocar_servico_recalcula_a_duracao(bot, cliente):
+    data = proxima_data()
+
+    async def principal():
+        await bot.catalogo.carregar()
+        manicure = await bot.repo.inserir({"nome": "Ana", "servico": "Manicure", "data": data,
+                                           "horario": "09:00", "duracao_min": 60})
+        await bot.repo.inserir({"nome": "Bia", "servico": "Manicure", "data": data,
+                                "horario": "10:00", "duracao_min": 60})
+
+        # Alongamento (120 min) às 09:00 invadiria as 10:00 da Bia
+        resposta = await _editar(bot, manicure["id"], "servico", "Alongamento")
+        assert "não cabe" in resposta
+        assert (await bot.repo.obter(manicure["id"]))["servico"] == "Manicure"
+
+        resposta = await _editar(bot, manicure["id"], "horario", "14:00")
+        assert "atualizado" in resposta
+        resposta = await _editar(bot, manicure["id"], "servico", "Alongamento")
+        assert "atualizado" in resposta
+        ag = await bot.repo.obter(manicure["id"])
+        assert (ag["servico"], ag["duracao_min"], ag["horario"]) == ("Alongamento", 120, "14:00:00")
+
+        # O intervalo novo (14:00–16:00) já bloqueia as 15:00
+        assert "15:00" not in await bot.agenda.livres(data, "Manicure")
+
+        assert "Serviço desconhecido" in await _editar(bot, manicure["id"], "servico", "Pedicure")
+
+    asyncio.run(principal())
+
+
+def test_editar_horario_respeita_o_expediente(bot, cliente):
+    data = proxima_data()
+    cliente.tabelas["profissionais"] = [{"id": 1, "nome": "Dandara", "ativo": True}]
+    cliente.tabelas["expedientes"]   = [{"profissional_id": 1, "dia_semana": d, "inicio": "09:00:00", "fim": "12:00:00"}
+                                        for d in range(1, 8)]
+
+    async def principal():
+        await bot.catalogo.carregar()
+        ag = await bot.repo.inserir({"nome": "Ana", "servico": "Manicure", "data": data, "horario": "09:00",
+                                     "duracao_min": 60, "profissional_id": 1})
+        assert "não cabe" in await _editar(bot, ag["id"], "horario", "14:00")
+        # Fora dos modelos do catálogo, mas dentro do expediente: o TI pode
+        assert "atualizado" in await _editar(bot, ag["id"], "horario", "10:30")
+        atualizado = await bot.repo.obter(ag["id"])
+        assert (atualizado["horario"], atualizado["profissional_id"]) == ("10:30:00", 1)
+
+    asyncio.run(principal())
+
+
+def test_hoje_so_oferece_horarios_que_ainda_nao_passaram(repo, monkeypatch):
+    class MeioDia(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.combine(date.today(), time(12, 0))
+
+    monkeypatch.setattr(agenda, "datetime", MeioDia)
+    hoje = date.today().isoformat()
+
+    async def principal():
+        catalogo = CacheCatalogo(repo)
+        await catalogo.carregar()
+        motor = MotorAgenda(IndiceOcupacao(repo), catalogo)
+        assert await motor.livres(hoje) == ["14:00", "15:00", "16:00"]
+        assert await motor.livres(proxima_data()) == ["09:00", "10:00", "11:00", "14:00", "15:00", "16:00"]
+        # Os inícios dados pelo TI valem como vieram, mesmo já passados
+        assert list(await motor.encaixes(hoje, horarios=["10:00"])) == ["10:00"]
+        assert (await motor.primeiros_livres(n=1))[0] == (hoje, "14:00")
+
+    asyncio.run(principal())
@@ -0,0 +1,119 @@
+"""N reservas simultâneas do mesmo horário: exatamente uma vence."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import proxima_data
+from repositorio import HorarioOcupado
+
+N = 25
+
+
+def test_repositorio_aceita_uma_so_reserva(repo, cliente):
+    data = proxima_data()
+
+    async def reservar(i):
+        try:
+            return await repo.inserir({"nome": f"Cliente {i}", "servico": "Manicure", "data": data,
+                                       "horario": "10:00", "telegram_id": str(1000 + i), "duracao_min": 60})
+        except HorarioOcupado:
+            return None
+
+    async def principal():
+        cliente.latencia = 0.001
+        return await asyncio.gather(*(reservar(i) for i in range(N)))
+
+    resultados = asyncio.run(principal())
+    assert sum(r is not None for r in resultados) == 1
+    assert len(cliente.linhas("agendamentos")) == 1
+
+
+def test_sobreposicao_pela_duracao_tambem_conflita(repo):
+    data = proxima_data()
+
+    async def principal():
+        await repo.inserir({"nome": "A", "servico": "Alongamento", "data": data, "horario": "09:00", "duracao_min": 120})
+        with pytest.raises(HorarioOcupado):
+            await repo.inserir({"nome": "B", "servico": "Manicure", "data": data, "horario": "10:00", "duracao_min": 60})
+        # Cancelado não ocupa
+        await repo.inserir({"nome": "C", "servico": "Manicure", "data": data, "horario": "11:00",
+                            "duracao_min": 60, "status": "cancelado"})
+        await repo.inserir({"nome": "D", "servico": "Manicure", "data": data, "horario": "11:00", "duracao_min": 60})
+
+    asyncio.run(principal())
+
+
+class Mensagem:
+    def __init__(self, texto):
+        self.text     = texto
+        self.respostas = []
+
+    async def reply_text(self, texto, **kwargs):
+        self.respostas.append((texto, kwargs.get("reply_markup")))
+
+
+def _conversa(i, data):
+    update  = SimpleNamespace(message=Mensagem("10:00"), effective_user=SimpleNamespace(id=1000 + i))
+    context = SimpleNamespace(user_data={
+        "nome": f"Cliente {i}", "servico": "Manicure", "data": data, "telegram_id": 1000 + i,
+    })
+    return update, context
+
+
+def test_receber_horario_concorrente_oferece_os_proximos(bot, cliente):
+    data = proxima_data()
+
+    async def principal():
+        await bot.catalogo.carregar()
+        cliente.latencia = 0.001
+        conversas = [_conversa(i, data) for i in range(N)]
+        estados   = await asyncio.gather(*(bot.receber_horario(u, c) for u, c in conversas))
+        return conversas, estados
+
+    conversas, estados = asyncio.run(principal())
+    finais = [u.message.respostas[-1][0] for u, _ in conversas]
+
+    registradas = [t for t in finais if "Seu agendamento foi registrado" in t]
+    perdidas    = [i for i, t in enumerate(finais) if "Seu agendamento foi registrado" not in t]
+    assert len(registradas) == 1
+    # Quem chegou ao banco depois da vencedora recebe a recusa do INSERT; quem só olhou
+    # a agenda depois dela já nem vê o horário
+    assert any("acabou de ser reservado" in finais[i] for i in perdidas)
+    assert all("acabou de ser reservado" in finais[i] or "já reservado" in finais[i] for i in perdidas)
+    assert len(cliente.linhas("agendamentos")) == 1
+    assert len(bot.enviados) == 1   # só um aviso de novo agendamento para o admin
+
+    # Quem perdeu volta à escolha de horário com os próximos livres, sem o 10:00
+    assert all(estados[i] == bot.HORARIO for i in perdidas)
+    recusada = next(i for i in perdidas if "acabou de ser reservado" in finais[i])
+    teclado  = conversas[recusada][0].message.respostas[-1][1]
+    botoes   = [b for linha in teclado.keyboard for b in linha]
+    assert "10:00" not in [b.text for b in botoes]
+    assert botoes[0].text == "11:00"
+
+
+def test_processador_serializa_cada_conversa_e_paraleliza_as_outras():
+    from concorrencia import ProcessadorPorConversa
+
+    ordem, simultaneos, pico = [], [0], [0]
+
+    async def handler(uid, i):
+        simultaneos[0] += 1
+        pico[0] = max(pico[0], simultaneos[0])
+        await asyncio.sleep(0.01)
+        ordem.append((uid, i))
+        simultaneos[0] -= 1
+
+    async def principal():
+        proc = ProcessadorPorConversa(simultaneos=8)
+        updates = [(SimpleNamespace(effective_user=SimpleNamespace(id=uid)), uid, i)
+                   for i in range(5) for uid in range(4)]
+        await asyncio.gather(*(proc.process_update(u, handler(uid, i)) for u, uid, i in updates))
+        assert proc.conversas_ativas == 0
+
+    asyncio.run(principal())
+    # Conversas diferentes correram juntas; dentro de cada uma, a ordem de chegada
+    assert pico[0] == 4
+    for uid in range(4):
+        assert [i for u, i in ordem if u == uid] == list(range(5))
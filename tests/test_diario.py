@@ -0,0 +1,163 @@
+"""Reservas com o Supabase fora do ar: datas nunca consultadas também entram no diário."""
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+
+from postgrest.exceptions import APIError
+
+from conftest import proxima_data
+from test_concorrencia import Mensagem
+
+
+def _conversa(i, texto, **dados):
+    update  = SimpleNamespace(message=Mensagem(texto), effective_user=SimpleNamespace(id=2000 + i))
+    context = SimpleNamespace(user_data={"nome": f"Cliente {i}", "servico": "Manicure", "telegram_id": 2000 + i, **dados})
+    return update, context
+
+
+def test_data_nova_com_banco_fora_do_ar_vai_para_o_diario(bot, cliente):
+    data     = proxima_data(9)
+    digitada = date.fromisoformat(data).strftime("%d/%m/%Y")
+
+    async def principal():
+        await bot.catalogo.carregar()
+        cliente.fora_do_ar = True
+
+        # Data que ninguém consultou antes: a agenda aparece (vazia), sem exceção
+        update, context = _conversa(1, digitada)
+        assert await bot.receber_data(update, context) == bot.HORARIO
+        teclado = update.message.respostas[-1][1]
+        assert [b.text for linha in teclado.keyboard for b in linha][:2] == ["09:00", "10:00"]
+        assert bot.diario.degradado
+
+        update, _ = _conversa(1, "10:00")
+        await bot.receber_horario(update, context)
+        assert "Seu agendamento foi registrado" in update.message.respostas[-1][0]
+        assert bot.diario.pendentes == 1 and not cliente.linhas("agendamentos")
+
+        # A reserva local já ocupa o horário para a próxima cliente
+        update, context = _conversa(2, "10:00", data=data)
+        assert await bot.receber_horario(update, context) == bot.HORARIO
+        assert "Horário inválido ou já reservado" in update.message.respostas[-1][0]
+
+        cliente.fora_do_ar = False
+        await bot.diario.reaplicar()
+        assert bot.diario.pendentes == 0
+        assert [(l["data"], l["horario"]) for l in cliente.linhas("agendamentos")] == [(data, "10:00:00")]
+
+    asyncio.run(principal())
+
+
+def test_erro_do_banco_que_nao_e_queda_responde_a_cliente(bot, cliente, monkeypatch):
+    data     = proxima_data(10)
+    digitada = date.fromisoformat(data).strftime("%d/%m/%Y")
+
+    async def falhar(*_):
+        raise APIError({"code": "42703", "message": "column does not exist"})
+
+    async def principal():
+        await bot.catalogo.carregar()
+        monkeypatch.setattr(bot.repo, "ocupacao", falhar)
+        update, context = _conversa(3, digitada)
+        assert await bot.receber_data(update, context) == bot.DATA
+        assert "Não consegui consultar a agenda" in update.message.respostas[-1][0]
+
+    asyncio.run(principal())
+
+
+def test_falha_de_conexao_pelo_status_e_pela_excecao():
+    import httpx
+    from repositorio import HorarioOcupado, falha_de_conexao
+
+    gateway = APIError({"message": "JSON could not be generated", "code": 502, "details": "<html>Bad Gateway</html>"})
+    assert falha_de_conexao(gateway)
+    assert falha_de_conexao(APIError({"code": "PGRST001", "message": "Database client error"}))
+    assert falha_de_conexao(APIError({"code": "57P03", "message": "the database system is starting up"}))
+    assert falha_de_conexao(httpx.ReadTimeout("lento"))
+    assert not falha_de_conexao(APIError({"code": "23505", "message": "duplicate key"}))
+    assert not falha_de_conexao(APIError({"message": "JSON could not be generated", "code": 404}))
+    assert not falha_de_conexao(HorarioOcupado("ocupado"))
+    assert not falha_de_conexao(KeyError("defeito do bot"))
+
+
+def _reserva(i, data, horario):
+    return {"nome": f"Cliente {i}", "servico": "Manicure", "data": data, "horario": horario,
+            "telegram_id": str(3000 + i), "duracao_min": 60}
+
+
+def test_gateway_fora_do_ar_vai_para_o_diario_e_defeito_nao(bot, cliente, monkeypatch):
+    data = proxima_data(11)
+
+    async def principal():
+        cliente.fora_do_ar = APIError({"message": "JSON could not be generated", "code": 503})
+        await bot.diario.inserir(_reserva(1, data, "09:00"))
+        assert bot.diario.pendentes == 1 and bot.diario.degradado
+
+        cliente.fora_do_ar = False
+        await bot.diario.reaplicar()
+
+        async def defeito(*_, **__):
+            raise KeyError("campo")
+
+        monkeypatch.setattr(bot.repo, "inserir", defeito)
+        try:
+            await bot.diario.inserir(_reserva(2, data, "10:00"))
+        except KeyError:
+            pass
+        else:
+            raise AssertionError("um defeito do bot não pode virar entrada do diário")
+        assert bot.diario.pendentes == 0
+
+    asyncio.run(principal())
+
+
+def test_entrada_envenenada_vai_para_as_mortas_sem_travar_a_fila(bot, cliente, monkeypatch):
+    data = proxima_data(12)
+
+    async def principal():
+        cliente.fora_do_ar = True
+        ruim = await bot.diario.inserir(_reserva(1, data, "09:00"))
+        boa  = await bot.diario.inserir(_reserva(2, data, "10:00"))
+        cliente.fora_do_ar = False
+
+        inserir = bot.repo.inserir
+
+        async def inserir_com_defeito(dados, **kwargs):
+            if dados["id"] == ruim["id"]:
+                raise RuntimeError("defeito ao montar a linha")
+            return await inserir(dados, **kwargs)
+
+        monkeypatch.setattr(bot.repo, "inserir", inserir_com_defeito)
+        monkeypatch.setattr(bot.diario, "_ao_falhar", bot.avisar_recusa)
+        await bot.diario.reaplicar()
+        await bot.diario.reaplicar()   # a morta não volta para a fila
+
+        assert bot.diario.pendentes == 0 and bot.diario.total_mortas == 1
+        assert [l["id"] for l in cliente.linhas("agendamentos")] == [boa["id"]]
+        (seq, op, ag_id, _, tentativas, erro), = await bot.diario.mortas()
+        assert (op, ag_id, tentativas) == ("inserir", ruim["id"], 1) and "RuntimeError" in erro
+        # Só o admin fica sabendo: não é horário tomado, a cliente não recebe "reservado por outra pessoa"
+        assert [chat for chat, _ in bot.enviados] == [bot.ADMIN_ID]
+
+    asyncio.run(principal())
+
+
+def test_painel_do_ti_e_confirmacao_com_o_banco_fora_do_ar(bot, cliente):
+    data = proxima_data(13)
+
+    async def principal():
+        await bot.catalogo.carregar()
+        ag = await bot.repo.inserir(_reserva(4, data, "11:00"))
+        await bot.diario.ler(bot.repo.pagina, limite=10)   # o admin abriu a listagem antes da queda
+
+        cliente.fora_do_ar = True
+        update, context = _conversa(4, ag["codigo"][:4])
+        assert await bot.ti_editar_id(update, context) == bot.TI_AGUARD_EDITAR_CAMPO
+        assert context.user_data["editar_id"] == ag["id"]
+        assert [c["telegram_id"] for c in await bot.diario.ler(bot.repo.clientes_recentes, 30)] == ["3004"]
+
+        # A linha da listagem traz o telegram_id: a confirmação offline avisa a cliente
+        confirmado = await bot.diario.atualizar(ag["id"], {"status": "confirmado"})
+        assert confirmado["telegram_id"] == "3004"
+
+    asyncio.run(principal())
@@ -0,0 +1,46 @@
+"""Lista de espera: botão de oferta de antes de um reinício não aceita a oferta nova."""
+import asyncio
+
+from agenda import MotorAgenda
+from catalogo import CacheCatalogo
+from conftest import proxima_data
+from disponibilidade import IndiceOcupacao
+from espera import ListaEspera
+
+
+async def _processo(repo):
+    """Uma "execução" do bot: índice, catálogo e lista de espera novos."""
+    ocupacao = IndiceOcupacao(repo)
+    catalogo = CacheCatalogo(repo)
+    await catalogo.carregar()
+    espera   = ListaEspera(repo, ocupacao, MotorAgenda(ocupacao, catalogo), catalogo)
+    ofertas  = []
+
+    async def ofertar(oferta):
+        ofertas.append(oferta)
+
+    await espera.iniciar(ofertar)
+    return espera, ofertas
+
+
+def test_token_de_outra_execucao_nao_casa(repo, cliente):
+    data = proxima_data()
+    cliente.tabelas["lista_espera"] = []
+
+    async def principal():
+        espera, ofertas = await _processo(repo)
+        await espera.entrar(42, "Ana", "Manicure", data)
+        await asyncio.sleep(0.01)
+        antigo = ofertas[0].token
+        await espera.parar()
+
+        # Reinício: a mesma cliente ainda está na fila e recebe outra oferta
+        espera, ofertas = await _processo(repo)
+        await espera._casar(data)
+        novo = ofertas[0].token
+        assert novo != antigo
+        assert espera.aceitar(antigo, 42) is None
+        assert espera.aceitar(novo, 42) is ofertas[0]
+        await espera.parar()
+
+    asyncio.run(principal())
@@ -0,0 +1,113 @@
+"""Arquivador: lotes até esvaziar o que passou do corte; /exportar lendo o arquivo e a tabela quente."""
+import asyncio
+import csv
+import functools
+import io
+import os
+import re
+from datetime import date
+from types import SimpleNamespace
+
+from telegram import InputFile
+
+import historico
+from historico import Arquivador
+
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "supabase_schema.sql")
+
+
+def arquivar_agendamentos(cliente, params):
+    """Mesmo contrato da função SQL: a versão quente substitui a arquivada; devolve as removidas."""
+    quentes = cliente.linhas("agendamentos")
+    alvo    = sorted((l for l in quentes if l["data"] < params["antes"]),
+                     key=lambda l: (l["data"], l["horario"], l["id"]))[:params["lote"]]
+    ids     = {l["id"] for l in alvo}
+    arquivo = cliente.linhas("agendamentos_arquivo")
+    arquivo[:] = [l for l in arquivo if l["id"] not in ids]
+    quentes[:] = [l for l in quentes if l["id"] not in ids]
+    arquivo.extend({**l, "arquivado_em": "agora"} for l in alvo)
+    return len(alvo)
+
+
+def test_arquiva_em_lotes_e_substitui_a_copia_antiga(repo, cliente):
+    cliente.funcoes["arquivar_agendamentos"] = arquivar_agendamentos
+    chamadas = []
+    antigas = [{"id": f"{i:04d}", "nome": f"C{i}", "servico": "Manicure", "data": f"2020-01-{1 + i % 28:02d}",
+                "horario": "10:00:00", "status": "confirmado"} for i in range(25)]
+    cliente.tabelas["agendamentos"] = antigas + [
+        {"id": "nova", "nome": "N", "servico": "Manicure", "data": "2099-01-01", "horario": "10:00:00", "status": "pendente"}]
+    cliente.tabelas["agendamentos_arquivo"] = [{**antigas[0], "status": "pendente"}]
+
+    original = repo.arquivar_agendamentos
+
+    async def contar(antes, lote):
+        n = await original(antes, lote)
+        chamadas.append(n)
+        return n
+
+    repo.arquivar_agendamentos = contar
+    arquivador = Arquivador(repo, meses=12, lote=10)
+    assert asyncio.run(arquivador.arquivar()) == 25
+    assert chamadas == [10, 10, 5]
+    assert [l["id"] for l in cliente.linhas("agendamentos")] == ["nova"]
+    arquivo = {l["id"]: l for l in cliente.linhas("agendamentos_arquivo")}
+    assert len(arquivo) == 25 and arquivo["0000"]["status"] == "confirmado"
+
+
+def test_corte_no_primeiro_dia_do_mes():
+    assert Arquivador(None, meses=12).corte(date(2026, 10, 17)) == "2025-10-01"
+    assert Arquivador(None, meses=1).corte(date(2026, 1, 31)) == "2025-12-01"
+
+
+class MensagemFalsa:
+    """`update.message` do /exportar: guarda o documento enviado, lido enquanto o arquivo está aberto."""
+
+    def __init__(self):
+        self.documentos = []
+
+    async def reply_text(self, texto, **kwargs):
+        async def nada(*a, **k):
+            pass
+        return SimpleNamespace(edit_text=nada, delete=nada)
+
+    async def reply_document(self, document, **kwargs):
+        self.documentos.append((document, document.input_file_content.read()))
+
+
+def test_arquivar_e_exportar_pelo_bot(bot, cliente, monkeypatch):
+    parametros = []
+
+    def rpc(c, params):
+        parametros.append(set(params))
+        return arquivar_agendamentos(c, params)
+
+    cliente.funcoes["arquivar_agendamentos"] = rpc
+
+    def linha(i, data):
+        return {"id": f"{i:04d}", "codigo": f"C{i:04d}", "nome": f"Cliente {i}", "servico": "Manicure", "data": data,
+                "horario": f"{9 + i % 8:02d}:00:00", "duracao_min": 60, "profissional_id": None,
+                "status": "confirmado", "telegram_id": 1000 + i, "criado_em": "2020-01-01T00:00:00"}
+
+    antigas = [linha(i, f"2020-03-{1 + i % 3:02d}") for i in range(7)]
+    cliente.tabelas["agendamentos"] = antigas + [linha(90, "2099-01-01")]
+    cliente.tabelas["agendamentos_arquivo"] = [{**antigas[2], "status": "pendente"}]
+
+    assert asyncio.run(Arquivador(bot.repo, meses=12, lote=3).arquivar()) == 7
+    with open(SCHEMA, encoding="utf-8") as f:
+        assinatura = re.search(r"FUNCTION arquivar_agendamentos\(([^)]*)\)", f.read()).group(1)
+    # O RPC casa os parâmetros pelo nome: os que o repositório manda são os da função SQL
+    assert parametros and all(p == {a.split()[0] for a in assinatura.split(",")} for p in parametros)
+
+    monkeypatch.setattr(bot.historico, "exportar", functools.partial(historico.exportar, pagina=2))
+    mensagem = MensagemFalsa()
+    update   = SimpleNamespace(effective_user=SimpleNamespace(id=bot.ADMIN_ID), message=mensagem)
+    asyncio.run(bot.exportar_cmd(update, SimpleNamespace(args=["01/01/2020", "31/12/2099"])))
+
+    (documento, conteudo), = mensagem.documentos
+    assert isinstance(documento, InputFile) and not isinstance(documento.input_file_content, bytes)
+    assert documento.filename == "agendamentos_20200101_20991231.csv"
+    linhas = list(csv.reader(io.StringIO(conteudo.decode("utf-8-sig")), delimiter=";"))[1:]
+    # Arquivo primeiro (em ordem de data, horário e id), cada agendamento uma vez, e a cópia antiga substituída
+    esperadas = sorted(antigas, key=lambda l: (l["data"], l["horario"], l["id"])) + [linha(90, "2099-01-01")]
+    assert [l[0] for l in linhas] == [l["codigo"] for l in esperadas]
+    assert {l[7] for l in linhas} == {"confirmado"}
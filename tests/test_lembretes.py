@@ -0,0 +1,37 @@
+"""Lembrete de 24h atrasado: só sai com antecedência suficiente, e o texto diz o dia certo."""
+import asyncio
+from datetime import date, datetime, timedelta
+
+from lembretes import AgendadorLembretes
+
+
+def _ag(inicio):
+    return {"id": "a1", "nome": "Ana", "servico": "Manicure", "telegram_id": "99", "status": "confirmado",
+            "data": inicio.date().isoformat(), "horario": inicio.strftime("%H:%M:%S"), "codigo": "ABC123"}
+
+
+def _agendador(bot, ag):
+    bot.repo._cliente.tabelas["agendamentos"] = [dict(ag, lembrete_24h_em=None, lembrete_2h_em=None)]
+    agendador = AgendadorLembretes(bot.repo, bot.fila)
+    agendador._formatar = bot.texto_lembrete
+    return agendador
+
+
+def test_confirmado_em_cima_da_hora_nao_manda_o_de_24h(bot):
+    ag = _ag(datetime.now().replace(microsecond=0) + timedelta(hours=5))
+
+    async def principal():
+        agendador = _agendador(bot, ag)
+        await agendador._disparar(ag, "24h")
+        assert bot.enviados == []
+        await agendador._disparar(ag, "2h")
+        assert len(bot.enviados) == 1 and "daqui a pouco" in bot.enviados[0][1]
+
+    asyncio.run(principal())
+
+
+def test_texto_do_lembrete_de_24h_diz_o_dia(bot):
+    hoje = datetime.combine(date.today(), datetime.min.time()).replace(hour=22)
+    assert "hoje" in bot.texto_lembrete(_ag(hoje), "24h")
+    assert "amanhã" in bot.texto_lembrete(_ag(hoje + timedelta(days=1)), "24h")
+    assert "amanhã" not in bot.texto_lembrete(_ag(hoje + timedelta(days=2)), "24h")
@@ -0,0 +1,33 @@
+"""Rótulos das métricas: operação do repositório e ação do botão."""
+import asyncio
+
+import pytest
+
+from metricas import acao_callback
+
+
+def test_consultas_em_paralelo_levam_o_nome_da_operacao(repo, cliente):
+    cliente.tabelas.update(bot_usuarios=[], bot_conversas=[])
+    medidas = []
+    repo.ao_consultar(lambda operacao, segundos, linhas, erro: medidas.append(operacao))
+
+    async def principal():
+        await repo.catalogo()
+        await repo.estado_carregar()
+        await repo.inserir({"nome": "Ana", "servico": "Manicure", "data": "2030-01-02", "horario": "10:00"})
+
+    asyncio.run(principal())
+    assert sorted(medidas) == sorted(["versao_catalogo"] + ["catalogo"] * 4 + ["estado_carregar"] * 2 + ["inserir"])
+
+
+@pytest.mark.parametrize("data, acao", [
+    ("edit_campo:nome", "edit_campo"),
+    ("dif_seg:1", "dif_seg"),
+    ("dif_srv:Manicure.3", "dif_srv"),
+    ("pag:adm_todos.1", "pag"),
+    ("minha_cancelar_5f0c2a9e-1b2c-4d5e-8f90-123456789abc", "minha_cancelar"),
+    ("adm_hoje", "adm_hoje"),
+    ("", "?"),
+])
+def test_acao_callback(data, acao):
+    assert acao_callback(data) == acao
@@ -0,0 +1,66 @@
+"""/minhas: os botões de cancelar e remarcar passam pelo roteador (`op:<id em base 62>`)."""
+import asyncio
+from types import SimpleNamespace
+
+from conftest import proxima_data
+from test_concorrencia import Mensagem
+
+CLIENTE = 4242
+
+
+class QueryFalsa:
+    def __init__(self, data, uid=CLIENTE):
+        self.data      = data
+        self.from_user = SimpleNamespace(id=uid)
+        self.message   = Mensagem("")
+        self.alertas   = []
+        self.telas     = []
+
+    async def answer(self, texto=None, show_alert=False):
+        if texto:
+            self.alertas.append(texto)
+
+    async def edit_message_text(self, texto, parse_mode=None, reply_markup=None):
+        self.telas.append((texto, reply_markup))
+
+
+def _tocar(bot, context, data):
+    query  = QueryFalsa(data)
+    update = SimpleNamespace(callback_query=query, effective_user=query.from_user)
+    estado = asyncio.run(bot.minhas_callback(update, context))
+    return query, estado
+
+
+def test_cancelar_pelo_botao_roteado(bot, cliente):
+    async def agendar():
+        await bot.catalogo.carregar()
+        return await bot.repo.inserir({"nome": "Ana", "servico": "Manicure", "data": proxima_data(),
+                                       "horario": "09:00", "duracao_min": 60, "telegram_id": str(CLIENTE)})
+
+    ag       = asyncio.run(agendar())
+    mensagem = Mensagem("/minhas")
+    context  = SimpleNamespace(user_data={})
+    asyncio.run(bot.minhas(SimpleNamespace(message=mensagem, effective_user=SimpleNamespace(id=CLIENTE)), context))
+
+    (cancelar, remarcar), = mensagem.respostas[-1][1].inline_keyboard
+    assert cancelar.callback_data.startswith("minha_cancelar:") and remarcar.callback_data.startswith("minha_remarcar:")
+    assert ag["id"] not in cancelar.callback_data and len(cancelar.callback_data.encode()) <= 64
+
+    query, estado = _tocar(bot, context, cancelar.callback_data)
+    assert estado == bot.MENU and not query.alertas
+    sim = query.telas[-1][1].inline_keyboard[0][0]
+    assert sim.callback_data.startswith("minha_sim:")
+
+    query, estado = _tocar(bot, context, sim.callback_data)
+    assert estado == bot.ConversationHandler.END and "cancelado" in query.telas[-1][0]
+    assert asyncio.run(bot.repo.obter(ag["id"]))["status"] == "cancelado"
+
+
+def test_botao_antigo_ou_fora_da_lista(bot):
+    context = SimpleNamespace(user_data={"minhas": {}})
+    # Formato de antes do roteador: recusado como botão velho, não como acesso negado
+    query, _ = _tocar(bot, context, "minha_cancelar_0b7e6a8e-7b1f-4a39-9d53-2f4f1b0c9a11")
+    assert query.alertas == ["Botão desatualizado — abra o menu de novo."]
+
+    query, estado = _tocar(bot, context, bot.rotas.dados("minha_remarcar", bot.PorId("0b7e6a8e-7b1f-4a39-9d53-2f4f1b0c9a11")))
+    assert estado == bot.ConversationHandler.END and "desatualizada" in query.telas[-1][0]
@@ -0,0 +1,75 @@
+"""Persistência no Supabase compartilhada: uma instância vê o estado que a outra gravou."""
+import asyncio
+import json
+from types import SimpleNamespace
+
+from telegram.ext._utils.trackingdict import TrackingDict
+
+from persistencia import PersistenciaSupabase
+from repositorio import RepositorioAgendamentos
+
+
+def bot_estado_gravar(cliente, p):
+    """Mesmo efeito da função SQL `bot_estado_gravar`."""
+    usuarios, conversas = cliente.linhas("bot_usuarios"), cliente.linhas("bot_conversas")
+    for u in p["usuarios"]:
+        usuarios[:] = [l for l in usuarios if l["user_id"] != u["user_id"]] + [dict(u)]
+    usuarios[:] = [l for l in usuarios if l["user_id"] not in p["usuarios_apagar"]]
+    for c in p["conversas"]:
+        conversas[:] = [l for l in conversas if (l["nome"], l["chave"]) != (c["nome"], c["chave"])] + [dict(c)]
+    apagar = {(c["nome"], c["chave"]) for c in p["conversas_apagar"]}
+    conversas[:] = [l for l in conversas if (l["nome"], l["chave"]) not in apagar]
+    return None
+
+
+def _instancia(cliente):
+    repo = RepositorioAgendamentos("http://localhost", "chave")
+    repo._cliente = cliente
+    persistencia = PersistenciaSupabase(repo)
+    conversa = SimpleNamespace(name="cliente_conv", END=-1, _conversations=TrackingDict())
+    persistencia.acompanhar(conversa)
+    return persistencia, conversa
+
+
+def test_outra_instancia_rele_user_data_e_estado_da_conversa(cliente):
+    cliente.funcoes["bot_estado_gravar"] = bot_estado_gravar
+
+    async def principal():
+        a, conv_a = _instancia(cliente)
+        b, conv_b = _instancia(cliente)
+        await a.get_user_data()
+        await b.get_user_data()
+
+        # A instância A atende a cliente e grava o lote
+        conv_a._conversations[(7, 7)] = 3
+        await a.update_user_data(7, {"nome": "Ana", "servico": "Manicure"})
+        await a.update_conversation("cliente_conv", (7, 7), 3)
+        await a.flush()
+        assert json.loads(cliente.linhas("bot_conversas")[0]["chave"]) == [7, 7]
+
+        # A próxima mensagem cai na instância B
+        user_data = {}
+        await b.refresh_user_data(7, user_data)
+        assert user_data == {"nome": "Ana", "servico": "Manicure"}
+        assert conv_b._conversations[(7, 7)] == 3
+        assert not conv_b._conversations.pop_accessed_keys()   # o que veio do banco não é regravado
+
+        # Mudança local de B que o PTB ainda não entregou não é atropelada pela releitura
+        user_data["data"] = "2030-01-02"
+        conv_b._conversations[(7, 7)] = 4
+        await b.refresh_user_data(7, user_data)
+        assert user_data["data"] == "2030-01-02" and conv_b._conversations[(7, 7)] == 4
+
+        # B grava; A relê, encerra a conversa e grava; B deixa de ter estado para a chave
+        await b.update_user_data(7, user_data)
+        await b.update_conversation("cliente_conv", (7, 7), 4)
+        await b.flush()
+        await a.refresh_user_data(7, {})
+        assert conv_a._conversations[(7, 7)] == 4
+        del conv_a._conversations[(7, 7)]
+        await a.update_conversation("cliente_conv", (7, 7), None)
+        await a.flush()
+        await b.refresh_user_data(7, user_data)
+        assert (7, 7) not in conv_b._conversations
+
+    asyncio.run(principal())
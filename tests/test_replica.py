@@ -0,0 +1,120 @@
+"""Réplica em memória sincronizada pelo Realtime (servidor local) e pela soma de conferência."""
+import asyncio
+import hashlib
+
+import pytest
+
+from conftest import proxima_data
+from realtime_local import RealtimeLocal
+from replica import ReplicaAgendamentos
+from repositorio import RepositorioAgendamentos
+
+
+def checksum_ativos(cliente, params):
+    """Mesma conta da função SQL `agendamentos_ativos_checksum`."""
+    linhas = sorted((l for l in cliente.linhas("agendamentos")
+                     if str(l["data"]) >= params["desde"] and l["status"] != "cancelado"), key=lambda l: l["id"])
+    texto  = "\n".join("|".join((l["id"], l["data"], l["horario"][:5], l["status"], l["nome"], l["servico"],
+                                 l.get("telegram_id") or "", l.get("codigo") or "")) for l in linhas)
+    return {"total": len(linhas), "md5": hashlib.md5(texto.encode()).hexdigest()}
+
+
+async def esperar(condicao, limite=2.0):
+    fim = asyncio.get_running_loop().time() + limite
+    while not condicao():
+        if asyncio.get_running_loop().time() > fim:
+            raise AssertionError("condição não satisfeita a tempo")
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def ambiente(cliente):
+    """Réplica ligada ao servidor Realtime local e um segundo processo escrevendo no mesmo banco."""
+    cliente.funcoes["agendamentos_ativos_checksum"] = checksum_ativos
+
+    async def montar():
+        servidor = await RealtimeLocal(cliente).iniciar()
+        repo     = RepositorioAgendamentos(servidor.url, "chave")
+        outro    = RepositorioAgendamentos(servidor.url, "chave")
+        repo._cliente = outro._cliente = cliente
+        replica  = ReplicaAgendamentos(repo, intervalo=3600)
+        repo.ao_alterar(replica.ao_alterar)
+        await replica.iniciar()
+        return servidor, repo, outro, replica
+
+    return montar
+
+
+def test_mudancas_de_outro_processo_chegam_pelo_realtime(ambiente):
+    data = proxima_data()
+
+    async def principal():
+        servidor, repo, outro, replica = await ambiente()
+        try:
+            assert replica.realtime and replica.pronta and len(replica) == 0
+            ag = await outro.inserir({"nome": "Ana", "servico": "Manicure", "data": data, "horario": "10:00"})
+            await esperar(lambda: replica.obter(ag["id"]) is not None)
+            assert [r.nome for r in replica.por_data(data)] == ["Ana"]
+
+            await outro.atualizar(ag["id"], {"status": "confirmado"})
+            await esperar(lambda: replica.por_status("confirmado"))
+
+            outra = await outro.inserir({"nome": "Bia", "servico": "Manicure", "data": data, "horario": "14:00"})
+            await esperar(lambda: len(replica) == 2)
+            await outro.atualizar(ag["id"], {"status": "cancelado"})
+            await outro.excluir(outra["id"])
+            await esperar(lambda: len(replica) == 0)
+
+            # Nada divergiu: a conferência não precisa recarregar
+            assert replica.soma() == (0, hashlib.md5(b"").hexdigest())
+        finally:
+            await repo.fechar()
+            await replica.parar()
+            await servidor.parar()
+
+    asyncio.run(principal())
+
+
+def test_queda_do_realtime_reconecta_e_confere(ambiente, monkeypatch):
+    from tempo_real import CanalRealtime
+    monkeypatch.setattr(CanalRealtime, "RECUO_MAXIMO", 0.05)
+    data = proxima_data()
+
+    async def principal():
+        servidor, repo, outro, replica = await ambiente()
+        try:
+            servidor.ativo = False          # eventos da janela da queda se perdem
+            await servidor.derrubar()
+            await esperar(lambda: not replica.realtime)
+            ag = await outro.inserir({"nome": "Ana", "servico": "Manicure", "data": data, "horario": "10:00"})
+            servidor.ativo = True
+            # Ao voltar, o canal entra de novo e a réplica confere a soma e recarrega
+            await esperar(lambda: replica.realtime and replica.obter(ag["id"]) is not None, limite=5)
+            assert servidor.joins == 2
+        finally:
+            await repo.fechar()
+            await replica.parar()
+            await servidor.parar()
+
+    asyncio.run(principal())
+
+
+def test_sem_realtime_cai_na_conferencia(cliente, monkeypatch):
+    import repositorio
+    monkeypatch.setattr(repositorio, "CanalRealtime", None)
+    cliente.funcoes["agendamentos_ativos_checksum"] = checksum_ativos
+    data = proxima_data()
+
+    async def principal():
+        repo, outro = RepositorioAgendamentos("http://localhost", "k"), RepositorioAgendamentos("http://localhost", "k")
+        repo._cliente = outro._cliente = cliente
+        replica = ReplicaAgendamentos(repo, intervalo=3600)
+        await replica.iniciar()
+        assert not replica.realtime
+        ag = await outro.inserir({"nome": "Ana", "servico": "Manicure", "data": data, "horario": "10:00"})
+        assert replica.obter(ag["id"]) is None
+        await replica.conferir()
+        assert replica.obter(ag["id"]) is not None
+        await replica.parar()
+
+    asyncio.run(principal())